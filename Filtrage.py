@@ -4,8 +4,10 @@
 """ This script launch Trimmomatic, an adapteur and quality trimming tool for 
 	high throughput sequencing data. 
 
-	This script need three modules to function : parseXML, commandline and 
-	argparse_commandline """
+	This script need eighteen modules to function : parseXML, commandline, 
+	argparse_commandline, named_pipes, native_engine, sharding, batch, 
+	daemon, result_cache, journal, trim_stats, profiling, resources, 
+	class_sharing, scratch, streams, interleaved and trimming """
 
 __author__ = "Anita Annamalé"
 __version__  = "0.0.1"
@@ -16,7 +18,7 @@ __date__ = "2015/05"
 #-------------------------- Modules Importation -------------------------------#
 
 import argparse
-import shlex, subprocess
+import multiprocessing
 import os
 import sys
 
@@ -28,6 +30,21 @@ sys.path.append(loc)
 from parseXML import *
 from commandline import *
 from argparse_commandline import *
+from named_pipes import *
+from native_engine import *
+from sharding import *
+from batch import *
+from daemon import *
+from result_cache import *
+from journal import *
+from trim_stats import *
+from profiling import *
+from resources import *
+from class_sharing import *
+from scratch import *
+from streams import *
+from interleaved import *
+from trimming import *
 
 #------------------------- Definition Of Functions ----------------------------#
 
@@ -42,11 +59,17 @@ if __name__ == '__main__' :
 	# change into dictionnary
 	arguments = dict(result._get_kwargs())
 	
+	# the phases of the run are timed (but not the ones of the daemon)
+	if(arguments['daemon'] == None):
+		open_trace('.', arguments['chrome_trace'], 
+				   arguments['profile'] != None)
+	
 	
 	# checking :
 	if len(sys.argv) < 2 :
-		sys.exit("Usage : python Filtrage.py --XML or python Filtrage.py\
- layout read_files\nFor more informations use the option '-h'.")
+		sys.exit("Usage : python Filtrage.py --XML, python Filtrage.py\
+ --batch manifest or python Filtrage.py layout read_files\nFor more \
+informations use the option '-h'.")
 
 	# if use the commandline argument then:
 	if arguments['layout'] != None :
@@ -54,121 +77,114 @@ if __name__ == '__main__' :
 			sys.exit("Error : A read file must be specified if you\
  use the layout 'SE' or 2 read files if the layout 'PE' is specified")
 
+	# engine, shards, threads, memory and size of the cache
+	check_run(arguments)
 
-	# Use XML file to launch Trimmomatic
-	if(arguments['XML'] != None):
+	# trimmings already done are taken from the cache
+	if(arguments['batch'] == None and arguments['daemon'] == None):
+		set_cache(arguments['cache'], arguments['cache_size'])
+
+
+	# Use a manifest to trim many samples
+	if(arguments['batch'] != None):
 		
-		# parse XML file
-		config=parse_xml_file("configuration.xml")
+		# all the processors are shared between the samples if not given
+		if(arguments['threads'] == None):
+			arguments['threads'] = multiprocessing.cpu_count()
 		
-		# separate sub trees
-		in_out, trimmo = separate_steps(config)
+		# the processors (and the free memory) the batch may use
+		elif(arguments['threads'] == AUTO):
+			arguments['threads'] = available_cores()
+			if(arguments['memory'] == None):
+				arguments['memory'] = available_memory()
 		
-		# separate trimming categories of Trimmomatic
-		adapter, quality, useful=separate_categories_Trimmo(trimmo)
-
-		# create an empty dict()
-		param={} 
+		# the archive is built once, before the samples use it
+		if(arguments['no_class_sharing'] == None):
+			with phase('class sharing', 'java'):
+				open_class_sharing(loc)
 		
-		# fill param
-		param = get_input_output_parameters(in_out, param)
-		param = get_adapter_parameters(adapter, param)
-		param = get_quality_parameters(quality, param)
-		param = get_useful_parameters(useful, param)
+		with phase('batch', 'trimming', {'manifest' : arguments['batch']}):
+			launch_batch(arguments['batch'], arguments, 
+						 os.path.abspath(__file__))
+		sys.exit(0)
 
-		# initializing nb (nb of exécuted commandline)
-		nb = 0 
+
+	# Launch the trimming daemon
+	if(arguments['daemon'] != None):
 		
-		# creating io [dict()] which will contain created files.
-		io = dict()
+		if not daemon_available():
+			sys.exit("Error : The daemon needs Unix sockets.")
 		
-		# generating step1 (adapter trimming) commandline
-		cmd_step1, inout = commandline_step_1(loc,param,nb,io)
+		# one warm worker per processor if not given
+		workers = arguments['workers']
+		if(workers == None):
+			workers = multiprocessing.cpu_count()
 		
-		# If Adapter Trimming
-		if(cmd_step1 != None):
-			
-			# split the commandline
-			args_1 = shlex.split(cmd_step1)
-			
-			# launch step1 
-			with open("output_file_step1.out","w") as file_out1:
-				prog_1 = subprocess.check_call(args_1, stderr=file_out1)
-			
-			# nb become 1 (first step done)
-			nb = 1
-	
+		if(workers < 1):
+			sys.exit("Error : The number of workers must be at least 1.")
 		
-		# If Quality Trimming Step
-		tmp_cmd="test"
-		if(commandline_quality(param,tmp_cmd)!=None):
-			
-			if(nb==1):
-				# change step1 output files to step2 input files
-				io = change_output_as_input(io, param)
+		launch_daemon(arguments['daemon'], workers, loc, arguments['engine'])
+		sys.exit(0)
+
+
+	# Use XML file to launch Trimmomatic
+	if(arguments['XML'] != None):
 		
-			# generating step2 (quality trimming) commandline
-			cmd_step2 = commandline_step_2(loc,param,nb,io)	
-			
-			# split commandline
-			args_2 = shlex.split(cmd_step2)
+		with phase('parse XML', 'setup'):
+			try:
+				# parse XML file
+				config = xml_config("configuration.xml")
+			except ValueError as error:
+				sys.exit(str(error))
 		
-			# launch step2
-			with open("output_file_step2.out","w") as file_out2:
-				prog_2 = subprocess.check_call(args_2, stderr=file_out2)
+		with phase('XML parameters', 'setup'):
+			# the commandline gives how the trimming is run
+			for option in XML_RUN_OPTIONS:
+				config[option] = arguments[option]
 			
-			if(nb==1):
-				# delete temporary files
-				os.system('rm {0} {1}'.format(io['trimmed'][0], io['trimmed'][1]))
+			# the parameters are checked as the commandline ones
+			try:
+				arguments = config_arguments(config)
+			except ValueError as error:
+				sys.exit(str(error))
+		
+		# single pass for streams, threads, memory and compression
+		streaming = open_run(arguments)
+		
+		# trimming steps, in the working directory
+		run_trimming(arguments, loc, streaming, '.')
 	
 	
 	# Use Arguments line to launch Trimmomatic
 	else:
 
 		# check given arguments
-		arguments=check_args(arguments)
+		with phase('check arguments', 'setup'):
+			arguments=check_args(arguments)
 		
-		# initializing nb to 0
-		nb = 0
+		# streams (and interleaved reads) are read once : the daemon can't 
+		# trim them
+		if(arguments['submit'] != None and 
+		   (stream_mode(arguments) or arguments['interleaved'] != None)):
+			sys.exit("Error : The daemon can't trim streams.")
 		
-		# creating io [dict()] which will contain created files.
-		io= dict()
+		# single pass for streams, threads, memory and compression
+		streaming = open_run(arguments)
 		
-		# generating step1 (adapter trimming) commandline
-		cmd_step1 = argparse_commandline_step_1(loc,arguments, nb,io)
-	
-		# If Adapter Trimming
-		if(cmd_step1 != None):
+		# send the trimming to the daemon
+		if(arguments['submit'] != None):
 			
-			# split the commandline
-			args_1 = shlex.split(cmd_step1)
+			try:
+				status = submit_job(arguments['submit'], arguments, 
+									arguments['priority'])
+			except (IOError, OSError, ValueError) as error:
+				sys.exit("Error : The daemon can't trim the reads ({0}).".format(
+																		error))
 			
-			# launch step1 
-			with open("output_file_step1.out","w") as out:
-				prog_1 = subprocess.check_call(args_1, stderr=out)
+			if(status['state'] != 'done'):
+				sys.exit(status['error'])
 			
-			# nb become 1 (first step done)
-			nb=1
-
+			sys.exit(0)
 		
-		# If Quality Trimming step
-		tmp_cmd="test"
-		if(argparsecmd_quality(arguments,tmp_cmd)!=None):
-			
-			if(nb==1):	
-				# change step1 output files to step2 input files
-				io = change_output_as_input(io, arguments)
-			
-			# generating step2 (quality trimming) commandline
-			cmd_step2 = argparse_commandline_step_2(loc,arguments, nb, io)
-				
-			# split commandline
-			args_2 = shlex.split(cmd_step2)
-
-			# launch step2
-			with open("output_file_step2.out","w") as out:
-				prog_2 = subprocess.check_call(args_2, stderr=out)
-			
-			if(nb==1):	
-				# delete temporary files
-				os.system('rm {0} {1}'.format(io['trimmed'][0], io['trimmed'][1]))
+		# trimming steps, in the working directory
+		run_trimming(arguments, loc, streaming, '.')
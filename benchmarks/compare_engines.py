@@ -0,0 +1,449 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script checks that the native engine trims the reads exactly as
+	the Trimmomatic jar : the same commandline (the same trimming steps,
+	built by the functions of the main script) is launched by both engines
+	on real or synthetic input files (see generate_fastq), then the outputs
+	are compared read by read. For each read it checks its survival, the
+	output it is written in (both surviving pairs or singletons) and its
+	trimming (the kept part of the read and its qualities). The mismatches
+	and the relative throughput of both engines are written in a report.
+
+	The options of the main script are given after '--' :
+
+	python benchmarks/compare_engines.py -- PE r_1.fq r_2.fq -minlen 36
+	python benchmarks/compare_engines.py --synthetic 100000 -- PE -crop 50 """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+import argparse
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import time
+
+# Get the location of RNA-seq-Trimming-Tool directory
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+loc = os.path.join(os.path.dirname(BENCHMARKS), 'src')
+sys.path.append(loc)
+
+from argparse_commandline import *
+from native_engine import *
+from sharding import split_commandline
+
+from generate_fastq import ADAPTERS, generate
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# number of mismatches given as examples in the report
+EXAMPLES = 20
+
+# monotonic clock (time.time if the python version has none)
+clock = getattr(time, 'monotonic', time.time)
+
+
+
+def engine_commandline(arguments, directory):
+	"""
+	Function that builds the Trimmomatic commandline of the options of the
+	main script (a single pass if both trimming are asked, else the asked
+	one), its outputs written in a directory.
+
+	Takes 2 arguments :
+		- arguments [dict] : the checked options of the main script
+		- directory [string] : directory of the outputs
+
+	Returns:
+		- cmd [string] : the commandline, or None without trimming step
+	"""
+
+	arguments = dict(arguments, output=directory)
+
+	cmd = argparse_commandline_fused(loc, arguments, 0, dict())
+
+	if(cmd == None):
+		cmd = argparse_commandline_step_1(loc, arguments, 0, dict())
+
+	if(cmd == None):
+		cmd = argparse_commandline_step_2(loc, arguments, 0, dict())
+
+	return cmd
+
+
+
+def run_native(cmd, directory):
+	"""
+	Function that trims the reads of a commandline by the native engine (in
+	this process).
+
+	Takes 2 arguments :
+		- cmd [string] : the Trimmomatic commandline
+		- directory [string] : directory of the outputs and of the log
+
+	Returns:
+		- wall [float] : the time of the trimming, in seconds
+	"""
+
+	start = clock()
+	launch_native(cmd, os.path.join(directory, 'native.log'))
+
+	return clock() - start
+
+
+
+def run_jar(cmd, directory):
+	"""
+	Function that trims the reads of a commandline by the Trimmomatic jar.
+
+	Takes 2 arguments :
+		- cmd [string] : the Trimmomatic commandline
+		- directory [string] : directory of the outputs and of the log
+
+	Returns:
+		- wall [float] : the time of the trimming, in seconds
+		or raise subprocess.CalledProcessError
+	"""
+
+	start = clock()
+
+	with open(os.path.join(directory, 'trimmomatic.log'), 'w') as log:
+		subprocess.check_call(shlex.split(cmd), stderr=log)
+
+	return clock() - start
+
+
+
+def fastq_records(filename):
+	"""
+	Function (generator) that reads the records of a fastq file.
+
+	Takes one argument :
+		- filename [string] : the fastq file (compressed or not)
+
+	Returns (yield):
+		- record [tuple] : the header, sequence and qualities of a read
+	"""
+
+	fastq = open_fastq(filename, 'rb')
+
+	try:
+		while True:
+			header = fastq.readline().rstrip()
+			if not header:
+				return
+
+			sequence = fastq.readline().rstrip()
+			fastq.readline()
+			qualities = fastq.readline().rstrip()
+
+			yield header, sequence, qualities
+
+	finally:
+		fastq.close()
+
+
+
+def read_outcomes(inputs, outputs):
+	"""
+	Function (generator) that finds what an engine did to each input read :
+	the outputs keep the order of the inputs, so each output is read once.
+
+	Takes 2 arguments :
+		- inputs [list] : the input files (one, or two for paired ends data)
+		- outputs [list] : the output files of the commandline (trimmed
+						   reads, or trimmed pairs 1, singletons 1, trimmed
+						   pairs 2 and singletons 2)
+
+	Returns (yield):
+		- reads [tuple] : the input records of the read (or of the pair)
+		- outcome [string] : 'kept' or 'dropped' for single ends data,
+							 'paired', 'forward only', 'reverse only' or
+							 'dropped' for paired ends data
+		- trimmed [list] : the output record of each mate (None if dropped)
+	"""
+
+	readers = [fastq_records(filename) for filename in outputs]
+	pending = [next(reader, None) for reader in readers]
+
+	def take(i, header):
+		# the next record of the output i, if it is this read
+		if(pending[i] != None and pending[i][0] == header):
+			record = pending[i]
+			pending[i] = next(readers[i], None)
+			return record
+		return None
+
+	for reads in zip(*[fastq_records(filename) for filename in inputs]):
+		if(len(inputs) == 1):
+			record = take(0, reads[0][0])
+			yield reads, 'kept' if record != None else 'dropped', [record]
+			continue
+
+		paired_1 = take(0, reads[0][0])
+		paired_2 = take(2, reads[1][0])
+
+		if(paired_1 != None and paired_2 != None):
+			yield reads, 'paired', [paired_1, paired_2]
+			continue
+
+		single_1 = take(1, reads[0][0])
+		single_2 = take(3, reads[1][0])
+
+		if(single_1 != None):
+			yield reads, 'forward only', [single_1, None]
+		elif(single_2 != None):
+			yield reads, 'reverse only', [None, single_2]
+		else :
+			yield reads, 'dropped', [None, None]
+
+	for i, record in enumerate(pending):
+		if(record != None):
+			raise ValueError("Error : The output '{0}' has a read which is not \
+in the inputs ({1}).".format(outputs[i], record[0].decode()))
+
+
+
+def trim_coordinates(read, trimmed):
+	"""
+	Function that finds the part of a read kept by the trimming.
+
+	Takes 2 arguments :
+		- read [tuple] : the input record
+		- trimmed [tuple] : the output record, or None if dropped
+
+	Returns:
+		- [list] : the start and end of the kept part, or None
+	"""
+
+	if(trimmed == None):
+		return None
+
+	start = read[1].find(trimmed[1])
+	if(start < 0):
+		return None
+
+	return [start, start + len(trimmed[1])]
+
+
+
+def compare_outcomes(native, jar):
+	"""
+	Function that compares what both engines did to a read.
+
+	Takes 2 arguments :
+		- native [tuple] : the outcome of the native engine (see
+						   read_outcomes)
+		- jar [tuple] : the outcome of the Trimmomatic jar
+
+	Returns:
+		- kind [string] : None if both did the same, else 'survival' (one
+						  engine dropped the read), 'singleton' (the read is
+						  not written in the same output), 'trimming' (not
+						  the same part of the read is kept) or 'quality'
+	"""
+
+	if(native[1] != jar[1]):
+		if('dropped' in (native[1], jar[1])):
+			return 'survival'
+		return 'singleton'
+
+	for native_mate, jar_mate in zip(native[2], jar[2]):
+		if(native_mate == None):
+			continue
+
+		if(native_mate[1] != jar_mate[1]):
+			return 'trimming'
+
+		if(native_mate[2] != jar_mate[2]):
+			return 'quality'
+
+	return None
+
+
+
+def compare_engines(inputs, native_outputs, jar_outputs):
+	"""
+	Function that compares the outputs of both engines read by read.
+
+	Takes 3 arguments :
+		- inputs [list] : the input files
+		- native_outputs [list] : the outputs of the native engine
+		- jar_outputs [list] : the outputs of the Trimmomatic jar
+
+	Returns:
+		- comparison [dict] : the number of reads compared ('reads'), the
+							  outcomes of each engine ('outcomes'), the
+							  mismatches of each kind ('mismatches') and the
+							  first mismatches ('examples')
+	"""
+
+	comparison = {'reads' : 0, 'mismatches' : {},
+				  'outcomes' : {'native' : {}, 'trimmomatic' : {}},
+				  'examples' : []}
+
+	for native, jar in zip(read_outcomes(inputs, native_outputs),
+						   read_outcomes(inputs, jar_outputs)):
+		comparison['reads'] += 1
+
+		for name, outcome in (('native', native), ('trimmomatic', jar)):
+			counts = comparison['outcomes'][name]
+			counts[outcome[1]] = counts.get(outcome[1], 0) + 1
+
+		kind = compare_outcomes(native, jar)
+		if(kind == None):
+			continue
+
+		comparison['mismatches'][kind] = comparison['mismatches'].get(kind,
+																	   0) + 1
+
+		if(len(comparison['examples']) < EXAMPLES):
+			comparison['examples'].append({
+				'read' : native[0][0][0].decode(), 'kind' : kind,
+				'native' : {'outcome' : native[1], 'trim' : [
+							trim_coordinates(read, mate) for read, mate in
+							zip(native[0], native[2])]},
+				'trimmomatic' : {'outcome' : jar[1], 'trim' : [
+							trim_coordinates(read, mate) for read, mate in
+							zip(jar[0], jar[2])]}})
+
+	return comparison
+
+
+
+def harness_parser():
+	"""
+	Menu of the comparison of the engines.
+
+	Don't takes any argument
+
+	Return parser
+	"""
+
+	parser = argparse.ArgumentParser(
+		formatter_class=argparse.RawTextHelpFormatter,
+		description="Checks that the native engine trims the reads as the \
+Trimmomatic jar\n(the options of the main script are given after '--')")
+
+	parser.add_argument("--synthetic", type=int, metavar='READS',
+						help="trim READS synthetic reads (or pairs) instead \
+of input files")
+	parser.add_argument("--seed", type=int, default=1,
+						help="seed of the synthetic reads (default : 1)")
+	parser.add_argument("--work", type=str,
+						default=os.path.join(BENCHMARKS, 'work', 'engines'),
+						help="working directory (default : \
+benchmarks/work/engines)")
+	parser.add_argument("--report", type=str,
+						help="report file (default : engine_report.json in \
+the\n  working directory)")
+
+	return parser
+
+
+
+if __name__ == '__main__' :
+
+	options, trimming = harness_parser().parse_known_args()
+	options = dict(options._get_kwargs())
+
+	if(trimming and trimming[0] == '--'):
+		trimming = trimming[1:]
+
+	if not native_engine_available():
+		sys.exit("Error : The native engine needs the python module numpy.")
+
+	work = os.path.abspath(options['work'])
+	if os.path.isdir(work):
+		shutil.rmtree(work)
+	os.makedirs(work)
+
+	arguments = dict(Trimmomatic_parser().parse_args(trimming)._get_kwargs())
+
+	# synthetic reads (with adapters) instead of input files
+	if(options['synthetic'] != None):
+		layout = str(arguments['layout']).upper()
+		arguments['input'] = generate({'layout' : layout,
+						'reads' : options['synthetic'], 'length' : 100,
+						'insert_size' : 300, 'insert_sd' : 50,
+						'adapter_rate' : 0.1, 'profile' : 'exponential',
+						'phred' : arguments['phred'] or 33, 'compress' : None,
+						'seed' : options['seed'], 'adapters' : ADAPTERS,
+						'prefix' : os.path.join(work, 'synthetic')})
+
+	arguments = check_args(arguments)
+
+	# the outputs are compared not compressed
+	arguments.pop('compress', None)
+	arguments.pop('bgzf', None)
+
+	inputs = arguments['input']
+	if(arguments['layout'] == 'SE'):
+		inputs = [inputs]
+	inputs = [os.path.abspath(filename) for filename in inputs]
+	arguments['input'] = inputs[0] if len(inputs) == 1 else inputs
+
+	directories = {}
+	commandlines = {}
+
+	for engine in ('native', 'trimmomatic'):
+		directories[engine] = os.path.join(work, engine)
+		os.makedirs(directories[engine])
+		commandlines[engine] = engine_commandline(arguments,
+												  directories[engine])
+
+	if(commandlines['native'] == None):
+		sys.exit("Error : No trimming step is asked.")
+
+	if not native_supported(commandlines['native']):
+		sys.exit("Error : The native engine can't do these trimming steps.")
+
+	walls = {'native' : run_native(commandlines['native'],
+								   directories['native']),
+			 'trimmomatic' : run_jar(commandlines['trimmomatic'],
+									 directories['trimmomatic'])}
+
+	comparison = compare_engines(inputs,
+					split_commandline(commandlines['native'])['output'],
+					split_commandline(commandlines['trimmomatic'])['output'])
+
+	reads = comparison['reads']
+	report = {'inputs' : inputs,
+			  'steps' : split_commandline(commandlines['native'])['steps'],
+			  'identical' : not comparison['mismatches'],
+			  'wall' : dict((engine, round(wall, 3))
+							for engine, wall in walls.items()),
+			  'reads_per_second' : dict((engine, round(reads / wall, 1))
+										for engine, wall in walls.items()),
+			  'speedup' : round(walls['trimmomatic'] / walls['native'], 3)}
+	report.update(comparison)
+
+	filename = options['report'] or os.path.join(work, 'engine_report.json')
+	with open(filename, 'w') as out:
+		json.dump(report, out, indent=1, sort_keys=True)
+
+	sys.stdout.write("{0} reads compared, steps : {1}\n".format(reads,
+												' '.join(report['steps'])))
+	sys.stdout.write("native : {0:.2f} s, trimmomatic : {1:.2f} s (native \
+{2:.2f}x faster)\n".format(walls['native'], walls['trimmomatic'],
+						   report['speedup']))
+
+	if report['identical']:
+		sys.stdout.write("Outputs identical (report : {0})\n".format(filename))
+		sys.exit(0)
+
+	sys.exit("Error : The outputs differ ({0}, report : {1}).".format(
+			 ', '.join('{0} {1}'.format(count, kind) for kind, count in
+					   sorted(comparison['mismatches'].items())), filename))
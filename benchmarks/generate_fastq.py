@@ -0,0 +1,412 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script generates synthetic fastq files (single ends or paired ends
+	data) for the benchmarks of the main script that launch Trimmomatic. The
+	reads are drawn from a random genome with a given seed : the same
+	parameters always give the same files.
+
+	The reads have a given length, the fragments an insert size drawn from a
+	normal distribution. A part of the fragments (the adapter read-through
+	rate) are shorter than the reads : the reads go on into the adapters of
+	'Adapters.fasta'. The qualities decay along the reads following a
+	profile ('flat', 'linear' or 'exponential'), encoded in phred33 or
+	phred64. The files can be compressed by gzip or bzip2. """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+import argparse
+import bz2
+import gzip
+import math
+import os
+import random
+import string
+import sys
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# adapters file of the tool
+ADAPTERS = os.path.join(os.path.dirname(os.path.dirname(
+									os.path.abspath(__file__))), 'Adapters.fasta')
+
+# size of the random genome the fragments are drawn from
+GENOME_SIZE = 1048576
+
+# number of quality strings drawn for each profile (reads pick one of them)
+QUALITY_BANK = 4096
+
+# highest and lowest quality of the profiles
+QUALITY_MAX = 40
+QUALITY_MIN = 2
+
+# reads written at once
+BATCH_SIZE = 10000
+
+# complement of the bases (str.maketrans is python 3 only)
+try:
+	COMPLEMENT = str.maketrans('ACGTN', 'TGCAN')
+except AttributeError:
+	COMPLEMENT = string.maketrans('ACGTN', 'TGCAN')
+
+
+
+def read_adapters(filename):
+	"""
+	Function that reads the adapter sequences of a fasta file.
+
+	Takes one argument :
+		- filename [string] : the fasta file
+
+	Returns:
+		- adapters [list] : the sequences, in the order of the file
+	"""
+
+	adapters = []
+
+	with open(filename) as fasta:
+		for line in fasta:
+			line = line.strip()
+
+			if line.startswith('>'):
+				adapters.append('')
+			elif(line and adapters):
+				adapters[-1] += line.upper()
+
+	return adapters
+
+
+
+def reverse_complement(sequence):
+	"""
+	Function that gives the reverse complement of a sequence.
+
+	Takes one argument :
+		- sequence [string] : the sequence
+
+	Returns:
+		- [string] : its reverse complement
+	"""
+
+	return sequence[::-1].translate(COMPLEMENT)
+
+
+
+def random_genome(rng, size):
+	"""
+	Function that draws a random genome.
+
+	Takes 2 arguments :
+		- rng [Random] : the random generator
+		- size [integer] : number of bases
+
+	Returns:
+		- [string] : the genome
+	"""
+
+	# Random.choices is python 3.6 only
+	if hasattr(rng, 'choices'):
+		return ''.join(rng.choices('ACGT', k=size))
+
+	return ''.join(rng.choice('ACGT') for i in range(size))
+
+
+
+def quality_profile(profile, length):
+	"""
+	Function that gives the mean quality of each position of the reads.
+
+	Takes 2 arguments :
+		- profile [string] : 'flat', 'linear' (from the highest quality to
+							 the lowest one) or 'exponential' (high, then
+							 falling at the end of the reads)
+		- length [integer] : length of the reads
+
+	Returns:
+		- means [list] : the mean quality of each position
+	"""
+
+	span = QUALITY_MAX - QUALITY_MIN
+	means = []
+
+	for i in range(length):
+		x = float(i) / max(1, length - 1)
+
+		if(profile == 'flat'):
+			means.append(QUALITY_MAX - 4)
+		elif(profile == 'linear'):
+			means.append(QUALITY_MAX - span * x)
+		else :
+			means.append(QUALITY_MAX - span * (math.exp(4 * x) - 1)
+						 / (math.exp(4) - 1))
+
+	return means
+
+
+
+def quality_bank(rng, profile, length, offset):
+	"""
+	Function that draws quality strings following a profile (a normal noise
+	around the mean quality of each position).
+
+	Takes 4 arguments :
+		- rng [Random] : the random generator
+		- profile [string] : the quality profile (see quality_profile)
+		- length [integer] : length of the reads
+		- offset [integer] : 33 or 64 (phred encoding)
+
+	Returns:
+		- bank [list] : the quality strings
+	"""
+
+	means = quality_profile(profile, length)
+	bank = []
+
+	for i in range(QUALITY_BANK):
+		qualities = [min(QUALITY_MAX, max(QUALITY_MIN,
+										  int(round(rng.gauss(mean, 3)))))
+					 for mean in means]
+		bank.append(''.join(chr(quality + offset) for quality in qualities))
+
+	return bank
+
+
+
+def draw_fragment(rng, genome, options):
+	"""
+	Function that draws a fragment of the genome : its insert size follows
+	a normal distribution, or is shorter than the reads for the adapter
+	read-through fragments.
+
+	Takes 3 arguments :
+		- rng [Random] : the random generator
+		- genome [string] : the genome
+		- options [dict] : the parameters of the generator
+
+	Returns:
+		- fragment [string] : the fragment (on the forward strand)
+	"""
+
+	length = options['length']
+
+	if(rng.random() < options['adapter_rate']):
+		size = rng.randint(max(1, length // 4), length - 1)
+	else :
+		size = max(length, int(rng.gauss(options['insert_size'],
+										 options['insert_sd'])))
+
+	size = min(size, len(genome))
+	start = rng.randint(0, len(genome) - size)
+
+	return genome[start:start + size]
+
+
+
+def make_read(fragment, adapter, length):
+	"""
+	Function that reads the start of a fragment : a fragment shorter than
+	the reads goes on into the adapter (then into 'A's).
+
+	Takes 3 arguments :
+		- fragment [string] : the fragment, from the side read
+		- adapter [string] : the adapter following the fragment
+		- length [integer] : length of the reads
+
+	Returns:
+		- [string] : the read
+	"""
+
+	read = fragment[:length]
+
+	if(len(read) < length):
+		read = (read + adapter + 'A' * length)[:length]
+
+	return read
+
+
+
+def open_output(filename, compress):
+	"""
+	Function that opens an output fastq file (compressed without name nor
+	date : the same reads always give the same file).
+
+	Takes 2 arguments :
+		- filename [string] : the file
+		- compress [string] : 'gz', 'bz2', or None
+
+	Returns:
+		- [file] : the file opened in binary mode
+	"""
+
+	if(compress == 'gz'):
+		raw = open(filename, 'wb')
+		output = gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0,
+							   compresslevel=6)
+
+		# the gzip file closes the file it writes
+		output.myfileobj = raw
+		return output
+
+	if(compress == 'bz2'):
+		return bz2.BZ2File(filename, 'wb')
+
+	return open(filename, 'wb')
+
+
+
+def output_names(prefix, layout, compress):
+	"""
+	Function that gives the names of the generated files.
+
+	Takes 3 arguments :
+		- prefix [string] : prefix of the files
+		- layout [string] : 'SE' or 'PE'
+		- compress [string] : 'gz', 'bz2', or None
+
+	Returns:
+		- names [list] : the files ('prefix.fastq', or 'prefix_1.fastq' and
+						 'prefix_2.fastq', with the compression extension)
+	"""
+
+	extension = '.fastq' + ('.' + compress if compress != None else '')
+
+	if(layout == 'SE'):
+		return [prefix + extension]
+
+	return [prefix + '_1' + extension, prefix + '_2' + extension]
+
+
+
+def generate(options):
+	"""
+	Function that generates the fastq files.
+
+	Takes one argument :
+		- options [dict] : the parameters of the generator (layout, reads,
+						   length, insert_size, insert_sd, adapter_rate,
+						   profile, phred, compress, seed, adapters, prefix)
+
+	Returns:
+		- names [list] : the generated files
+	"""
+
+	rng = random.Random(options['seed'])
+	genome = random_genome(rng, GENOME_SIZE)
+	bank = quality_bank(rng, options['profile'], options['length'],
+						options['phred'])
+
+	# the read 1 goes on into the first adapter, the read 2 into the
+	# reverse complement of the second one
+	adapters = read_adapters(options['adapters'])
+	adapter_1 = adapters[0]
+	adapter_2 = reverse_complement(adapters[-1])
+
+	names = output_names(options['prefix'], options['layout'],
+						 options['compress'])
+	outputs = [open_output(name, options['compress']) for name in names]
+
+	try:
+		for first in range(0, options['reads'], BATCH_SIZE):
+			records = [[] for output in outputs]
+
+			for number in range(first, min(first + BATCH_SIZE,
+										   options['reads'])):
+				fragment = draw_fragment(rng, genome, options)
+
+				# half of the fragments come from the reverse strand
+				if(rng.random() < 0.5):
+					fragment = reverse_complement(fragment)
+
+				reads = [make_read(fragment, adapter_1, options['length'])]
+				if(options['layout'] == 'PE'):
+					reads.append(make_read(reverse_complement(fragment),
+										   adapter_2, options['length']))
+
+				for i, read in enumerate(reads):
+					records[i].append('@synthetic.{0} {0}/{1}\n{2}\n+\n{3}\n'
+									  .format(number + 1, i + 1, read,
+											  rng.choice(bank)))
+
+			for output, lines in zip(outputs, records):
+				output.write(''.join(lines).encode('ascii'))
+
+	finally:
+		for output in outputs:
+			output.close()
+
+	return names
+
+
+
+def generator_parser():
+	"""
+	Menu of the generator of synthetic fastq files.
+
+	Don't takes any argument
+
+	Return parser
+	"""
+
+	parser = argparse.ArgumentParser(
+		formatter_class=argparse.RawTextHelpFormatter,
+		description='Generates synthetic fastq files for the benchmarks of \
+the trimming tool')
+
+	parser.add_argument("layout", type=str, choices=['SE', 'PE'],
+						help="layout of reads, 'SE' or 'PE'")
+	parser.add_argument("prefix", type=str,
+						help="prefix of the files ('prefix.fastq', or \
+'prefix_1.fastq'\n  and 'prefix_2.fastq')")
+	parser.add_argument("--reads", type=int, default=100000,
+						help="number of reads (or pairs, default : 100000)")
+	parser.add_argument("--length", type=int, default=100,
+						help="length of the reads (default : 100)")
+	parser.add_argument("--insert-size", type=int, default=300,
+						help="mean insert size of the fragments (default : \
+300)")
+	parser.add_argument("--insert-sd", type=int, default=50,
+						help="standard deviation of the insert size \
+(default : 50)")
+	parser.add_argument("--adapter-rate", type=float, default=0.1,
+						help="part of the fragments shorter than the reads \
+(adapter\n  read-through, default : 0.1)")
+	parser.add_argument("--profile", type=str, default='exponential',
+						choices=['flat', 'linear', 'exponential'],
+						help="decay of the qualities along the reads \
+(default :\n  exponential)")
+	parser.add_argument("--phred", type=int, default=33, choices=[33, 64],
+						help="quality encoding (default : 33)")
+	parser.add_argument("--compress", type=str, choices=['gz', 'bz2'],
+						help="compression of the files")
+	parser.add_argument("--seed", type=int, default=1,
+						help="seed of the random generator (default : 1)")
+	parser.add_argument("--adapters", type=str, default=ADAPTERS,
+						help="fasta file of the adapters (default : \
+Adapters.fasta)")
+
+	return parser
+
+
+
+if __name__ == '__main__' :
+
+	options = dict(generator_parser().parse_args()._get_kwargs())
+
+	if(options['reads'] < 1 or options['length'] < 2):
+		sys.exit("Error : At least one read of 2 bases must be generated.")
+
+	if not 0 <= options['adapter_rate'] <= 1:
+		sys.exit("Error : The adapter read-through rate must be between 0 \
+and 1.")
+
+	for name in generate(options):
+		sys.stdout.write(name + '\n')
@@ -0,0 +1,430 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script measures the throughput of the main script that launch
+	Trimmomatic : trimming configurations are launched on synthetic data
+	sets (see generate_fastq, generated once in a data directory) for each
+	engine and number of threads. For each run, the wall time, the reads
+	and megabytes trimmed per second and the peak memory (resident set
+	size) are written in a JSON result file, with a description of the
+	machine, so that the results of two commits or of two nodes can be
+	compared ('--compare'). """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+from generate_fastq import ADAPTERS, generate, output_names
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# location of the benchmarks and of the main script
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(os.path.dirname(BENCHMARKS), 'Filtrage.py')
+
+# synthetic data sets : layout, read length, quality encoding and
+# compression (the other parameters of the generator keep their default)
+DATASETS = {'se-100' : {'layout' : 'SE', 'length' : 100, 'phred' : 33,
+						'compress' : None},
+			'pe-100' : {'layout' : 'PE', 'length' : 100, 'phred' : 33,
+						'compress' : None},
+			'pe-150' : {'layout' : 'PE', 'length' : 150, 'phred' : 33,
+						'compress' : None},
+			'pe-100-gz' : {'layout' : 'PE', 'length' : 100, 'phred' : 33,
+						   'compress' : 'gz'},
+			'pe-100-bz2' : {'layout' : 'PE', 'length' : 100, 'phred' : 33,
+							'compress' : 'bz2'},
+			'se-100-phred64' : {'layout' : 'SE', 'length' : 100, 'phred' : 64,
+								'compress' : None}}
+
+# trimming configurations (options of the main script)
+CONFIGURATIONS = {'quality' : ['-slidingwindow', '4:20', '-minlen', '36'],
+				  'adapters' : ['-illuminaclip', ADAPTERS + ':2:30:10'],
+				  'fused' : ['-illuminaclip', ADAPTERS + ':2:30:10',
+							 '-slidingwindow', '4:20', '-minlen', '36'],
+				  'two-step' : ['-illuminaclip', ADAPTERS + ':2:30:10',
+								'-slidingwindow', '4:20', '-minlen', '36',
+								'--two-step']}
+
+# monotonic clock (time.time if the python version has none)
+clock = getattr(time, 'monotonic', time.time)
+
+
+
+def dataset_files(name, reads, directory):
+	"""
+	Function that gets the files of a data set, generated if they don't
+	exist yet.
+
+	Takes 3 arguments :
+		- name [string] : the data set (see DATASETS)
+		- reads [integer] : number of reads (or pairs)
+		- directory [string] : directory of the generated data sets
+
+	Returns:
+		- files [list] : the fastq files of the data set
+	"""
+
+	dataset = DATASETS[name]
+	prefix = os.path.join(directory, '{0}-{1}'.format(name, reads))
+	files = output_names(prefix, dataset['layout'], dataset['compress'])
+
+	if not all(os.path.isfile(filename) for filename in files):
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+
+		options = {'layout' : dataset['layout'], 'reads' : reads,
+				   'length' : dataset['length'], 'insert_size' : 300,
+				   'insert_sd' : 50, 'adapter_rate' : 0.1,
+				   'profile' : 'exponential', 'phred' : dataset['phred'],
+				   'compress' : dataset['compress'], 'seed' : 1,
+				   'adapters' : ADAPTERS, 'prefix' : prefix}
+
+		sys.stderr.write("Generating the data set '{0}' ({1} reads)...\n"
+						 .format(name, reads))
+		generate(options)
+
+	return files
+
+
+
+def run_trimming(args, directory):
+	"""
+	Function that launches a trimming and measures it.
+
+	Takes 2 arguments :
+		- args [list] : the commandline
+		- directory [string] : the working directory (created empty)
+
+	Returns:
+		- measure [dict] : the return code ('code'), the wall time in seconds
+						   ('wall'), the peak resident set size of the
+						   largest process in MB ('peak_rss_mb') and the
+						   statistics of the run (see trim_stats)
+	"""
+
+	if os.path.isdir(directory):
+		shutil.rmtree(directory)
+	os.makedirs(directory)
+
+	start = clock()
+
+	with open(os.path.join(directory, 'benchmark.log'), 'w') as log:
+		prog = subprocess.Popen(args, cwd=directory, stdout=log,
+								stderr=subprocess.STDOUT)
+
+		# the resources of the process (and of its children) only
+		pid, status, usage = os.wait4(prog.pid, 0)
+
+	wall = clock() - start
+
+	# the process is already waited
+	prog.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else 1
+
+	# kilobytes on linux, bytes on macOS
+	rss = usage.ru_maxrss / (1024.0 ** 2 if sys.platform == 'darwin' else 1024.0)
+
+	try:
+		with open(os.path.join(directory, 'trim_stats.json')) as stats:
+			stats = json.load(stats)
+	except (IOError, ValueError):
+		stats = {}
+
+	return {'code' : prog.returncode, 'wall' : wall,
+			'peak_rss_mb' : round(rss, 1), 'stats' : stats}
+
+
+
+def median(values):
+	"""
+	Function that gives the median of values.
+
+	Takes one argument :
+		- values [list] : the values (numbers)
+
+	Returns:
+		- [float] : their median
+	"""
+
+	values = sorted(values)
+	middle = len(values) // 2
+
+	if(len(values) % 2):
+		return values[middle]
+
+	return (values[middle - 1] + values[middle]) / 2.0
+
+
+
+def benchmark(dataset, configuration, engine, threads, options):
+	"""
+	Function that measures a trimming configuration on a data set (the
+	median of the repeated runs).
+
+	Takes 5 arguments :
+		- dataset [string] : the data set (see DATASETS)
+		- configuration [string] : the configuration (see CONFIGURATIONS)
+		- engine [string] : 'trimmomatic' or 'native'
+		- threads [integer] : number of threads
+		- options [dict] : the options of the benchmarks (reads, repeat,
+						   data and work directories)
+
+	Returns:
+		- result [dict] : the parameters of the run, its median wall time,
+						  reads and MB trimmed per second, peak memory and
+						  survival, or its error
+	"""
+
+	files = dataset_files(dataset, options['reads'], options['data'])
+
+	args = [sys.executable, SCRIPT, DATASETS[dataset]['layout']] + files
+	args += ['-threads', str(threads), '--engine', engine,
+			 '-phred', str(DATASETS[dataset]['phred'])]
+	args += CONFIGURATIONS[configuration]
+
+	result = {'dataset' : dataset, 'configuration' : configuration,
+			  'engine' : engine, 'threads' : threads,
+			  'reads' : options['reads'],
+			  'input_mb' : round(sum(os.path.getsize(filename)
+									 for filename in files) / 1048576.0, 3)}
+
+	directory = os.path.join(options['work'], '{0}-{1}-{2}-{3}'.format(
+									dataset, configuration, engine, threads))
+	measures = []
+
+	for i in range(options['repeat']):
+		measure = run_trimming(args, directory)
+
+		if(measure['code'] != 0):
+			result['error'] = "return code {0} (see {1})".format(
+						measure['code'], os.path.join(directory, 'benchmark.log'))
+			return result
+
+		measures.append(measure)
+
+	wall = median([measure['wall'] for measure in measures])
+	stats = measures[-1]['stats']
+
+	result.update({'wall' : round(wall, 3),
+				   'walls' : [round(measure['wall'], 3) for measure in measures],
+				   'reads_per_second' : round(options['reads'] / wall, 1),
+				   'mb_per_second' : round(result['input_mb'] / wall, 3),
+				   'peak_rss_mb' : max(measure['peak_rss_mb']
+									   for measure in measures),
+				   'survival' : stats.get('survival')})
+
+	return result
+
+
+
+def machine_description():
+	"""
+	Function that describes the machine and the version of the tool the
+	benchmarks are run on.
+
+	Don't takes any argument
+
+	Returns:
+		- [dict] : the host, processors, system, python version, commit of
+				   the tool and date
+	"""
+
+	try:
+		commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+										 cwd=BENCHMARKS,
+										 stderr=subprocess.STDOUT).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		commit = None
+
+	return {'host' : platform.node(), 'processors' : multiprocessing.cpu_count(),
+			'system' : platform.platform(), 'python' : platform.python_version(),
+			'commit' : commit, 'date' : time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+
+def result_key(result):
+	"""
+	Function that gives the key of a result (the results of two files with
+	the same key are compared).
+
+	Takes one argument :
+		- result [dict] : the result (see benchmark)
+
+	Returns:
+		- [tuple] : the data set, configuration, engine, threads and reads
+	"""
+
+	return (result['dataset'], result['configuration'], result['engine'],
+			result['threads'], result['reads'])
+
+
+
+def write_table(results, previous, out):
+	"""
+	Function that writes the results as a table, with the speed-up from
+	previous results.
+
+	Takes 3 arguments :
+		- results [list] : the results (see benchmark)
+		- previous [dict] : previous results by key (see result_key)
+		- out [file] : where the table is written
+
+	Returns nothing
+	"""
+
+	out.write('{0:<16} {1:<10} {2:<12} {3:>7} {4:>9} {5:>12} {6:>8} {7:>9} '
+			  '{8:>8}\n'.format('dataset', 'config', 'engine', 'threads',
+								'wall (s)', 'reads/s', 'MB/s', 'RSS (MB)',
+								'speed-up'))
+
+	for result in results:
+		if 'error' in result:
+			out.write('{0:<16} {1:<10} {2:<12} {3:>7} error : {4}\n'.format(
+					  result['dataset'], result['configuration'],
+					  result['engine'], result['threads'], result['error']))
+			continue
+
+		old = previous.get(result_key(result))
+		speedup = ''
+		if(old != None and old.get('wall')):
+			speedup = '{0:.2f}x'.format(old['wall'] / result['wall'])
+
+		out.write('{0:<16} {1:<10} {2:<12} {3:>7} {4:>9.2f} {5:>12.0f} '
+				  '{6:>8.2f} {7:>9.1f} {8:>8}\n'.format(
+				  result['dataset'], result['configuration'], result['engine'],
+				  result['threads'], result['wall'], result['reads_per_second'],
+				  result['mb_per_second'], result['peak_rss_mb'], speedup))
+
+
+
+def benchmark_parser():
+	"""
+	Menu of the benchmarks.
+
+	Don't takes any argument
+
+	Return parser
+	"""
+
+	parser = argparse.ArgumentParser(
+		formatter_class=argparse.RawTextHelpFormatter,
+		description='Measures the throughput of the trimming tool on \
+synthetic data sets')
+
+	parser.add_argument("--datasets", type=str, default='se-100,pe-100',
+						help="data sets, separated by commas (default : \
+se-100,pe-100)\n  among : {0}".format(', '.join(sorted(DATASETS))))
+	parser.add_argument("--configurations", type=str, default='quality,fused',
+						help="trimming configurations, separated by commas \
+(default :\n  quality,fused) among : {0}".format(', '.join(
+														sorted(CONFIGURATIONS))))
+	parser.add_argument("--engines", type=str, default='trimmomatic',
+						help="trimming engines, separated by commas (default \
+: trimmomatic)")
+	parser.add_argument("--threads", type=str, default='1',
+						help="numbers of threads, separated by commas \
+(default : 1)")
+	parser.add_argument("--reads", type=int, default=200000,
+						help="number of reads (or pairs) of the data sets \
+(default : 200000)")
+	parser.add_argument("--repeat", type=int, default=3,
+						help="runs of each benchmark, the median is kept \
+(default : 3)")
+	parser.add_argument("--data", type=str,
+						default=os.path.join(BENCHMARKS, 'data'),
+						help="directory of the generated data sets (default \
+:\n  benchmarks/data)")
+	parser.add_argument("--work", type=str,
+						default=os.path.join(BENCHMARKS, 'work'),
+						help="working directory of the runs (default : \
+benchmarks/work)")
+	parser.add_argument("--output", type=str,
+						help="result file (default : \
+benchmarks/results/<host>-<date>.json)")
+	parser.add_argument("--compare", type=str, metavar='RESULTS',
+						help="previous result file to compare with")
+
+	return parser
+
+
+
+if __name__ == '__main__' :
+
+	options = dict(benchmark_parser().parse_args()._get_kwargs())
+
+	datasets = options['datasets'].split(',')
+	configurations = options['configurations'].split(',')
+	engines = options['engines'].split(',')
+
+	for name in datasets:
+		if name not in DATASETS:
+			sys.exit("Error : Unknown data set '{0}'.".format(name))
+
+	for name in configurations:
+		if name not in CONFIGURATIONS:
+			sys.exit("Error : Unknown configuration '{0}'.".format(name))
+
+	for name in engines:
+		if name not in ('trimmomatic', 'native'):
+			sys.exit("Error : Unknown engine '{0}'.".format(name))
+
+	try:
+		threads = [int(number) for number in options['threads'].split(',')]
+	except ValueError:
+		sys.exit("Error : The numbers of threads must be integers.")
+
+	if(options['reads'] < 1 or options['repeat'] < 1 or min(threads) < 1):
+		sys.exit("Error : The reads, repeats and threads must be at least 1.")
+
+	previous = {}
+	if(options['compare'] != None):
+		with open(options['compare']) as old:
+			for result in json.load(old)['results']:
+				previous[result_key(result)] = result
+
+	machine = machine_description()
+	results = []
+
+	for dataset in datasets:
+		for configuration in configurations:
+			for engine in engines:
+				for number in threads:
+					result = benchmark(dataset, configuration, engine, number,
+									   options)
+					results.append(result)
+
+					sys.stderr.write("{0} {1} {2} {3} threads : {4}\n".format(
+						dataset, configuration, engine, number,
+						result.get('error', '{0} s'.format(result.get('wall')))))
+
+	output = options['output']
+	if(output == None):
+		output = os.path.join(BENCHMARKS, 'results', '{0}-{1}.json'.format(
+						machine['host'], machine['date'].replace(':', '')))
+
+	if not os.path.isdir(os.path.dirname(os.path.abspath(output))):
+		os.makedirs(os.path.dirname(os.path.abspath(output)))
+
+	with open(output, 'w') as out:
+		json.dump({'machine' : machine, 'results' : results}, out, indent=1,
+				  sort_keys=True)
+
+	write_table(results, previous, sys.stdout)
+	sys.stdout.write('Results written in {0}\n'.format(output))
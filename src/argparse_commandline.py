@@ -25,12 +25,38 @@ from argparse import RawTextHelpFormatter
 
 from checking_entries import *
 from commandline import *
+from resources import AUTO
+from streams import STREAM, is_stream
 
 
 #------------------------- Definition Of Functions ----------------------------#
 
 
 
+def threads_number(text):
+	"""
+	Function that reads the value of the option '-threads'.
+	
+	Takes one argument :
+		text [string] : the value
+	
+	Returns:
+		- [integer] : the number of threads
+		- 'auto' [string] : to size the run automatically (see resources)
+		or raise argparse.ArgumentTypeError
+	"""
+	
+	if(text.lower() == AUTO):
+		return AUTO
+	
+	try:
+		return int(text)
+	except ValueError:
+		raise argparse.ArgumentTypeError("invalid value : '{0}' (a number or \
+'auto')".format(text))
+
+
+
 def Trimmomatic_parser():
 	"""
 	Menu of the programme Trimmomatic (An adapter and Quality Trimming Tool).
@@ -61,6 +87,113 @@ quality trimming.")
 						const='XML', 
 						help='use the XML file or not"')
 	
+	parser.add_argument("--two-step", 
+						action='store_const', 
+						const='two-step', 
+						help="launch adapter trimming and quality trimming as \
+two separate\n  Trimmomatic runs instead of a single one")
+	
+	parser.add_argument("--engine", 
+						type=str, 
+						action='store', 
+						default='trimmomatic', 
+						choices=['trimmomatic', 'native'], 
+						help="trimming engine.\n  'trimmomatic' (default) : \
+the Trimmomatic jar (java)\n  'native' : python/numpy engine, without java (the \
+steps it can't do\n  are launched with Trimmomatic)")
+	
+	parser.add_argument("--shards", 
+						type=int, 
+						action='store', 
+						default=1, 
+						help="split the input files into N parts trimmed at the \
+same time\n  by N processes (outputs are merged in the reads order)")
+	
+	parser.add_argument("--index", 
+						action='store_const', 
+						const='index', 
+						help="index the reads of the input files (a '.fqi' \
+file next to each file,\n  reused by the next runs)")
+	
+	parser.add_argument("--cache", 
+						type=str, 
+						action='store', 
+						metavar='DIR', 
+						help="keep the trimmed reads in the cache directory \
+DIR : a trimming\n  already done with the same inputs and parameters is \
+not done again")
+	
+	parser.add_argument("--cache-size", 
+						type=float, 
+						action='store', 
+						default=50, 
+						metavar='GB', 
+						help="maximal size of the cache (the least recently \
+used trimmings\n  are removed, default : 50 GB)")
+	
+	parser.add_argument("--chrome-trace", 
+						type=str, 
+						action='store', 
+						metavar='FILE', 
+						help="also write the timing of the phases of the run \
+(always written\n  in 'trimming_trace.json') as a Chrome trace in FILE")
+	
+	parser.add_argument("--profile", 
+						action='store_const', 
+						const='profile', 
+						help="profile the python side of the run with cProfile \
+(written in\n  'trimming_profile.prof', the slowest functions are printed)")
+	
+	parser.add_argument("--no-class-sharing", 
+						action='store_const', 
+						const='no_class_sharing', 
+						help="start java without the class data sharing archive \
+of the\n  Trimmomatic jar (built the first time, next to the jar)")
+	
+	parser.add_argument("--scratch", 
+						type=str, 
+						action='store', 
+						metavar='DIR[,DIR...]', 
+						help="write the intermediate files of two steps runs \
+(never\n  compressed) in the first of these directories with enough\n  \
+free space (as /dev/shm or a local disk, default : the\n  working directory)")
+	
+	parser.add_argument("--batch", 
+						type=str, 
+						action='store', 
+						metavar='MANIFEST', 
+						help="trim all the samples of a manifest (XML or \
+tabulated file),\n  several samples at the same time sharing the threads \
+given\n  by '-threads' (default : all the processors)")
+	
+	parser.add_argument("--daemon", 
+						type=str, 
+						action='store', 
+						metavar='SOCKET', 
+						help="launch a trimming daemon listening on the Unix \
+socket SOCKET :\n  jobs (JSON) are trimmed by warm workers, the highest \
+priority first")
+	
+	parser.add_argument("--workers", 
+						type=int, 
+						action='store', 
+						help="number of warm workers of the daemon (jobs \
+trimmed at the same time,\n  default : all the processors)")
+	
+	parser.add_argument("--submit", 
+						type=str, 
+						action='store', 
+						metavar='SOCKET', 
+						help="send the trimming to the daemon listening on \
+SOCKET and wait\n  for its end")
+	
+	parser.add_argument("--priority", 
+						type=int, 
+						action='store', 
+						default=0, 
+						help="priority of a job sent with '--submit' (the \
+highest first, default : 0)")
+	
 	parser.add_argument("layout", 
 						type=str, 
 						nargs='?',
@@ -74,13 +207,40 @@ or 'PE' (paired-ends)")
 						action='store',
 						help = "input read file.\n  Usage:\n  For SE \
 'readfile.fastq' || 'readfile.fq.gz'\n  For PE 'read_1.fastq read_2.fastq' || \
-'read_1.fastq.gz/bz2 read_2.fastq.gz/bz2'")
+'read_1.fastq.gz/bz2 read_2.fastq.gz/bz2'\n  '-' : the standard input (or a named pipe)")
+	
+	parser.add_argument("--output", 
+						type=str, 
+						nargs='+', 
+						dest='outputs', 
+						metavar='FILE', 
+						help="output files (default : trimmed_*/single_* in \
+the working\n  directory). For SE one file, for PE the two trimmed \
+files\n  and, if given, the two singletons files. '-' : the standard\n  \
+output (the messages are written to the standard error),\n  named pipes \
+are written as files")
+	
+	parser.add_argument("--interleaved", 
+						action='store_const', 
+						const='interleaved', 
+						help="paired-ends reads given in a single interleaved \
+file (the two\n  reads of each pair one after the other, checked to be \
+mates),\n  written in a single interleaved file and, if given or by\n  \
+default, a single singletons file")
 	
 	parser.add_argument("-threads",
-						type=int,
+						type=threads_number,
 						action='store',
-						default= 1,
-						help = 'number of threads to use')
+						help = "number of threads to use (default : 1), or \
+'auto' to size the\n  threads and the memory of java from the processors, \
+the\n  free memory and the input files")
+	
+	parser.add_argument("--memory", 
+						type=int, 
+						action='store', 
+						metavar='MB', 
+						help="memory the run may use, in MB (sizes the heap \
+of java,\n  default with '-threads auto' : the free memory)")
 	
 	parser.add_argument("-phred",
 						type=int,
@@ -135,7 +295,21 @@ read.\n  Usage: '-head <number>'")
 						action='store',
 						help="minimum required length of a read to be kept.\n \
  Usage: '-minlen <length>'")
+	
+	parser.add_argument("-avgqual",
+						type=int,
+						action='store',
+						help="minimum average quality required to keep a \
+read.\n  Usage: '-avgqual <required-quality>'")
 		
+	parser.add_argument("-compress",
+						type=str,
+						action='store',
+						choices=['gz', 'bz2', 'bgzf'],
+						help="compression of the output files, by several \
+threads.\n  'bgzf' : gzip files made of small blocks (random access)\n  \
+Usage: '-compress <format>'")
+	
 	parser.add_argument("-tophred33",
 						action='store_const',
 						const='TOPHRED33',
@@ -199,6 +373,12 @@ def nb_inputs(arg):
 		if not len(arg['input']) == 1 :
 			sys.exit("Error : For layout 'SE' you must give one read file.")
 
+	# For interleaved Paired Ends, one input file is expected
+	elif(arg.get('interleaved') != None):
+		if not len(arg['input']) == 1 :
+			sys.exit("Error : For interleaved reads you must give one read \
+file.")
+
 	# For Paired Ends, two input files are expected
 	else:
 		if not len(arg['input']) == 2 :
@@ -210,7 +390,8 @@ def nb_inputs(arg):
 
 def check_input(arg):
 	"""
-	Function that check the extension of input files.
+	Function that check the extension of input files, and their index 
+	(built if asked, see fastq_index).
 	
 	Takes one argument :
 		arg [dict] : dictionnary containning all the command argument entries.
@@ -223,9 +404,67 @@ def check_input(arg):
 		quit
 	"""
 	
-	# check each file given in input
+	# check each file given in input (streams have no extension)
 	for files in arg['input']:
+		if is_stream(files):
+			continue
+		
 		check_extension(files) # from checking_entries module
+		
+		# build the index of the file or check the one found next to it
+		if(arg.get('index') != None):
+			update_index(files)
+		else :
+			check_index(files)
+
+
+
+def check_outputs(arg):
+	"""
+	Function that check the number of output files given by the user,
+	depending on the layout, and that the standard input and output are
+	given once.
+	
+	Takes one argument :
+		arg [dict] : dictionnary containning all the command argument entries.
+	
+	Returns:
+		- 1 [integer] : if the output files are the expected ones
+		or
+		quit
+	"""
+	
+	outputs = arg.get('outputs') or []
+	
+	# interleaved reads are paired ends reads
+	if(arg.get('interleaved') != None and arg['layout'] != 'PE'):
+		sys.exit("Error : Interleaved reads can only be given for layout 'PE'.")
+	
+	# a single standard input and output
+	if(arg['input'].count(STREAM) > 1 or outputs.count(STREAM) > 1):
+		sys.exit("Error : The standard input and output ('-') can only be \
+given once.")
+	
+	if not outputs:
+		return 1
+	
+	# For Single Ends, one output file is expected
+	if(arg['layout'] == 'SE' and len(outputs) != 1):
+		sys.exit("Error : For layout 'SE' you must give one output file.")
+	
+	# For interleaved Paired Ends, the trimmed file (and the singletons file)
+	if(arg.get('interleaved') != None):
+		if(len(outputs) not in (1, 2)):
+			sys.exit("Error : For interleaved reads you must give one output \
+file (or two with the singletons file).")
+		return 1
+	
+	# For Paired Ends, the trimmed files (and the singletons files)
+	if(arg['layout'] == 'PE' and len(outputs) not in (2, 4)):
+		sys.exit("Error : For layout 'PE' you must give two output files (or \
+four with the singletons files).")
+	
+	return 1
 
 
 
@@ -277,10 +516,11 @@ def check_illuminaclip(arg):
 		# separates arguments
 		illum = illum.split(':')
 		
-		# verify the number of arguments between ':'.
-		if not len(illum) == 4:
+		# verify the number of arguments between ':' (the minimum adapter 
+		# length and keep both reads of the palindrome mode are optional)
+		if not 4 <= len(illum) <= 6:
 			sys.exit("Error : Option illuminaclip must avec 4 elements between \
-':'")
+':' (or 6 with the palindrome mode options)")
 		
 		# get fasta file
 		fasta_file=illum[0]
@@ -306,6 +546,15 @@ integer")
 			sys.exit("Error: Value for simple clip threshold must be an \
 integer")
 		
+		# check that an integer is entered for min adapter length
+		if(len(illum) > 4 and not illum[4].isdigit()):
+			sys.exit("Error: Value for min adapter length must be an integer")
+		
+		# check that true or false is entered for keep both reads
+		if(len(illum) > 5 and illum[5].lower() not in ('true', 'false')):
+			sys.exit("Error: Value for keep both reads must be 'true' or \
+'false'")
+		
 		return 1
 		
 	else:
@@ -421,6 +670,25 @@ def check_args(arg):
 	
 	# check input files extension
 	check_input(arg)
+	
+	# check the output files given by the user
+	check_outputs(arg)
+
+	# Single Ends read file is given alone (as in XML parameters)
+	if(arg['layout'] == 'SE'):
+		arg['input'] = arg['input'][0]
+
+	# one thread if not given
+	if(arg['threads'] == None):
+		arg['threads'] = 1
+
+	# outputs are compressed only if asked (BGZF files are gzip files)
+	if(arg.get('compress') == None):
+		arg.pop('compress', None)
+
+	elif(arg['compress'] == 'bgzf'):
+		arg['compress'] = 'gz'
+		arg['bgzf'] = 'yes'
 
 	# check phred quality
 	check_phred(arg)
@@ -457,7 +725,7 @@ def argparse_commandline_step_1(loc,arg,nb, inout):
 	"""
 	
 	# base command line
-	cmd = 'java -jar {0}trimmomatic-0.33.jar'.format(loc[:-3])
+	cmd = java_command(loc)
 
 	# adding layout and input and output files
 	cmd, inout = commandline_input_output(arg, cmd, nb, inout) # from commandline
@@ -520,6 +788,10 @@ def argparsecmd_quality(arg,cmd):
 		cmd += ' MINLEN:{0}'.format(arg['minlen'])
 		flag = 1
 
+	if(arg.get('avgqual') != None):
+		cmd += ' AVGQUAL:{0}'.format(arg['avgqual'])
+		flag = 1
+
 	if(arg['tophred33']):
 		cmd += ' {0}'.format(arg['tophred33'])
 		flag = 1
@@ -552,7 +824,7 @@ def argparse_commandline_step_2(loc,arg, nb, inout):
 	"""
 	
 	# base command line
-	cmd = 'java -jar {0}trimmomatic-0.33.jar'.format(loc[:-3])
+	cmd = java_command(loc)
 	
 	# adding layout and input and output files
 	cmd, inout = commandline_input_output(arg, cmd, nb, inout)
@@ -561,3 +833,38 @@ def argparse_commandline_step_2(loc,arg, nb, inout):
 	cmd = argparsecmd_quality(arg, cmd)
 
 	return cmd
+
+
+
+def argparse_commandline_fused(loc, arg, nb, inout):
+	"""
+	Function that generate a single command line for Trimmomatic doing both 
+	adapter trimming and quality trimming in one pass.
+	
+	Takes 4 argument :
+		loc [string] : location of the 'src' directory
+		arg [dict] : dictionnary containning all the command argument entries.
+		nb [integer] : number of executed command
+		inout [dict] : dictionnary containning all the input and output files
+	
+	Returns:
+		- cmd [string] : fused command line
+		or
+		None : if adapter trimming or quality trimming is not asked
+	"""
+	
+	# base command line
+	cmd = java_command(loc)
+	
+	# adding layout and input and output files
+	cmd, inout = commandline_input_output(arg, cmd, nb, inout)
+	
+	# ILLUMINACLIP step first, then quality trimming steps
+	if(arg['illuminaclip'] != None):
+		cmd += ' ILLUMINACLIP:{0}'.format(arg['illuminaclip'])
+		cmd = argparsecmd_quality(arg, cmd)
+	
+	else :
+		cmd = None
+	
+	return cmd
@@ -0,0 +1,408 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions to trim many samples listed in a batch
+	manifest (a XML file or a tabulated file) : samples are trimmed at the
+	same time, the biggest ones first, sharing a global number of threads.
+	The statistics of the samples are rolled up in 'batch_stats.json'. """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+from checking_entries import *
+from named_pipes import stop_process
+from trim_stats import BATCH_STATS_FILE, batch_stats
+
+import os
+import subprocess
+import sys
+import time
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# trimming options of the commandline which can be changed for a sample
+SAMPLE_OPTIONS = ['phred', 'illuminaclip', 'slidingwindow', 'maxinfo',
+				  'leading', 'trailing', 'crop', 'headcrop', 'minlen',
+				  'avgqual', 'tophred33', 'tophred64', 'compress']
+
+# value removing an option of the commandline for a sample
+SKIP_VALUE = 'skip'
+
+
+
+def new_sample(name, layout, inputs, directory, options, location):
+	"""
+	Function that checks the description of a sample of the manifest.
+
+	Takes 6 arguments :
+		- name [string] : name of the sample
+		- layout [string] : 'SE' or 'PE'
+		- inputs [list] : read files of the sample
+		- directory [string] : working directory of the sample (its name if
+							   empty)
+		- options [dict] : trimming options given for this sample only
+		- location [string] : where the sample is described in the manifest
+
+	Returns:
+		- sample [dict] : the sample ('name', 'layout', 'input', 'output',
+						  'options')
+		or quit
+	"""
+
+	name = not_empty(name)
+	if not name:
+		sys.exit("Error : A sample has no name ({0}).".format(location))
+
+	layout = not_empty(layout)
+	if not layout or layout.upper() not in ('SE', 'PE'):
+		sys.exit("Error : Layout of sample '{0}' can only be 'SE' or 'PE'."
+				 .format(name))
+	layout = layout.upper()
+
+	inputs = [not_empty(filename) for filename in inputs]
+	inputs = [filename for filename in inputs if filename]
+
+	if(len(inputs) != (1 if layout == 'SE' else 2)):
+		sys.exit("Error : Sample '{0}' must have one read file for 'SE' or \
+two read files for 'PE'.".format(name))
+
+	for filename in inputs:
+		check_extension(filename)
+
+	for option in options:
+		if option not in SAMPLE_OPTIONS:
+			sys.exit("Error : Unknown option '{0}' for sample '{1}' (options \
+are : {2}).".format(option, name, ', '.join(SAMPLE_OPTIONS)))
+
+	return {'name' : name, 'layout' : layout, 'input' : inputs,
+			'output' : not_empty(directory) or name, 'options' : options}
+
+
+
+def parse_xml_manifest(filename):
+	"""
+	Function that reads the samples of a XML manifest : a <batch> root with a
+	<sample name="..."> element for each sample, holding <layout>, one or two
+	<input> files, an optional <working-directory> and optional
+	<parameter name="option">value</parameter> trimming options.
+
+	Takes one argument :
+		- filename [string] : the manifest
+
+	Returns:
+		- samples [list] : the samples (see new_sample)
+	"""
+
+	root = ET.parse(filename).getroot()
+
+	samples = []
+	for i, element in enumerate(root.findall('sample')):
+		location = 'sample {0} of {1}'.format(i + 1, filename)
+
+		options = dict((parameter.get('name'), not_empty(parameter.text))
+					   for parameter in element.findall('parameter'))
+
+		samples.append(new_sample(element.get('name'),
+								  element.findtext('layout'),
+								  [read.text for read in element.findall('input')],
+								  element.findtext('working-directory'),
+								  options, location))
+
+	return samples
+
+
+
+def parse_tsv_manifest(filename):
+	"""
+	Function that reads the samples of a tabulated manifest : a header line
+	with the columns 'name', 'layout', 'read_1', 'read_2' (empty for SE),
+	'working-directory' (optional) and optional trimming options columns,
+	then one line per sample. Empty cells keep the commandline options.
+
+	Takes one argument :
+		- filename [string] : the manifest
+
+	Returns:
+		- samples [list] : the samples (see new_sample)
+	"""
+
+	samples = []
+
+	with open(filename) as manifest:
+		lines = [line.rstrip('\r\n') for line in manifest]
+
+	# comments and blank lines are skipped
+	lines = [(i + 1, line) for i, line in enumerate(lines)
+			 if line.strip() and not line.startswith('#')]
+
+	if not lines:
+		return samples
+
+	header = [column.strip() for column in lines[0][1].split('\t')]
+
+	for column in ('name', 'layout', 'read_1'):
+		if column not in header:
+			sys.exit("Error : The manifest '{0}' has no column '{1}'.".format(
+															filename, column))
+
+	for number, line in lines[1:]:
+		location = 'line {0} of {1}'.format(number, filename)
+		cells = dict(zip(header, [cell.strip() for cell in line.split('\t')]))
+
+		options = dict((column, value) for column, value in cells.items()
+					   if column not in ('name', 'layout', 'read_1', 'read_2',
+										 'working-directory') and value)
+
+		samples.append(new_sample(cells.get('name'), cells.get('layout'),
+								  [cells.get('read_1'), cells.get('read_2')],
+								  cells.get('working-directory'), options,
+								  location))
+
+	return samples
+
+
+
+def parse_manifest(filename):
+	"""
+	Function that reads the samples of a batch manifest, a XML file (.xml) or
+	a tabulated file. Two samples can't have the same working directory.
+
+	Takes one argument :
+		- filename [string] : the manifest
+
+	Returns:
+		- samples [list] : the samples (see new_sample)
+		or quit
+	"""
+
+	if not os.path.isfile(filename):
+		sys.exit("Error : The manifest '{0}' doesn't exist.".format(filename))
+
+	if(os.path.splitext(filename)[1].lower() == '.xml'):
+		samples = parse_xml_manifest(filename)
+	else :
+		samples = parse_tsv_manifest(filename)
+
+	if not samples:
+		sys.exit("Error : The manifest '{0}' has no sample.".format(filename))
+
+	directories = [os.path.abspath(sample['output']) for sample in samples]
+	if(len(set(directories)) != len(directories)):
+		sys.exit("Error : Each sample of the manifest must have its own \
+working directory.")
+
+	return samples
+
+
+
+def sample_size(sample):
+	"""
+	Function that gets the size of the read files of a sample (the bigger,
+	the longer its trimming).
+
+	Takes one argument :
+		- sample [dict] : the sample
+
+	Returns:
+		- size [integer] : size of the read files, in bytes
+	"""
+
+	size = 0
+	for filename in sample['input']:
+		if os.path.isfile(filename):
+			size += os.path.getsize(filename)
+
+	return size
+
+
+
+def sample_commandline(sample, arguments, script, threads):
+	"""
+	Function that generates the commandline trimming a sample : the main
+	script launched in the working directory of the sample, with the options
+	of the commandline changed by the options of the sample.
+
+	Takes 4 arguments :
+		- sample [dict] : the sample
+		- arguments [dict] : dictionnary containning all the command argument
+							 entries
+		- script [string] : the main script (Filtrage.py)
+		- threads [integer] : number of threads given to the sample (and
+							  its part of the memory)
+
+	Returns:
+		- args [list] : the commandline
+	"""
+
+	options = dict((option, arguments.get(option)) for option in SAMPLE_OPTIONS)
+
+	# BGZF outputs are given as '.gz' outputs by check_args
+	if 'bgzf' in arguments:
+		options['compress'] = 'bgzf'
+
+	options.update(sample['options'])
+
+	args = [sys.executable, script, sample['layout']]
+	args += [os.path.abspath(filename) for filename in sample['input']]
+	args += ['-threads', str(threads), '--engine', arguments['engine'],
+			 '--shards', str(arguments['shards'])]
+
+	if(arguments['two_step'] != None):
+		args.append('--two-step')
+
+	if(arguments.get('index') != None):
+		args.append('--index')
+
+	if(arguments.get('cache') != None):
+		args += ['--cache', os.path.abspath(arguments['cache']),
+				 '--cache-size', str(arguments['cache_size'])]
+
+	# the memory of the batch is shared as the threads
+	if(arguments.get('memory') != None):
+		args += ['--memory', str(max(1, arguments['memory'] * threads //
+										arguments['threads']))]
+
+	# the trace of each sample is written in its working directory
+	if(arguments.get('chrome_trace') != None):
+		args += ['--chrome-trace', os.path.basename(arguments['chrome_trace'])]
+
+	if(arguments.get('profile') != None):
+		args.append('--profile')
+
+	if(arguments.get('no_class_sharing') != None):
+		args.append('--no-class-sharing')
+
+	# each sample has its own directory in the scratch directories
+	if(arguments.get('scratch') != None):
+		args += ['--scratch', ','.join(os.path.abspath(directory.strip())
+						for directory in arguments['scratch'].split(','))]
+
+	for option in SAMPLE_OPTIONS:
+		value = options[option]
+
+		if(value == None or str(value).lower() == SKIP_VALUE):
+			continue
+
+		# flags (tophred33 and tophred64)
+		if option.startswith('tophred'):
+			if(str(value).lower() not in ('no', 'false')):
+				args.append('-{0}'.format(option))
+			continue
+
+		# the adapter file is found from the working directory of the sample
+		if(option == 'illuminaclip'):
+			value = str(value).split(':')
+			value = ':'.join([os.path.abspath(value[0])] + value[1:])
+
+		args += ['-{0}'.format(option), str(value)]
+
+	return args
+
+
+
+def launch_batch(manifest, arguments, script):
+	"""
+	Function that trims all the samples of a batch manifest. Samples are
+	launched the biggest first, as long as threads are free : the free
+	threads are split between the samples which can be launched (a sample
+	launched when a few samples are left gets more threads). The messages of
+	each sample are written in the file 'output_file_batch.out' of its
+	working directory, the statistics of all samples in the file
+	'batch_stats.json' of the current directory.
+
+	Takes 3 arguments :
+		- manifest [string] : the batch manifest
+		- arguments [dict] : dictionnary containning all the command argument
+							 entries (options used by all the samples, and
+							 the total number of threads)
+		- script [string] : the main script (Filtrage.py)
+
+	Returns:
+		- 0 [integer] : if all samples have been trimmed
+		or quit with the names of the samples that failed
+	"""
+
+	samples = parse_manifest(manifest)
+
+	# longest first : the biggest samples don't end alone
+	pending = sorted(samples, key=sample_size, reverse=True)
+
+	budget = arguments['threads']
+	free = budget
+	running = []
+	failed = []
+	results = []
+
+	try:
+		while pending or running:
+
+			# launching samples while threads are free
+			while pending and free > 0:
+				nb = min(len(pending), free)
+				threads = -(-free // nb)
+
+				sample = pending.pop(0)
+				if not os.path.isdir(sample['output']):
+					os.makedirs(sample['output'])
+
+				log = open(os.path.join(sample['output'],
+										'output_file_batch.out'), 'w')
+				prog = subprocess.Popen(sample_commandline(sample, arguments,
+														   script, threads),
+										cwd=sample['output'], stdout=log,
+										stderr=subprocess.STDOUT)
+
+				running.append((sample, prog, threads, log, time.time()))
+				free -= threads
+
+			time.sleep(0.05)
+
+			for job in list(running):
+				sample, prog, threads, log, start = job
+				code = prog.poll()
+
+				if code == None:
+					continue
+
+				running.remove(job)
+				log.close()
+				free += threads
+
+				if(code == 0):
+					state = 'done'
+				else :
+					state = 'failed (see {0})'.format(log.name)
+					failed.append(sample['name'])
+
+				results.append((sample['name'], sample['output'],
+								'done' if code == 0 else 'failed',
+								time.time() - start))
+
+				sys.stdout.write("Sample '{0}' : {1} in {2:.1f} s ({3} \
+threads)\n".format(sample['name'], state, time.time() - start, threads))
+				sys.stdout.flush()
+
+	finally:
+		# an error or an interruption stops the samples still running
+		for sample, prog, threads, log, start in running:
+			stop_process(prog)
+			log.close()
+
+	batch_stats(results, BATCH_STATS_FILE)
+
+	if failed:
+		sys.exit("Error : The trimming of {0} sample(s) failed : {1}".format(
+												len(failed), ', '.join(failed)))
+
+	return 0
@@ -17,6 +17,10 @@ __date__ = "2015/05"
 import xml.etree.ElementTree as ET
 import sys
 import os.path
+import gzip
+import bz2
+
+from fastq_index import *
 
 #------------------------ Définition des fonctions ----------------------------#
 
@@ -161,7 +165,7 @@ fastq/fq.gzip or fastq/fq]\n')
 def check_input(text) :
 	"""
 	Function that check that the entry of the input file is not empty and that 
-	it has the right extension
+	it has the right extension (and the index of the file, if it has one)
 
 	Takes one argument: text [string]
 
@@ -180,6 +184,9 @@ def check_input(text) :
 		
 		# check extensions of the file
 		if(check_extension(input_file)):
+			
+			# an index found next to the file is checked
+			check_index(input_file)
 			return input_file
 		
 	else :
@@ -201,7 +208,7 @@ def check_child_number(tree, number):
 	"""
 	
 	# getting the number of child
-	nb_child = len(tree.getchildren())
+	nb_child = len(list(tree))
 	
 	# checking if it's equal to the expected one
 	if(nb_child == number): 
@@ -518,11 +525,12 @@ def check_format(text, location):
 
 		checked_text = checked_text.lower()
 
-		if(checked_text == 'bz2' or checked_text == 'gz'):
+		if(checked_text in ('bz2', 'gz', 'bgzf')):
 			return checked_text
 
 		else :
-			sys.exit("Value for format in %s can only be 'bz2' or 'gz'." %location)
+			sys.exit("Value for format in %s can only be 'bz2', 'gz' or 'bgzf'." \
+%location)
 
 	else :
 		sys.exit("You haven't enter a text for %s." %location)
@@ -552,3 +560,75 @@ def get_file_prefix(text):
 		return prefix
 
 	
+
+
+
+def detect_phred(text):
+	"""
+	Function that detects the quality encoding of a fastq file (compressed or 
+	not) the same way as Trimmomatic : quality characters of the first 10000 
+	reads are counted as phred33 (from '!' to ':') or phred64 (from 'P' to 
+	'h') characters.
+
+	Takes one argument : text [string] : the fastq file
+
+	Returns one argument :
+		- 33 or 64 [integer] : the quality encoding
+		- or quit : if the encoding can't be detected
+	"""
+
+	# opening the file depending on its compression
+	ext = os.path.splitext(text)[1]
+	
+	if(ext == '.gz'):
+		fastq = gzip.open(text, 'rb')
+	elif(ext == '.bz2'):
+		fastq = bz2.BZ2File(text, 'rb')
+	else :
+		fastq = open(text, 'rb')
+
+	with fastq :
+		return phred_encoding(fastq, text)
+
+
+
+def phred_encoding(lines, text):
+	"""
+	Function that detects the quality encoding of the lines of a fastq file
+	(see detect_phred).
+
+	Takes 2 arguments :
+		- lines [iterable] : the lines of the file (bytes)
+		- text [string] : the fastq file (for the error message)
+
+	Returns one argument :
+		- 33 or 64 [integer] : the quality encoding
+		- or quit : if the encoding can't be detected
+	"""
+
+	count_33 = 0
+	count_64 = 0
+
+	for i, line in enumerate(lines):
+
+		# only the first 10000 reads are used
+		if(i >= 40000):
+			break
+
+		# quality line of a read
+		if(i % 4 == 3):
+			for char in bytearray(line.rstrip()):
+				if(33 <= char < 59):
+					count_33 += 1
+				elif(80 <= char < 105):
+					count_64 += 1
+
+	if(count_33 == 0 and count_64 > 0):
+		return 64
+
+	elif(count_64 == 0 and count_33 > 0):
+		return 33
+
+	else :
+		sys.exit("Error : Unable to detect quality encoding of '{0}'".format(
+																		text))
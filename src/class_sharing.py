@@ -0,0 +1,385 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions to start the java virtual machine of
+	Trimmomatic faster with a class data sharing archive : the classes loaded
+	by a short trimming of a few reads are written once in an archive (next
+	to the Trimmomatic jar, or in a cache directory), mapped by the next java
+	virtual machines instead of being loaded and checked again. An archive
+	is kept for each content of the jar and each version of java ; a java
+	virtual machine which can't build an archive is started without. """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+from trim_stats import write_stats
+
+import hashlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# name of the archives (with the key of the jar and of java) and of their
+# index, next to the Trimmomatic jar or in the cache directory
+ARCHIVE_NAME = 'trimmomatic-0.33-{0}.jsa'
+ARCHIVE_INDEX = 'trimmomatic-0.33-jsa.json'
+
+# cache directory of the archives when the directory of the jar can't be
+# written
+CACHE_DIRECTORY = os.path.join(os.environ.get('XDG_CACHE_HOME',
+							   os.path.join(os.path.expanduser('~'), '.cache')),
+							   'rna-seq-trimming-tool')
+
+# reads of the training trimming (pairs) and their length
+TRAINING_READS = 2000
+TRAINING_LENGTH = 100
+
+# adapter read by the training reads (TruSeq universal adapter)
+TRAINING_ADAPTER = 'AGATCGGAAGAGCACACGTCTGAACTCCAGTCAC'
+
+# trimming steps of the training trimming (the quality encoding is detected)
+TRAINING_STEPS = ['ILLUMINACLIP:{adapters}:2:30:10', 'HEADCROP:2', 'CROP:95',
+				  'LEADING:3', 'TRAILING:3', 'SLIDINGWINDOW:4:15',
+				  'MAXINFO:40:0.5', 'AVGQUAL:20', 'TOPHRED64', 'MINLEN:36']
+
+# options of java used by the Trimmomatic commandlines (see java_command)
+SHARING = {'options' : []}
+
+
+
+def java_binary():
+	"""
+	Function that finds the 'java' command launched by the commandlines.
+
+	Don't takes any argument
+
+	Returns:
+		- [string] : the 'java' command (links resolved), or None
+	"""
+
+	# the directories of PATH, in order (shutil.which is python 3 only)
+	for directory in os.environ.get('PATH', os.defpath).split(os.pathsep):
+		java = os.path.join(directory or os.curdir, 'java')
+
+		if(os.path.isfile(java) and os.access(java, os.X_OK)):
+			return os.path.realpath(java)
+
+	return None
+
+
+
+def file_stamp(filename):
+	"""
+	Function that gives the modification time and the size of a file (java
+	checks them when it maps an archive).
+
+	Takes one argument :
+		- filename [string] : the file
+
+	Returns:
+		- [list] : modification time (nanoseconds) and size, or None
+	"""
+
+	try:
+		info = os.stat(filename)
+	except OSError:
+		return None
+
+	return [int(info.st_mtime * 1e9), info.st_size]
+
+
+
+def java_version(java, index):
+	"""
+	Function that gets the version of java ('java -version'). The version is
+	kept in the index for each installation of java (the 'java' command and
+	the modules of its runtime) : it is asked only once.
+
+	Takes 2 arguments :
+		- java [string] : the 'java' command
+		- index [dict] : the index of the archives
+
+	Returns:
+		- version [string] : the version, or None if java can't be launched
+	"""
+
+	home = os.path.dirname(os.path.dirname(java))
+	stamp = [file_stamp(java), file_stamp(os.path.join(home, 'lib', 'modules'))]
+
+	known = index['java'].get(java)
+	if(known != None and known['stamp'] == stamp):
+		return known['version']
+
+	try:
+		version = subprocess.check_output([java, '-version'],
+										  stderr=subprocess.STDOUT)
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+	version = version.decode('utf-8', 'replace').strip()
+	index['java'][java] = {'stamp' : stamp, 'version' : version}
+
+	return version
+
+
+
+def archive_directory(jar):
+	"""
+	Function that chooses the directory of the archives : the directory of
+	the jar, or the cache directory if it can't be written.
+
+	Takes one argument :
+		- jar [string] : the Trimmomatic jar
+
+	Returns:
+		- [string] : the directory, or None if none can be written
+	"""
+
+	directory = os.path.dirname(jar)
+	if os.access(directory, os.W_OK):
+		return directory
+
+	try:
+		if not os.path.isdir(CACHE_DIRECTORY):
+			os.makedirs(CACHE_DIRECTORY)
+	except OSError:
+		return None
+
+	return CACHE_DIRECTORY if os.access(CACHE_DIRECTORY, os.W_OK) else None
+
+
+
+def read_index(directory):
+	"""
+	Function that reads the index of the archives of a directory.
+
+	Takes one argument :
+		- directory [string] : the directory of the archives
+
+	Returns:
+		- index [dict] : the versions of java ('java') and the archives
+						 ('archives', by key : the jar they were built with
+						 and whether java could build them)
+	"""
+
+	try:
+		with open(os.path.join(directory, ARCHIVE_INDEX)) as data:
+			index = json.load(data)
+	except (IOError, OSError, ValueError):
+		index = {}
+
+	index.setdefault('java', {})
+	index.setdefault('archives', {})
+
+	return index
+
+
+
+def write_training_reads(directory):
+	"""
+	Function that writes the paired ends reads of the training trimming :
+	random reads, a part of them going on into an adapter, with qualities
+	falling at the end.
+
+	Takes one argument :
+		- directory [string] : the directory of the reads
+
+	Returns:
+		- names [list] : the two fastq files
+	"""
+
+	rng = random.Random(1)
+	names = [os.path.join(directory, 'training_{0}.fq'.format(i))
+			 for i in (1, 2)]
+	outputs = [open(name, 'w') for name in names]
+
+	try:
+		for number in range(TRAINING_READS):
+			for i, output in enumerate(outputs):
+				read = ''.join(rng.choice('ACGT')
+							   for j in range(TRAINING_LENGTH))
+
+				# a tenth of the fragments are shorter than the reads
+				if(number % 10 == 0):
+					read = (read[:TRAINING_LENGTH // 2] + TRAINING_ADAPTER +
+							read)[:TRAINING_LENGTH]
+
+				quality = ''.join(chr(33 + max(2, 40 - j * j // 250 -
+												rng.randint(0, 5)))
+								  for j in range(TRAINING_LENGTH))
+
+				output.write('@training.{0} {0}/{1}\n{2}\n+\n{3}\n'.format(
+											number + 1, i + 1, read, quality))
+	finally:
+		for output in outputs:
+			output.close()
+
+	return names
+
+
+
+def training_command(directory, adapters):
+	"""
+	Function that gives the training trimming of an archive : a paired ends
+	trimming doing the trimming steps of the tool (java lists the classes
+	of a single run).
+
+	Takes 2 arguments :
+		- directory [string] : the directory of the training trimming
+		- adapters [string] : the adapters fasta file
+
+	Returns:
+		- [list] : the arguments of Trimmomatic
+	"""
+
+	reads = write_training_reads(directory)
+	outputs = [os.path.join(directory, name)
+			   for name in ('paired_1', 'single_1', 'paired_2', 'single_2')]
+
+	return (['PE'] + reads + outputs +
+			[step.format(adapters=adapters) for step in TRAINING_STEPS])
+
+
+
+def build_archive(java, jar, archive):
+	"""
+	Function that builds the class data sharing archive of Trimmomatic : the
+	classes loaded by the training trimming are listed, written in the
+	archive, and the archive is mapped once by java to check it.
+
+	Takes 3 arguments :
+		- java [string] : the 'java' command
+		- jar [string] : the Trimmomatic jar (as given to '-jar')
+		- archive [string] : the archive
+
+	Returns:
+		- [string] : None if the archive is built, else the reason why it
+					 can't be
+	"""
+
+	directory = tempfile.mkdtemp(dir=os.path.dirname(archive))
+	tmp_archive = os.path.join(directory, os.path.basename(archive))
+	class_list = os.path.join(directory, 'classes.lst')
+	adapters = os.path.join(os.path.dirname(jar), 'Adapters.fasta')
+
+	try:
+		subprocess.check_output([java, '-XX:DumpLoadedClassList=' + class_list,
+								 '-jar', jar] +
+								training_command(directory, adapters),
+								stderr=subprocess.STDOUT)
+
+		subprocess.check_output([java, '-Xshare:dump',
+								 '-XX:SharedClassListFile=' + class_list,
+								 '-XX:SharedArchiveFile=' + tmp_archive,
+								 '-cp', jar], stderr=subprocess.STDOUT)
+
+		# java stops if the archive can't be mapped
+		subprocess.check_output([java, '-Xshare:on',
+								 '-XX:SharedArchiveFile=' + tmp_archive,
+								 '-cp', jar, '-version'],
+								stderr=subprocess.STDOUT)
+
+		os.chmod(tmp_archive, 0o644)
+		os.rename(tmp_archive, archive)
+
+	except subprocess.CalledProcessError as error:
+		# the last message of java (not its logs, nor a stack trace)
+		lines = [line for line in error.output.decode('utf-8', 'replace')
+										.splitlines()
+				 if line.strip() and not line.startswith(('[', '\t', ' '))]
+		return lines[-1] if lines else 'exit code {0}'.format(error.returncode)
+
+	except (IOError, OSError) as error:
+		return str(error)
+
+	finally:
+		shutil.rmtree(directory, ignore_errors=True)
+
+	return None
+
+
+
+def open_class_sharing(loc):
+	"""
+	Function that finds (or builds, the first time) the class data sharing
+	archive of the Trimmomatic jar and of the version of java, used by the
+	next Trimmomatic commandlines. Nothing changes if java can't build it.
+
+	Takes one argument :
+		- loc [string] : location of the 'src' directory
+
+	Returns:
+		- [string] : the archive, or None without archive
+	"""
+
+	jar = '{0}trimmomatic-0.33.jar'.format(loc[:-3])
+	java = java_binary()
+	SHARING['options'] = []
+
+	if(java == None or not os.path.isfile(jar)):
+		return None
+
+	directory = archive_directory(jar)
+	if directory == None:
+		return None
+
+	index = read_index(directory)
+	known = json.dumps(index, sort_keys=True)
+
+	version = java_version(java, index)
+	if version == None:
+		return None
+
+	# key of the content of the jar and of the version of java
+	with open(jar, 'rb') as data:
+		key = hashlib.sha1(data.read() + version.encode('utf-8')).hexdigest()
+	archive = os.path.join(directory, ARCHIVE_NAME.format(key[:16]))
+	entry = index['archives'].get(key)
+
+	# java doesn't map an archive built with another jar file (even of the
+	# same content, as a copy)
+	if(entry == None or (entry['error'] == None and
+						 (entry['jar'] != [jar, file_stamp(jar)] or
+						  not os.path.isfile(archive)))):
+
+		error = build_archive(java, jar, archive)
+		entry = {'jar' : [jar, file_stamp(jar)], 'error' : error}
+		index['archives'][key] = entry
+
+		if error == None:
+			sys.stdout.write("Class sharing : archive '{0}' built for the \
+Trimmomatic jar.\n".format(archive))
+		else :
+			sys.stderr.write("Warning : Java can't build a class data sharing \
+archive ({0}), Trimmomatic is started without.\n".format(error))
+		sys.stdout.flush()
+
+	if(json.dumps(index, sort_keys=True) != known):
+		try:
+			write_stats(os.path.join(directory, ARCHIVE_INDEX), index)
+		except (IOError, OSError):
+			pass
+
+	if entry['error'] != None:
+		return None
+
+	SHARING['options'] = ['-XX:SharedArchiveFile=' + archive, '-Xshare:auto']
+
+	return archive
@@ -18,6 +18,8 @@ __date__ = "2015/05"
 
 
 from parseXML import *
+from journal import rename_output, remove_output
+from resources import java_command
 
 import os
 import os.path
@@ -48,6 +50,10 @@ def commandline_input_output(param, cmd, nb, inout):
 		cmd += ' SE'
 		cmd += ' -threads {0}'.format(param['threads'])
 
+		# add the quality encoding if known
+		if param.get('phred') != None :
+			cmd += ' -phred{0}'.format(param['phred'])
+
 		# get the prefix of the input file and creating the new files name
 		prefix = get_file_prefix(param['input'])
 		trimmed = "{0}/trimmed_{1}.fastq".format(param['output'],prefix)
@@ -55,6 +61,10 @@ def commandline_input_output(param, cmd, nb, inout):
 		# add the compression format if choosen
 		if 'compress' in param :
 			trimmed += ".{0}".format(param['compress'])
+		
+		# or the output file given by the user
+		if param.get('outputs') :
+			trimmed = param['outputs'][0]
 
 		# if it's a the first trimming
 		if (nb == 0):
@@ -75,6 +85,10 @@ def commandline_input_output(param, cmd, nb, inout):
 		cmd += ' PE'
 		cmd += ' -threads {0} '.format(param['threads'])
 
+		# add the quality encoding if known
+		if param.get('phred') != None :
+			cmd += '-phred{0} '.format(param['phred'])
+
 		# get the prefix of the input file and creating the new files name
 		prefix_1 = get_file_prefix(param['input'][0])
 		prefix_2 = get_file_prefix(param['input'][1])
@@ -93,7 +107,14 @@ def commandline_input_output(param, cmd, nb, inout):
 			trimmed_2 += ".{0}".format(param['compress'])
 			single_1 += ".{0}".format(param['compress'])
 			single_2 += ".{0}".format(param['compress'])
-
+		
+		# or the output files given by the user (the singletons are kept in
+		# the output directory if not given)
+		if param.get('outputs') :
+			trimmed_1, trimmed_2 = param['outputs'][:2]
+			
+			if(len(param['outputs']) == 4):
+				single_1, single_2 = param['outputs'][2:]
 
 		# if it's a the first trimming
 		if(nb==0):
@@ -144,7 +165,7 @@ def change_output_as_input(inout, param):
 			new_name += '.{0}'.format(param['compress'])
 
 		# renaming step1 output file
-		os.system("mv {0} {1}".format(inout['trimmed'], new_name))
+		rename_output(inout['trimmed'], new_name)
 		# replacing the filenames in the dict
 		inout['trimmed'] = new_name
 
@@ -157,22 +178,34 @@ def change_output_as_input(inout, param):
 		filename_2 = get_file_prefix(param['input'][1])
 		
 		# creating the tmp filename
-		new_name_1 = './tmp{0}.fastq'.format(filename_1)
-		new_name_2 = './tmp{0}.fastq'.format(filename_2)
+		new_name_1 = '{0}/tmp{1}.fastq'.format(param['output'], filename_1)
+		new_name_2 = '{0}/tmp{1}.fastq'.format(param['output'], filename_2)
 		
 		if 'compress' in param:
 			new_name_1 += '.{0}'.format(param['compress'])
 			new_name_2 += '.{0}'.format(param['compress'])
 		
 		# renaming step1 output files.
-		os.system('mv {0} {1}'.format(inout['trimmed'][0], new_name_1))
-		os.system('mv {0} {1}'.format(inout['trimmed'][1], new_name_2))
+		rename_output(inout['trimmed'][0], new_name_1)
+		rename_output(inout['trimmed'][1], new_name_2)
 		
 		# replacing the filenames in the dict
 		inout['trimmed'] = new_name_1, new_name_2
 		
-		# deleting step1 singleton read files 
-		os.system('rm {0} {1}'.format(inout['single'][0], inout['single'][1]))
+		# step1 singleton read files are trimmed apart by step2
+		new_single_1 = '{0}/tmpsingle_{1}.fastq'.format(param['output'],
+														filename_1)
+		new_single_2 = '{0}/tmpsingle_{1}.fastq'.format(param['output'],
+														filename_2)
+
+		if 'compress' in param:
+			new_single_1 += '.{0}'.format(param['compress'])
+			new_single_2 += '.{0}'.format(param['compress'])
+
+		rename_output(inout['single'][0], new_single_1)
+		rename_output(inout['single'][1], new_single_2)
+
+		inout['single'] = new_single_1, new_single_2
 
 
 	# return inout with replaced step1 outputfiles
@@ -180,6 +213,34 @@ def change_output_as_input(inout, param):
 
 
 
+def remove_temporary_files(inout):
+	"""
+	Function that deletes step1 output files once step2 is done, with the
+	singleton reads of step1 and these reads trimmed by step2 (they are
+	still in the cache, if any, to be reused by a run with other quality
+	trimming parameters).
+	
+	Takes one argument :
+		- inout [dict] : dictionnary containning all generated files on the 
+						user's working directory
+	
+	Returns nothing
+	"""
+	
+	# one file for Single Ends data, two for Paired Ends data
+	trimmed = inout['trimmed']
+	if isinstance(trimmed, str):
+		trimmed = [trimmed]
+	
+	for filename in trimmed:
+		remove_output(filename)
+
+	for filename in list(inout.get('single', [])) + inout.get('single_trimmed',
+															   []):
+		remove_output(filename)
+
+
+
 def commandline_adapter(param, cmd):
 	"""
 	Function that add to commandline 'cmd' adapter trimming parameters.
@@ -280,7 +341,7 @@ def commandline_step_1(loc,param, nb,inout):
 	"""
 	
 	# base command line
-	cmd = 'java -jar {0}trimmomatic-0.33.jar'.format(loc[:-3])
+	cmd = java_command(loc)
 	
 	# adding input and output filename
 	cmd, inout = commandline_input_output(param, cmd, nb, inout)
@@ -312,7 +373,7 @@ def commandline_step_2(loc,param, nb, inout):
 	"""
 	
 	# base command line
-	cmd = 'java -jar {0}trimmomatic-0.33.jar'.format(loc[:-3])
+	cmd = java_command(loc)
 
 	# adding input and output filename
 	cmd, inout = commandline_input_output(param,cmd,nb,inout)
@@ -0,0 +1,436 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions to compress the output files by
+	several threads : the reads are cut into blocks compressed at the same
+	time, written one after the other as gzip members, bzip2 streams or BGZF
+	blocks (gzip files which can be read from any block), which all the usual
+	tools can read. Trimmomatic writes its compressed outputs into named
+	pipes read by these threads, and reads its compressed inputs from named
+	pipes written by threads decompressing them (see decompression). """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+from decompression import *
+
+import bz2
+import collections
+import errno
+import os
+import shlex
+import shutil
+import struct
+import tempfile
+import threading
+import zlib
+
+try:
+	from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+	ThreadPoolExecutor = None
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# size of the blocks compressed at once (bzip2 compresses 900 kB blocks,
+# BGZF blocks must be smaller than 64 kB once compressed)
+GZIP_BLOCK_SIZE = 1048576
+BZ2_BLOCK_SIZE = 900000
+BGZF_BLOCK_SIZE = 65280
+
+# compression levels used by Trimmomatic
+GZIP_LEVEL = 6
+BZ2_LEVEL = 9
+
+# empty BGZF block ending a BGZF file
+BGZF_EOF = (b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00\x1b'
+			b'\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00')
+
+# compression of the files, given by the main script : number of threads
+# (compressing an output or decompressing an input) and BGZF instead of gzip
+# members
+COMPRESSION = {'threads' : 1, 'bgzf' : False}
+
+
+
+def set_compression(threads, bgzf):
+	"""
+	Function that sets how the output files are compressed.
+
+	Takes 2 arguments :
+		- threads [integer] : number of threads compressing or decompressing
+							  each file
+		- bgzf [bool] : True to write '.gz' files as BGZF blocks
+
+	Returns nothing
+	"""
+
+	COMPRESSION['threads'] = max(1, threads or 1)
+	COMPRESSION['bgzf'] = bool(bgzf)
+
+
+
+def gzip_member(data):
+	"""
+	Function that compresses a block as a whole gzip member.
+
+	Takes one argument :
+		- data [bytes] : the block
+
+	Returns:
+		- member [bytes] : the gzip member
+	"""
+
+	compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+	return compressor.compress(data) + compressor.flush()
+
+
+
+def bgzf_block(data):
+	"""
+	Function that compresses a block as a BGZF block : a gzip member whose
+	header holds its compressed size (extra field 'BC').
+
+	Takes one argument :
+		- data [bytes] : the block (at most BGZF_BLOCK_SIZE bytes)
+
+	Returns:
+		- block [bytes] : the BGZF block
+	"""
+
+	compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -15)
+	deflated = compressor.compress(data) + compressor.flush()
+
+	# header (18 bytes) + deflated data + crc and size (8 bytes) - 1
+	header = struct.pack('<4BI2BH2BHH', 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2,
+						 len(deflated) + 25)
+
+	return header + deflated + struct.pack('<2I', zlib.crc32(data) & 0xffffffff,
+										   len(data))
+
+
+
+def bz2_stream(data):
+	"""
+	Function that compresses a block as a whole bzip2 stream.
+
+	Takes one argument :
+		- data [bytes] : the block
+
+	Returns:
+		- stream [bytes] : the bzip2 stream
+	"""
+
+	return bz2.compress(data, BZ2_LEVEL)
+
+
+
+class BlockCompressedFile(object):
+	"""
+	Compressed output file written by blocks : the blocks are compressed by
+	a pool of threads (zlib and bz2 don't hold the interpreter lock) and
+	written in order. It can be used as the files opened by gzip.open.
+	"""
+
+	def __init__(self, filename, threads=None, bgzf=None):
+		"""
+		Opens the file : a '.bz2' file is written as bzip2 streams, a '.gz'
+		file as gzip members or BGZF blocks.
+
+		Takes 3 arguments :
+			- filename [string] : the file
+			- threads [integer] : number of threads compressing the blocks
+								  (COMPRESSION['threads'] if not given)
+			- bgzf [bool] : True for BGZF blocks (COMPRESSION['bgzf'] if not
+							given)
+		"""
+
+		if threads == None:
+			threads = COMPRESSION['threads']
+		if bgzf == None:
+			bgzf = COMPRESSION['bgzf']
+
+		self.name = filename
+		self.bgzf = False
+
+		if(os.path.splitext(filename)[1] == '.bz2'):
+			self.compress, self.size = bz2_stream, BZ2_BLOCK_SIZE
+		elif bgzf:
+			self.compress, self.size = bgzf_block, BGZF_BLOCK_SIZE
+			self.bgzf = True
+		else :
+			self.compress, self.size = gzip_member, GZIP_BLOCK_SIZE
+
+		self.out = open(filename, 'wb')
+		self.buffer = []
+		self.buffered = 0
+		self.pending = collections.deque()
+		self.blocks = 0
+		self.threads = threads
+		self.pool = None
+
+		if(threads > 1 and ThreadPoolExecutor != None):
+			self.pool = ThreadPoolExecutor(threads)
+
+	def write(self, data):
+		"""
+		Writes data into the file (compressed when a block is full).
+		"""
+
+		self.buffer.append(data)
+		self.buffered += len(data)
+
+		if(self.buffered >= self.size):
+			data = b''.join(self.buffer)
+
+			for start in range(0, len(data) - self.size + 1, self.size):
+				self.send_block(data[start:start + self.size])
+
+			rest = data[start + self.size:]
+			self.buffer = [rest]
+			self.buffered = len(rest)
+
+	def send_block(self, block):
+		"""
+		Compresses a block, by the pool of threads if any. At most two blocks
+		per thread wait to be written (the oldest one is written first).
+		"""
+
+		self.blocks += 1
+
+		if self.pool == None:
+			self.out.write(self.compress(block))
+			return
+
+		self.pending.append(self.pool.submit(self.compress, block))
+
+		while(len(self.pending) > 2 * self.threads):
+			self.out.write(self.pending.popleft().result())
+
+	def close(self):
+		"""
+		Compresses the last block, writes all the blocks and closes the file.
+		A file without data holds an empty gzip member (or bzip2 stream), a
+		file of 0 bytes being not a gzip (or bzip2) file.
+		"""
+
+		if self.out.closed:
+			return
+
+		try:
+			if(self.buffered or (self.blocks == 0 and not self.bgzf)):
+				self.send_block(b''.join(self.buffer))
+			self.buffer = []
+			self.buffered = 0
+
+			while self.pending:
+				self.out.write(self.pending.popleft().result())
+
+			if self.bgzf:
+				self.out.write(BGZF_EOF)
+
+		finally:
+			if self.pool != None:
+				self.pool.shutdown()
+			self.out.close()
+
+	@property
+	def closed(self):
+		return self.out.closed
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *error):
+		self.close()
+
+
+
+def compress_pipe(fifo, filename, pipes):
+	"""
+	Function that compresses the reads written by Trimmomatic into a named
+	pipe into the wanted output file. An error is kept in pipes['errors'].
+
+	Takes 3 arguments :
+		- fifo [string] : the named pipe
+		- filename [string] : the compressed output file
+		- pipes [dict] : the pipes (see compression_pipes)
+
+	Returns nothing
+	"""
+
+	try:
+		with open(fifo, 'rb') as reads:
+			with BlockCompressedFile(filename) as out:
+				shutil.copyfileobj(reads, out, GZIP_BLOCK_SIZE)
+
+	except (IOError, OSError) as error:
+		pipes['errors'].append(error)
+
+
+
+def decompress_pipe(filename, fifo, pipes):
+	"""
+	Function that decompresses an input file into a named pipe read by
+	Trimmomatic. An error is kept in pipes['errors'] (but Trimmomatic
+	stopping its reading is its own error).
+
+	Takes 3 arguments :
+		- filename [string] : the compressed input file
+		- fifo [string] : the named pipe
+		- pipes [dict] : the pipes (see compression_pipes)
+
+	Returns nothing
+	"""
+
+	try:
+		with open_decompressed(filename, COMPRESSION['threads']) as reads:
+			with open(fifo, 'wb') as out:
+				shutil.copyfileobj(reads, out, GZIP_BLOCK_SIZE)
+
+	except (IOError, OSError) as error:
+		if(error.errno != errno.EPIPE):
+			pipes['errors'].append(error)
+
+
+
+def compression_pipes(cmd):
+	"""
+	Function that replaces the compressed outputs (.gz or .bz2) of a
+	Trimmomatic commandline by named pipes : Trimmomatic writes its reads
+	without compression and threads compress them into the outputs. With
+	several threads, the compressed inputs are also replaced by named pipes
+	where threads write them decompressed.
+
+	Takes one argument :
+		- cmd [string] : the Trimmomatic commandline
+
+	Returns:
+		- cmd [string] : the new commandline
+		- pipes [dict] : the named pipes ('fifos'), the files they are
+						 compressed into or decompressed from ('outputs'),
+						 their directory ('dir'), the threads ('threads')
+						 and their errors ('errors'), or None if no file is
+						 compressed
+	"""
+
+	args = shlex.split(cmd)
+
+	# outputs follow the inputs (1 for SE, 2 for PE), after the options
+	for i, arg in enumerate(args):
+		if(arg == 'SE' or arg == 'PE'):
+			break
+
+	first = i + 1
+	while(first < len(args) and args[first].startswith('-')):
+		first += 2 if args[first] == '-threads' else 1
+
+	nb_in, nb_out = (1, 1) if args[i] == 'SE' else (2, 4)
+	files = list(range(first + nb_in, first + nb_in + nb_out))
+
+	# Trimmomatic decompresses its inputs by one thread
+	if(COMPRESSION['threads'] > 1):
+		files = list(range(first, first + nb_in)) + files
+
+	compressed = [j for j in files if j < len(args) and
+				  os.path.splitext(args[j])[1] in ('.gz', '.bz2')]
+
+	if(not compressed or not hasattr(os, 'mkfifo')):
+		return cmd, None
+
+	pipes = {'dir' : tempfile.mkdtemp(prefix='trimming_compression_'),
+			 'fifos' : [], 'outputs' : [], 'threads' : [], 'errors' : []}
+
+	for j in compressed:
+		if(j < first + nb_in):
+			fifo = '{0}/input_{1}.fastq'.format(pipes['dir'], j)
+			target, target_args = decompress_pipe, (args[j], fifo, pipes)
+		else :
+			fifo = '{0}/output_{1}.fastq'.format(pipes['dir'], j)
+			target, target_args = compress_pipe, (fifo, args[j], pipes)
+
+		os.mkfifo(fifo)
+
+		thread = threading.Thread(target=target, args=target_args)
+		thread.daemon = True
+		thread.start()
+
+		pipes['fifos'].append(fifo)
+		pipes['outputs'].append(args[j])
+		pipes['threads'].append(thread)
+		args[j] = fifo
+
+	return ' '.join(args), pipes
+
+
+
+def remove_compression_pipes(pipes):
+	"""
+	Function that waits for the end of the compression and removes the named
+	pipes. Threads still waiting for Trimmomatic to open a pipe (if it
+	failed) are released.
+
+	Takes one argument :
+		- pipes [dict] : the pipes (see compression_pipes), or None
+
+	Returns nothing
+	or raise the first compression error
+	"""
+
+	if pipes == None:
+		return
+
+	for fifo, thread in zip(pipes['fifos'], pipes['threads']):
+
+		# opening the other side of the pipe releases a waiting thread
+		while thread.is_alive():
+			for flags in (os.O_WRONLY, os.O_RDONLY):
+				try:
+					os.close(os.open(fifo, flags | os.O_NONBLOCK))
+				except OSError:
+					pass
+
+			thread.join(0.1)
+
+	shutil.rmtree(pipes['dir'], ignore_errors=True)
+
+	if pipes['errors']:
+		raise pipes['errors'][0]
+
+
+
+def restore_output_names(log_file, pipes):
+	"""
+	Function that writes back the names of the compressed files in the
+	Trimmomatic messages, in place of the named pipes.
+
+	Takes 2 arguments :
+		- log_file [string] : file where Trimmomatic messages are written
+		- pipes [dict] : the pipes (see compression_pipes), or None
+
+	Returns nothing
+	"""
+
+	if(pipes == None or not os.path.isfile(log_file)):
+		return
+
+	with open(log_file) as log:
+		messages = log.read()
+
+	for fifo, filename in zip(pipes['fifos'], pipes['outputs']):
+		messages = messages.replace(fifo, filename)
+
+	with open(log_file, "w") as log:
+		log.write(messages)
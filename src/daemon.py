@@ -0,0 +1,660 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions of the trimming daemon : a long-lived
+	process listening on a Unix socket for trimming jobs (JSON), which are
+	queued by priority and trimmed by warm workers (processes which have
+	already loaded the native engine and, with the python module jpype, a
+	Java virtual machine running Trimmomatic). """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+from sharding import *
+from trim_stats import STATS_FILE, step_stats, sample_stats, write_stats
+
+import heapq
+import json
+import multiprocessing
+import socket
+import time
+
+try:
+	import socketserver
+except ImportError:
+	import SocketServer as socketserver
+
+try:
+	import jpype
+except ImportError:
+	jpype = None
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# states of a job
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# trimming options of a job (the options of the commandline)
+JOB_OPTIONS = ['phred', 'illuminaclip', 'slidingwindow', 'maxinfo', 'leading',
+			   'trailing', 'crop', 'headcrop', 'minlen', 'avgqual', 'tophred33',
+			   'tophred64', 'compress']
+
+
+
+def daemon_available():
+	"""
+	Booleen that checks if the daemon can be used on this system.
+
+	Don't takes any argument
+
+	Returns:
+		- True [bool] : if Unix sockets can be created
+		- False [bool] : else
+	"""
+
+	return hasattr(socket, 'AF_UNIX')
+
+
+
+def jvm_library():
+	"""
+	Function that finds the library of the Java virtual machine used by the
+	'java' command (to start it inside a worker with jpype).
+
+	Don't takes any argument
+
+	Returns:
+		- library [string] : the library file
+		or
+		- None : if jpype isn't installed or the library isn't found
+	"""
+
+	if jpype == None:
+		return None
+
+	try:
+		return jpype.getDefaultJVMPath()
+	except Exception:
+		pass
+
+	# the library next to the 'java' command (Java 9+ and Java 8)
+	for directory in os.environ.get('PATH', '').split(os.pathsep):
+		java = os.path.join(directory, 'java')
+
+		if os.path.isfile(java):
+			home = os.path.dirname(os.path.dirname(os.path.realpath(java)))
+
+			for library in ('lib/server/libjvm.so',
+							'jre/lib/amd64/server/libjvm.so',
+							'lib/amd64/server/libjvm.so'):
+				if os.path.isfile(os.path.join(home, library)):
+					return os.path.join(home, library)
+
+	return None
+
+
+
+def start_jvm(jar):
+	"""
+	Function that starts a Java virtual machine inside the process, with
+	Trimmomatic loaded.
+
+	Takes one argument :
+		- jar [string] : the Trimmomatic jar
+
+	Returns:
+		- True [bool] : if the virtual machine is running
+		- False [bool] : if it can't be started (Trimmomatic will be
+						 launched by the 'java' command)
+	"""
+
+	library = jvm_library()
+	if library == None:
+		return False
+
+	try:
+		jpype.startJVM(library, '--enable-native-access=ALL-UNNAMED',
+					   classpath=[jar], convertStrings=False,
+					   ignoreUnrecognized=True)
+
+		# loading Trimmomatic before the first job
+		jpype.JClass('org.usadellab.trimmomatic.TrimmomaticSE')
+		jpype.JClass('org.usadellab.trimmomatic.TrimmomaticPE')
+
+	except Exception:
+		return False
+
+	return True
+
+
+
+def launch_in_jvm(cmd, log_file):
+	"""
+	Function that launches a Trimmomatic commandline in the Java virtual
+	machine of the process, writing Trimmomatic messages into a log file.
+	A Trimmomatic error ending the virtual machine also ends the process.
+
+	Takes 2 arguments :
+		- cmd [string] : the Trimmomatic commandline
+		- log_file [string] : file where Trimmomatic messages are written
+
+	Returns:
+		- 0 [integer] : if the trimming have been done
+		or raise a ValueError
+	"""
+
+	parts = split_commandline(cmd)
+
+	System = jpype.JClass('java.lang.System')
+	PrintStream = jpype.JClass('java.io.PrintStream')
+	FileOutputStream = jpype.JClass('java.io.FileOutputStream')
+	program = jpype.JClass('org.usadellab.trimmomatic.Trimmomatic{0}'.format(
+															parts['layout']))
+
+	# Trimmomatic messages are written on the standard error
+	err = System.err
+	log = PrintStream(FileOutputStream(log_file), True)
+
+	try:
+		System.setErr(log)
+		done = program.run(jpype.JArray(jpype.JString)(parts['arguments']))
+
+	finally:
+		System.setErr(err)
+		log.close()
+
+	if not done:
+		raise ValueError("Error : Trimmomatic failed (see {0}).".format(
+																	log_file))
+
+	return 0
+
+
+
+def warm_worker(conn, jar):
+	"""
+	Function of a worker process : it starts a Java virtual machine (if
+	possible) then trims the jobs sent by the daemon until it gets None.
+
+	Takes 2 arguments :
+		- conn [Connection] : connection with the daemon, getting jobs (the
+							  commandline, the log file, the engine, the
+							  number of threads and True for BGZF outputs)
+							  and sending back (0, None) or (1, error
+							  message)
+		- jar [string] : the Trimmomatic jar
+
+	Returns nothing
+	"""
+
+	jvm = start_jvm(jar)
+
+	while True:
+		try:
+			job = conn.recv()
+		except EOFError:
+			break
+
+		if job == None:
+			break
+
+		cmd, log_file, engine, threads, bgzf = job
+		set_compression(threads, bgzf)
+
+		try:
+			if(engine == 'native' and native_supported(cmd)):
+				launch_native(cmd, log_file)
+
+			else :
+				# compressed outputs are compressed by several threads
+				cmd, pipes = compression_pipes(cmd)
+
+				try:
+					if jvm:
+						launch_in_jvm(cmd, log_file)
+
+					else :
+						with open(log_file, "w") as out:
+							subprocess.check_call(shlex.split(cmd), stderr=out)
+
+				finally:
+					remove_compression_pipes(pipes)
+					restore_output_names(log_file, pipes)
+
+			conn.send((0, None))
+
+		except (Exception, SystemExit) as error:
+			conn.send((1, str(error)))
+
+
+
+def new_worker(jar):
+	"""
+	Function that starts a warm worker process.
+
+	Takes one argument :
+		- jar [string] : the Trimmomatic jar
+
+	Returns:
+		- worker [tuple] : the process and the connection with it
+	"""
+
+	conn, child = multiprocessing.Pipe()
+
+	process = multiprocessing.Process(target=warm_worker, args=(child, jar))
+	process.start()
+	child.close()
+
+	return process, conn
+
+
+
+def job_commandline(job, loc):
+	"""
+	Function that generates the Trimmomatic commandline of a job, as the main
+	script does it for the commandline arguments (adapter and quality
+	trimming in a single pass). Relative files are found from the directory
+	of the client ('cwd').
+
+	Takes 2 arguments :
+		- job [dict] : the job sent by a client ('layout', 'input',
+					   'output', 'options', 'threads', 'engine', 'cwd')
+		- loc [string] : location of the 'src' directory
+
+	Returns:
+		- cmd [string] : the commandline
+		- log_file [string] : file where Trimmomatic messages are written
+		- bgzf [bool] : True if the '.gz' outputs are BGZF files
+		or raise a ValueError
+	"""
+
+	cwd = job.get('cwd', os.getcwd())
+	inputs = job.get('input', [])
+	if isinstance(inputs, str):
+		inputs = [inputs]
+
+	args = [str(job.get('layout'))]
+	args += [os.path.join(cwd, filename) for filename in inputs]
+	args += ['-threads', str(job.get('threads', 1))]
+
+	for option, value in job.get('options', {}).items():
+		if option not in JOB_OPTIONS:
+			raise ValueError("Error : Unknown option '{0}'.".format(option))
+
+		if(value == None or value == False):
+			continue
+
+		# the adapter file is found from the directory of the client
+		if(option == 'illuminaclip'):
+			value = str(value).split(':')
+			value = ':'.join([os.path.join(cwd, value[0])] + value[1:])
+
+		if option.startswith('tophred'):
+			args.append('-{0}'.format(option))
+		else :
+			args += ['-{0}'.format(option), str(value)]
+
+	# the options are checked as the commandline ones
+	try:
+		arguments = dict(Trimmomatic_parser().parse_args(args)._get_kwargs())
+		arguments = check_args(arguments)
+	except SystemExit as error:
+		if isinstance(error.code, str):
+			raise ValueError(error.code)
+		raise ValueError("Error : Wrong options for the job.")
+
+	arguments['output'] = os.path.normpath(os.path.join(cwd,
+												job.get('output', '.')))
+	if not os.path.isdir(arguments['output']):
+		raise ValueError("Error : The output directory '{0}' doesn't \
+exist.".format(arguments['output']))
+
+	io = dict()
+
+	# a single pass if both trimming are asked, else the asked one
+	cmd = argparse_commandline_fused(loc, arguments, 0, io)
+	name = 'fused'
+
+	if(cmd == None):
+		cmd = argparse_commandline_step_1(loc, arguments, 0, io)
+		name = 'step1'
+
+	if(cmd == None):
+		cmd = argparse_commandline_step_2(loc, arguments, 0, io)
+		name = 'step2'
+
+	if(cmd == None):
+		raise ValueError("Error : The job has no trimming step.")
+
+	return (cmd, '{0}/output_file_{1}.out'.format(arguments['output'], name),
+			'bgzf' in arguments)
+
+
+
+def serve_jobs(daemon, jar, engine):
+	"""
+	Function of a thread of the daemon owning a warm worker : it sends the
+	job with the highest priority (the oldest first) to its worker and
+	waits for the end of the trimming. The statistics of a job done are
+	written in the file 'trim_stats.json' of its output directory. A worker
+	which died (Trimmomatic can end its virtual machine) is replaced.
+
+	Takes 3 arguments :
+		- daemon [dict] : the daemon (see launch_daemon)
+		- jar [string] : the Trimmomatic jar
+		- engine [string] : 'trimmomatic' or 'native'
+
+	Returns nothing
+	"""
+
+	process, conn = new_worker(jar)
+
+	try:
+		while True:
+			with daemon['lock']:
+				while not daemon['queue'] and not daemon['stop']:
+					daemon['lock'].wait()
+
+				if daemon['stop']:
+					return
+
+				job = daemon['jobs'][heapq.heappop(daemon['queue'])[2]]
+				job['state'] = RUNNING
+				job['started'] = time.time()
+
+			try:
+				conn.send((job['cmd'], job['log'], job.get('engine', engine),
+						   job.get('threads', 1), job['bgzf']))
+				code, error = conn.recv()
+
+			except (EOFError, IOError, OSError):
+				code, error = 1, "Error : The worker stopped (see {0}).".format(
+																	job['log'])
+				process.join()
+				process, conn = new_worker(jar)
+
+			with daemon['lock']:
+				job['state'] = DONE if code == 0 else FAILED
+				job['error'] = error
+				job['ended'] = time.time()
+				daemon['lock'].notify_all()
+
+			if(code == 0):
+				elapsed = job['ended'] - job['started']
+				step = step_stats(job['log'], elapsed, 'trimmed')
+				stats = sample_stats(split_commandline(job['cmd'])['input'],
+									 [step] if step != None else [], elapsed)
+				stats['state'] = 'done'
+
+				try:
+					write_stats(os.path.join(os.path.dirname(job['log']),
+											 STATS_FILE), stats)
+				except (IOError, OSError):
+					pass
+
+	finally:
+		try:
+			conn.send(None)
+		except (IOError, OSError):
+			pass
+
+		process.join()
+
+
+
+def job_status(job):
+	"""
+	Function that gets the status of a job sent back to a client.
+
+	Takes one argument :
+		- job [dict] : the job
+
+	Returns:
+		- status [dict] : its number, state, priority, log file, error and
+						  times (submission, start and end)
+	"""
+
+	return dict((key, job.get(key)) for key in ('id', 'state', 'priority',
+												'log', 'error', 'submitted',
+												'started', 'ended'))
+
+
+
+def handle_request(daemon, request, loc):
+	"""
+	Function that answers a request of a client :
+		- {"action": "submit", "job": {...}, "priority": n} queues a job
+		- {"action": "status"} gives the status of all jobs, and
+		  {"action": "status", "id": n} the status of one job
+		- {"action": "wait", "id": n} waits for the end of a job
+		- {"action": "shutdown"} stops the daemon (running jobs end first,
+		  queued jobs fail)
+
+	Takes 3 arguments :
+		- daemon [dict] : the daemon (see launch_daemon)
+		- request [dict] : the request
+		- loc [string] : location of the 'src' directory
+
+	Returns:
+		- answer [dict] : the answer ({"error": message} if the request is
+						  wrong)
+	"""
+
+	action = request.get('action')
+
+	if(action == 'submit'):
+		job = dict(request.get('job', {}))
+		cmd, log_file, bgzf = job_commandline(job, loc)
+
+		with daemon['lock']:
+			number = len(daemon['jobs']) + 1
+			job.update({'id' : number, 'state' : QUEUED, 'cmd' : cmd,
+						'log' : log_file, 'bgzf' : bgzf,
+						'submitted' : time.time(),
+						'priority' : int(request.get('priority', 0))})
+
+			daemon['jobs'][number] = job
+			heapq.heappush(daemon['queue'], (-job['priority'], number, number))
+			daemon['lock'].notify_all()
+
+			return job_status(job)
+
+	with daemon['lock']:
+		if(action == 'status' and request.get('id') == None):
+			return {'jobs' : [job_status(job) for number, job in
+							  sorted(daemon['jobs'].items())]}
+
+		if(action in ('status', 'wait')):
+			job = daemon['jobs'].get(request.get('id'))
+			if job == None:
+				raise ValueError("Error : Unknown job '{0}'.".format(
+															request.get('id')))
+
+			while(action == 'wait' and job['state'] in (QUEUED, RUNNING)):
+				daemon['lock'].wait()
+
+			return job_status(job)
+
+		if(action == 'shutdown'):
+			daemon['stop'] = True
+
+			# queued jobs won't be trimmed
+			for priority, order, number in daemon['queue']:
+				daemon['jobs'][number]['state'] = FAILED
+				daemon['jobs'][number]['error'] = "Error : The daemon stopped."
+			daemon['queue'] = []
+
+			daemon['lock'].notify_all()
+			threading.Thread(target=daemon['server'].shutdown).start()
+
+			return {'state' : 'stopping'}
+
+	raise ValueError("Error : Unknown action '{0}'.".format(action))
+
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+	"""
+	Handler of a client connection : each line is a JSON request, answered
+	by a JSON line.
+	"""
+
+	def handle(self):
+		for line in self.rfile:
+			if not line.strip():
+				continue
+
+			try:
+				answer = handle_request(self.server.daemon,
+										json.loads(line.decode('utf8')),
+										self.server.loc)
+			except (ValueError, TypeError, AttributeError) as error:
+				answer = {'error' : str(error)}
+
+			self.wfile.write((json.dumps(answer) + '\n').encode('utf8'))
+			self.wfile.flush()
+
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	"""
+	Unix socket server of the daemon, answering each client in a thread.
+	"""
+
+	daemon_threads = True
+
+
+
+def launch_daemon(path, workers, loc, engine):
+	"""
+	Function that launches the trimming daemon on a Unix socket, with its
+	warm workers, until a client asks it to stop.
+
+	Takes 4 arguments :
+		- path [string] : the Unix socket file
+		- workers [integer] : number of warm workers (jobs trimmed at the
+							  same time)
+		- loc [string] : location of the 'src' directory
+		- engine [string] : engine of the jobs which don't give one
+							('trimmomatic' or 'native')
+
+	Returns:
+		- 0 [integer] : when the daemon is stopped
+	"""
+
+	if os.path.exists(path):
+		sys.exit("Error : The socket '{0}' already exists (is a daemon \
+running ?).".format(path))
+
+	jar = '{0}trimmomatic-0.33.jar'.format(loc[:-3])
+
+	daemon = {'jobs' : {}, 'queue' : [], 'stop' : False,
+			  'lock' : threading.Condition()}
+
+	threads = []
+	for i in range(workers):
+		thread = threading.Thread(target=serve_jobs, args=(daemon, jar, engine))
+		thread.start()
+		threads.append(thread)
+
+	server = DaemonServer(path, RequestHandler)
+	server.daemon = daemon
+	server.loc = loc
+	daemon['server'] = server
+
+	try:
+		server.serve_forever()
+
+	finally:
+		server.server_close()
+		os.remove(path)
+
+		with daemon['lock']:
+			daemon['stop'] = True
+			daemon['lock'].notify_all()
+
+		for thread in threads:
+			thread.join()
+
+	return 0
+
+
+
+def send_request(path, request):
+	"""
+	Function that sends a request to the daemon and gets its answer.
+
+	Takes 2 arguments :
+		- path [string] : the Unix socket file of the daemon
+		- request [dict] : the request (see handle_request)
+
+	Returns:
+		- answer [dict] : the answer of the daemon
+		or raise a ValueError with the error of the daemon
+	"""
+
+	client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+	try:
+		client.connect(path)
+		client.sendall((json.dumps(request) + '\n').encode('utf8'))
+
+		answer = client.makefile('rb').readline()
+
+	finally:
+		client.close()
+
+	answer = json.loads(answer.decode('utf8'))
+
+	# a wrong request (a job status has also an 'error' key)
+	if 'error' in answer and 'state' not in answer:
+		raise ValueError(answer['error'])
+
+	return answer
+
+
+
+def submit_job(path, arguments, priority):
+	"""
+	Function that sends the commandline arguments to the daemon as a job and
+	waits for the end of the trimming.
+
+	Takes 3 arguments :
+		- path [string] : the Unix socket file of the daemon
+		- arguments [dict] : dictionnary containning all the command argument
+							 entries
+		- priority [integer] : priority of the job (the highest first)
+
+	Returns:
+		- status [dict] : the status of the job at its end
+	"""
+
+	options = dict((option, arguments.get(option)) for option in JOB_OPTIONS
+				   if arguments.get(option) != None)
+
+	# BGZF outputs are given as '.gz' outputs by check_args
+	if 'bgzf' in arguments:
+		options['compress'] = 'bgzf'
+
+	job = {'layout' : arguments['layout'], 'input' : arguments['input'],
+		   'output' : '.', 'cwd' : os.getcwd(), 'engine' : arguments['engine'],
+		   'threads' : arguments['threads'] or 1, 'options' : options}
+
+	status = send_request(path, {'action' : 'submit', 'job' : job,
+								 'priority' : priority})
+
+	return send_request(path, {'action' : 'wait', 'id' : status['id']})
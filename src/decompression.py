@@ -0,0 +1,617 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions to decompress the input files by
+	several threads : the bzip2 blocks and the gzip members of a file are
+	found without decompressing it, decompressed at the same time and read
+	in order. A gzip file made of a single member can't be cut : it is
+	decompressed by one thread, ahead of the reading. """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+import binascii
+import bz2
+import collections
+import gzip
+import io
+import os
+import threading
+import zlib
+
+try:
+	import queue
+except ImportError:
+	import Queue as queue
+
+try:
+	from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+	ThreadPoolExecutor = None
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# size of the compressed data read at once when looking for the blocks
+SCAN_SIZE = 4194304
+
+# biggest gzip member decompressed by the pool of threads (a bigger one is
+# decompressed by the reading thread alone)
+MAX_MEMBER_SIZE = 8388608
+
+# size of the data decompressed at once by the reading thread
+READ_SIZE = 1048576
+
+# magic numbers (48 bits, at any bit) starting a bzip2 block and ending a
+# bzip2 stream
+BZ2_BLOCK_MAGIC = 0x314159265359
+BZ2_END_MAGIC = 0x177245385090
+
+# header of a gzip member : magic number and deflate method
+GZIP_MAGIC = b'\x1f\x8b\x08'
+
+
+
+def find_bits(data, magic):
+	"""
+	Function that finds a 48 bits magic number in data, at any bit (the
+	bzip2 blocks are not aligned on bytes) : for each of the 8 shifts, the 5
+	bytes fully covered by the magic number are searched, then checked with
+	the bits around them.
+
+	Takes 2 arguments :
+		- data [bytes] : the data
+		- magic [integer] : the magic number
+
+	Returns:
+		- found [list] : the positions of the magic number, in bits
+	"""
+
+	found = []
+
+	for shift in range(8):
+		window = binascii.unhexlify('{0:014x}'.format(magic << (8 - shift)))
+		pattern = window[1:6]
+
+		i = data.find(pattern, 1)
+		while(i > 0 and i + 6 <= len(data)):
+			value = int(binascii.hexlify(data[i - 1:i + 6]), 16)
+
+			if((value >> (8 - shift)) & 0xffffffffffff == magic):
+				found.append((i - 1) * 8 + shift)
+
+			i = data.find(pattern, i + 1)
+
+	return sorted(found)
+
+
+
+def read_bytes(filename, start, end):
+	"""
+	Function that reads a part of a file.
+
+	Takes 3 arguments :
+		- filename [string] : the file
+		- start [integer] : first byte
+		- end [integer] : byte following the last one
+
+	Returns:
+		- data [bytes] : the bytes
+	"""
+
+	with open(filename, 'rb') as compressed:
+		compressed.seek(start)
+		return compressed.read(end - start)
+
+
+
+def bz2_block(filename, start, end):
+	"""
+	Function that decompresses a bzip2 block alone : its bits are put into
+	a new bzip2 stream (a header, the block, the end of stream magic number
+	and the stream crc, which is the crc of the block).
+
+	Takes 3 arguments :
+		- filename [string] : the bzip2 file
+		- start [integer] : first bit of the block (its magic number)
+		- end [integer] : bit following the block
+
+	Returns:
+		- data [bytes] : the decompressed block
+		or raise IOError if the bits are not a bzip2 block
+	"""
+
+	first = start // 8
+	data = read_bytes(filename, first, (end + 7) // 8)
+	size = end - start
+
+	block = int(binascii.hexlify(data), 16) >> (len(data) * 8 - end + first * 8)
+	block &= (1 << size) - 1
+	crc = (block >> (size - 80)) & 0xffffffff
+
+	# the stream ends on a whole byte
+	padding = -(size + 80) % 8
+	stream = ((((block << 48) | BZ2_END_MAGIC) << 32) | crc) << padding
+	stream = binascii.unhexlify('{0:0{1}x}'.format(stream,
+												   (size + 80 + padding) // 4))
+
+	try:
+		return bz2.decompress(b'BZh9' + stream)
+	except (IOError, OSError, ValueError, EOFError) as error:
+		raise IOError("Error : Wrong bzip2 block in '{0}' ({1}).".format(
+																filename, error))
+
+
+
+def bz2_blocks(filename):
+	"""
+	Function (generator) that finds the bzip2 blocks of a file, from its
+	beginning : a block goes from its magic number to the next block, or to
+	the end of its stream.
+
+	Takes one argument :
+		- filename [string] : the bzip2 file
+
+	Returns (yield):
+		- start [integer] : first bit of the block
+		- end [integer] : bit following the block
+		or raise IOError if the file is truncated
+	"""
+
+	with open(filename, 'rb') as compressed:
+		data = b''
+		offset = 0
+		last = None
+
+		while True:
+			chunk = compressed.read(SCAN_SIZE)
+			data += chunk
+
+			marks = [(bit, True) for bit in find_bits(data, BZ2_BLOCK_MAGIC)]
+			marks += [(bit, False) for bit in find_bits(data, BZ2_END_MAGIC)]
+
+			for bit, is_block in sorted(marks):
+				bit += offset * 8
+
+				if(last != None and bit <= last):
+					continue
+
+				if last != None:
+					yield last, bit
+
+				last = bit if is_block else None
+
+			if not chunk:
+				break
+
+			# the data from the last block on is kept (7 bytes at least, a
+			# magic number can be cut by the end of the chunk)
+			keep = max(0, len(data) - 7)
+			if last != None:
+				keep = min(keep, last // 8 - offset)
+
+			data = data[keep:]
+			offset += keep
+
+	if last != None:
+		raise IOError("Error : The bzip2 file '{0}' is truncated.".format(
+																	filename))
+
+
+
+def bz2_chunks(filename, pool, threads):
+	"""
+	Function (generator) that decompresses a bzip2 file by its blocks,
+	decompressed by a pool of threads (at most two per thread at the same
+	time) and given in order. A block which can't be decompressed alone (a
+	magic number found by chance inside a block) is decompressed with the
+	next one.
+
+	Takes 3 arguments :
+		- filename [string] : the bzip2 file
+		- pool [ThreadPoolExecutor] : the pool of threads
+		- threads [integer] : number of threads of the pool
+
+	Returns (yield):
+		- data [bytes] : the decompressed blocks, in order
+	"""
+
+	pending = collections.deque()
+	blocks = bz2_blocks(filename)
+	ended = False
+
+	while True:
+		while(not ended and len(pending) <= 2 * threads):
+			block = next(blocks, None)
+
+			if block == None:
+				ended = True
+			else :
+				pending.append(block + (pool.submit(bz2_block, filename,
+													*block),))
+
+		if not pending:
+			return
+
+		start, end, future = pending.popleft()
+
+		try:
+			data = future.result()
+
+		except IOError:
+			if not pending:
+				raise
+
+			# the block goes on into the next one
+			end = pending.popleft()[1]
+			data = bz2_block(filename, start, end)
+
+		yield data
+
+
+
+def gzip_header(data, i):
+	"""
+	Booleen that checks if a gzip member may begin at a position : its magic
+	number, deflate method, and flags and system that gzip accepts.
+
+	Takes 2 arguments :
+		- data [bytes] : the data
+		- i [integer] : the position
+
+	Returns:
+		- [bool] : True if it may be a gzip member
+	"""
+
+	header = bytearray(data[i:i + 10])
+
+	return(len(header) == 10 and header[3] & 0xe0 == 0 and
+		   (header[9] <= 13 or header[9] == 255))
+
+
+
+def member_ended(decompressor):
+	"""
+	Booleen that checks if a zlib decompressor has found the end of its gzip
+	member. Python 2 has no 'eof' : the bytes given after the end are kept
+	in 'unused_data', so a copy of the decompressor is given one more byte.
+
+	Takes one argument :
+		- decompressor [zlib.Decompress] : the decompressor
+
+	Returns:
+		- [bool] : True if the whole member has been decompressed
+	"""
+
+	if hasattr(decompressor, 'eof'):
+		return decompressor.eof
+
+	if decompressor.unused_data:
+		return True
+
+	probe = decompressor.copy()
+
+	try:
+		probe.decompress(b'\x00')
+	except zlib.error:
+		return False
+
+	return bool(probe.unused_data)
+
+
+
+def gzip_member_at(filename, start, end):
+	"""
+	Function that decompresses a part of a gzip file, if it is a whole gzip
+	member.
+
+	Takes 3 arguments :
+		- filename [string] : the gzip file
+		- start [integer] : first byte of the member
+		- end [integer] : byte following the member
+
+	Returns:
+		- data [bytes] : the decompressed member, or None if it is not a
+						 whole member
+	"""
+
+	decompressor = zlib.decompressobj(31)
+
+	try:
+		data = decompressor.decompress(read_bytes(filename, start, end))
+	except zlib.error:
+		return None
+
+	if(not member_ended(decompressor) or decompressor.unused_data):
+		return None
+
+	return data
+
+
+
+def gzip_members(filename, position, pool, threads):
+	"""
+	Function (generator) that finds the gzip members of a file from a
+	position, without decompressing them : a member may begin at each gzip
+	header (see gzip_header). The parts between two headers are given to a
+	pool of threads (at most two per thread at the same time), which checks
+	that they are whole members. A part bigger than MAX_MEMBER_SIZE is not
+	decompressed.
+
+	Takes 4 arguments :
+		- filename [string] : the gzip file
+		- position [integer] : first byte of a gzip member
+		- pool [ThreadPoolExecutor] : the pool of threads
+		- threads [integer] : number of threads of the pool
+
+	Returns (yield):
+		- start [integer] : first byte of the part
+		- end [integer] : byte following the part
+		- future [Future] : the decompressed part (see gzip_member_at), or
+							None for a part too big
+	"""
+
+	pending = collections.deque()
+
+	def submit(start, end):
+		pending.append((start, end, pool.submit(gzip_member_at, filename, start,
+										   end)))
+
+	try:
+		with open(filename, 'rb') as compressed:
+			compressed.seek(position)
+			data = b''
+			offset = position
+			start = position
+			done = False
+
+			while not done:
+				chunk = compressed.read(SCAN_SIZE)
+				done = not chunk
+				data += chunk
+
+				i = data.find(GZIP_MAGIC, start - offset + 1)
+				while(i >= 0):
+					if gzip_header(data, i):
+						submit(start, offset + i)
+						start = offset + i
+					i = data.find(GZIP_MAGIC, i + 1)
+
+				if done:
+					submit(start, offset + len(data))
+
+				elif(offset + len(data) - start > MAX_MEMBER_SIZE):
+					pending.append((start, None, None))
+					done = True
+
+				# the data from the last header on is kept (a header can be
+				# cut by the end of the chunk)
+				keep = max(0, min(start - offset, len(data) - 10))
+				data = data[keep:]
+				offset += keep
+
+				while(len(pending) > 2 * threads or (done and pending)):
+					yield pending.popleft()
+
+	finally:
+		for start, end, future in pending:
+			if future != None:
+				future.cancel()
+
+
+
+def inflate_member(filename, position, infos):
+	"""
+	Function (generator) that decompresses one gzip member by the current
+	thread alone, from its beginning to its end.
+
+	Takes 3 arguments :
+		- filename [string] : the gzip file
+		- position [integer] : first byte of the member
+		- infos [dict] : gets the byte following the member ('end')
+
+	Returns (yield):
+		- data [bytes] : the decompressed data, in order
+		or raise IOError if the member is truncated
+	"""
+
+	decompressor = zlib.decompressobj(31)
+	read = 0
+
+	with open(filename, 'rb') as compressed:
+		compressed.seek(position)
+
+		while not member_ended(decompressor):
+			chunk = compressed.read(READ_SIZE)
+			if not chunk:
+				raise IOError("Error : The gzip file '{0}' is truncated.".format(
+																	filename))
+			read += len(chunk)
+
+			try:
+				yield decompressor.decompress(chunk)
+			except zlib.error as error:
+				raise IOError("Error : Wrong gzip member in '{0}' ({1}).".format(
+																filename, error))
+
+	infos['end'] = position + read - len(decompressor.unused_data)
+
+
+
+def gzip_chunks(filename, pool, threads):
+	"""
+	Function (generator) that decompresses a gzip file by its members,
+	decompressed by a pool of threads and given in order (see gzip_members).
+	A part which is not a whole member (a header found by chance inside a
+	member) and a member too big are decompressed by the current thread
+	alone, then the members are searched again after it.
+
+	Takes 3 arguments :
+		- filename [string] : the gzip file
+		- pool [ThreadPoolExecutor] : the pool of threads
+		- threads [integer] : number of threads of the pool
+
+	Returns (yield):
+		- data [bytes] : the decompressed members, in order
+	"""
+
+	size = os.path.getsize(filename)
+	position = 0
+
+	while(position < size):
+		members = gzip_members(filename, position, pool, threads)
+
+		for start, end, future in members:
+			data = future.result() if future != None else None
+
+			if(data != None):
+				yield data
+				position = end
+				continue
+
+			# the member is decompressed alone, then searched again after it
+			members.close()
+			infos = {}
+			for data in inflate_member(filename, start, infos):
+				yield data
+			position = infos['end']
+			break
+
+
+
+class DecompressedFile(io.RawIOBase):
+	"""
+	Compressed input file decompressed by a pool of threads (see bz2_chunks
+	and gzip_chunks) : a thread decompresses the file ahead of the reading,
+	at most two blocks per thread.
+	"""
+
+	def __init__(self, filename, threads):
+		"""
+		Opens the file : a '.bz2' file is decompressed by bzip2 blocks, a
+		'.gz' file by gzip members.
+
+		Takes 2 arguments :
+			- filename [string] : the file
+			- threads [integer] : number of threads decompressing the blocks
+		"""
+
+		io.RawIOBase.__init__(self)
+
+		self.name = filename
+		self.pool = ThreadPoolExecutor(threads)
+		self.chunks = queue.Queue(2 * threads)
+		self.data = memoryview(b'')
+		self.ended = False
+		self.stop = threading.Event()
+
+		if(os.path.splitext(filename)[1] == '.bz2'):
+			chunks = bz2_chunks(filename, self.pool, threads)
+		else :
+			chunks = gzip_chunks(filename, self.pool, threads)
+
+		self.reader = threading.Thread(target=self.read_ahead, args=(chunks,))
+		self.reader.daemon = True
+		self.reader.start()
+
+	def read_ahead(self, chunks):
+		"""
+		Decompresses the file into the queue of chunks, ended by None (or by
+		the error met).
+		"""
+
+		try:
+			for data in chunks:
+				if(data and not self.put(data)):
+					return
+			self.put(None)
+
+		except Exception as error:
+			self.put(error)
+
+	def put(self, item):
+		"""
+		Puts an item into the queue of chunks, unless the file is closed.
+		"""
+
+		while not self.stop.is_set():
+			try:
+				self.chunks.put(item, timeout=0.1)
+				return True
+			except queue.Full:
+				pass
+
+		return False
+
+	def readable(self):
+		return True
+
+	def readinto(self, buffer):
+		"""
+		Reads decompressed data into a buffer.
+		"""
+
+		while not len(self.data):
+			if self.ended:
+				return 0
+
+			item = self.chunks.get()
+
+			if item == None:
+				self.ended = True
+			elif isinstance(item, Exception):
+				self.ended = True
+				raise item
+			else :
+				self.data = memoryview(item)
+
+		size = min(len(buffer), len(self.data))
+		buffer[:size] = self.data[:size]
+		self.data = self.data[size:]
+
+		return size
+
+	def close(self):
+		"""
+		Stops the decompression and closes the file.
+		"""
+
+		if not self.closed:
+			self.stop.set()
+			self.reader.join()
+			self.pool.shutdown()
+
+		io.RawIOBase.close(self)
+
+
+
+def open_decompressed(filename, threads):
+	"""
+	Function that opens a compressed file (.gz or .bz2) to read it, by
+	several threads if possible.
+
+	Takes 2 arguments :
+		- filename [string] : the compressed file
+		- threads [integer] : number of threads decompressing the file
+
+	Returns:
+		- the opened file
+	"""
+
+	if(threads > 1 and ThreadPoolExecutor != None):
+		return io.BufferedReader(DecompressedFile(filename, threads), READ_SIZE)
+
+	elif(os.path.splitext(filename)[1] == '.bz2'):
+		return bz2.BZ2File(filename, 'rb')
+
+	return gzip.open(filename, 'rb')
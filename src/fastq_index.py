@@ -0,0 +1,447 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions to index the reads of a fastq file
+	(not compressed, or compressed by gzip members as BGZF files) : the
+	index (a '.fqi' file written next to the fastq file) holds the position
+	of one read every INDEX_STEP reads, the number of reads and a fingerprint
+	of the file (checked each time the index is used). It is built in one
+	reading of the file and used by the next runs to cut the file at the
+	indexed reads (see sharding). """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+import bisect
+import hashlib
+import os
+import sys
+import zlib
+
+from decompression import member_ended
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# one read position is kept every INDEX_STEP reads
+INDEX_STEP = 10000
+
+# version of the index files
+INDEX_VERSION = 2
+
+# extension of the index files
+INDEX_EXTENSION = '.fqi'
+
+# size of the blocks read at once
+CHUNK_SIZE = 1048576
+
+# size of the beginning and of the end of a file checked before using its
+# index
+SAMPLE_SIZE = 65536
+
+# indexes read by the run (absolute file name : index), checked again
+# against their file each time they are used
+INDEXES = {}
+
+
+
+def index_name(filename):
+	"""
+	Function that gives the name of the index of a fastq file.
+
+	Takes one argument :
+		- filename [string] : the fastq file
+
+	Returns:
+		- [string] : the index file
+	"""
+
+	return filename + INDEX_EXTENSION
+
+
+
+def indexable(filename):
+	"""
+	Booleen that checks if a fastq file can be indexed : not compressed or
+	compressed by gzip ('.bz2' files are not).
+
+	Takes one argument :
+		- filename [string] : the fastq file
+
+	Returns:
+		- [bool] : True if it can be indexed
+	"""
+
+	return os.path.splitext(filename)[1] != '.bz2'
+
+
+
+def file_sample(filename):
+	"""
+	Function that computes a quick fingerprint of a file : the md5 of its
+	size, of its beginning and of its end.
+
+	Takes one argument :
+		- filename [string] : the file
+
+	Returns:
+		- [string] : the md5 (hexadecimal)
+	"""
+
+	size = os.path.getsize(filename)
+	md5 = hashlib.md5(str(size).encode())
+
+	with open(filename, 'rb') as data:
+		md5.update(data.read(SAMPLE_SIZE))
+		data.seek(max(0, size - SAMPLE_SIZE))
+		md5.update(data.read(SAMPLE_SIZE))
+
+	return md5.hexdigest()
+
+
+
+def read_members(filename, md5):
+	"""
+	Function (generator) that reads a fastq file, decompressed if it ends
+	with '.gz', with the gzip member each part comes from. A file not
+	compressed is a single member starting at 0.
+
+	Takes 2 arguments :
+		- filename [string] : the fastq file
+		- md5 [hashlib object] : updated with the bytes of the file
+
+	Returns (yield):
+		- member [integer] : position of the gzip member in the file
+		- data [bytes] : data read (decompressed), in order
+		or raise IOError if the file is truncated
+	"""
+
+	compressed = os.path.splitext(filename)[1] == '.gz'
+
+	with open(filename, 'rb') as raw:
+		decompressor = zlib.decompressobj(31)
+		member = 0
+		read = 0
+		fed = False
+
+		while True:
+			chunk = raw.read(CHUNK_SIZE)
+			md5.update(chunk)
+			read += len(chunk)
+
+			if not chunk:
+				break
+
+			if not compressed:
+				yield member, chunk
+				continue
+
+			fed = True
+			while chunk:
+				data = decompressor.decompress(chunk)
+				if data:
+					yield member, data
+
+				chunk = b''
+
+				# a new member starts after the end of this one (the bytes
+				# following it are left in unused_data)
+				if decompressor.unused_data:
+					chunk = decompressor.unused_data
+					member = read - len(chunk)
+					decompressor = zlib.decompressobj(31)
+					fed = bool(chunk)
+
+		if(compressed and fed and not member_ended(decompressor)):
+			raise IOError("Error : The gzip file '{0}' is truncated.".format(
+																	filename))
+
+
+
+def build_index(filename, step=INDEX_STEP):
+	"""
+	Function that indexes a fastq file in one reading : the position of the
+	reads number 0, step, 2*step... as the gzip member holding the read and
+	the position of the read in the decompressed member (member 0 and the
+	position of the read for a file not compressed).
+
+	Takes 2 arguments :
+		- filename [string] : the fastq file (not compressed, or '.gz')
+		- step [integer] : one read position is kept every step reads
+
+	Returns:
+		- index [dict] : the file size ('size'), its modification time in
+						 nanoseconds ('mtime'), its md5 ('fingerprint'), the
+						 md5 of its size, beginning and end ('sample'), the
+						 step ('step'), the number of reads ('records'), and
+						 the positions ('positions')
+	"""
+
+	mtime = int(os.stat(filename).st_mtime * 1e9)
+
+	md5 = hashlib.md5()
+	positions = []
+	lines = 0
+	inner = 0
+	current = None
+	last = b'\n'
+
+	for member, data in read_members(filename, md5):
+		if(member != current):
+			current = member
+			inner = 0
+
+		if not positions:
+			positions.append((member, inner))
+
+		count = data.count(b'\n')
+
+		# the read number len(positions) * step starts after its first line
+		# - 1 new lines
+		target = len(positions) * step * 4
+		while(lines < target <= lines + count):
+			end = -1
+			for i in range(target - lines):
+				end = data.index(b'\n', end + 1)
+
+			positions.append((current, inner + end + 1))
+			target = len(positions) * step * 4
+
+		lines += count
+		inner += len(data)
+		last = data[-1:]
+
+	# the last line may have no new line
+	if(last != b'\n'):
+		lines += 1
+
+	records = lines // 4
+	positions = positions[:(records + step - 1) // step]
+
+	return {'size' : os.path.getsize(filename), 'mtime' : mtime,
+			'fingerprint' : md5.hexdigest(), 'sample' : file_sample(filename),
+			'step' : step, 'records' : records, 'positions' : positions}
+
+
+
+def write_index(filename, index):
+	"""
+	Function that writes the index of a fastq file next to it (a tabulated
+	text file : a header, then one position per line).
+
+	Takes 2 arguments :
+		- filename [string] : the fastq file
+		- index [dict] : its index (see build_index)
+
+	Returns nothing
+	"""
+
+	with open(index_name(filename), 'w') as out:
+		out.write('# FASTQ reads index of {0}\n'.format(
+												os.path.basename(filename)))
+		out.write('version\t{0}\n'.format(INDEX_VERSION))
+
+		for key in ('size', 'mtime', 'fingerprint', 'sample', 'step',
+					'records'):
+			out.write('{0}\t{1}\n'.format(key, index[key]))
+
+		for member, inner in index['positions']:
+			out.write('{0}\t{1}\n'.format(member, inner))
+
+
+
+def read_index(filename):
+	"""
+	Function that reads the index of a fastq file.
+
+	Takes one argument :
+		- filename [string] : the fastq file
+
+	Returns:
+		- index [dict] : its index (see build_index)
+		or raise ValueError if the index file is not an index
+	"""
+
+	index = {'positions' : []}
+
+	with open(index_name(filename)) as fqi:
+		for line in fqi:
+			if line.startswith('#'):
+				continue
+
+			cells = line.split()
+			if(len(cells) != 2):
+				raise ValueError("Error : Wrong line in the index '{0}'.".format(
+														index_name(filename)))
+
+			if(cells[0] in ('fingerprint', 'sample')):
+				index[cells[0]] = cells[1]
+			elif cells[0].isdigit():
+				index['positions'].append((int(cells[0]), int(cells[1])))
+			else :
+				index[cells[0]] = int(cells[1])
+
+	if(index.get('version') != INDEX_VERSION):
+		raise ValueError("Error : Unknown version of the index '{0}'.".format(
+														index_name(filename)))
+
+	return index
+
+
+
+def matching_index(filename, index):
+	"""
+	Booleen that checks if an index is the index of a fastq file as it is
+	now : same size, modification time, beginning and end (the whole file is
+	not read again).
+
+	Takes 2 arguments :
+		- filename [string] : the fastq file
+		- index [dict] : the index
+
+	Returns:
+		- [bool] : True if the index can be used
+	"""
+
+	if not os.path.isfile(filename):
+		return False
+
+	stat = os.stat(filename)
+
+	return(index.get('size') == stat.st_size and
+		   index.get('mtime') == int(stat.st_mtime * 1e9) and
+		   index.get('sample') == file_sample(filename) and
+		   len(index['positions']) == (index['records'] + index['step'] - 1)
+									  // index['step'])
+
+
+
+def load_index(filename):
+	"""
+	Function that gets the index of a fastq file, if it has an index
+	matching it. An index already read by the run is checked again against
+	the file, and forgotten if it doesn't match it anymore.
+
+	Takes one argument :
+		- filename [string] : the fastq file
+
+	Returns:
+		- index [dict] : the index (see build_index), or None
+	"""
+
+	name = os.path.abspath(filename)
+	index = INDEXES.pop(name, None)
+
+	# the index kept is read again if the file changed
+	if(index != None and not matching_index(filename, index)):
+		index = None
+
+	if(index == None and os.path.isfile(index_name(filename))):
+		try:
+			index = read_index(filename)
+		except (IOError, ValueError, KeyError):
+			index = None
+
+		if(index != None and not matching_index(filename, index)):
+			index = None
+
+	if(index != None):
+		INDEXES[name] = index
+
+	return index
+
+
+
+def check_index(filename):
+	"""
+	Function that checks the index found next to a fastq file. An index
+	which doesn't match the file anymore is not used.
+
+	Takes one argument :
+		- filename [string] : the fastq file
+
+	Returns:
+		- index [dict] : the index (see build_index), or None
+	"""
+
+	index = load_index(filename)
+
+	if(index == None and os.path.isfile(index_name(filename))):
+		sys.stderr.write("Warning : The index '{0}' doesn't match its fastq \
+file, it is not used (rebuild it with '--index').\n".format(index_name(filename)))
+
+	return index
+
+
+
+def update_index(filename):
+	"""
+	Function that builds the index of a fastq file, unless it already has
+	an index matching it.
+
+	Takes one argument :
+		- filename [string] : the fastq file
+
+	Returns:
+		- index [dict] : the index (see build_index), or None if the file
+						 can't be indexed
+	"""
+
+	if not indexable(filename):
+		sys.stderr.write("Warning : '{0}' can't be indexed (only fastq files \
+not compressed or compressed by gzip).\n".format(filename))
+		return None
+
+	index = load_index(filename)
+
+	if(index == None):
+		index = build_index(filename)
+		INDEXES[os.path.abspath(filename)] = index
+
+		try:
+			write_index(filename, index)
+		except (IOError, OSError) as error:
+			sys.stderr.write("Warning : The index of '{0}' can't be written \
+({1}).\n".format(filename, error))
+
+	return index
+
+
+
+def record_offsets(index, positions):
+	"""
+	Function that finds the indexed reads nearest to some positions of a
+	fastq file not compressed.
+
+	Takes 2 arguments :
+		- index [dict] : index of the file (see build_index)
+		- positions [list] : positions in the file
+
+	Returns:
+		- numbers [list] : for each position, the number of the indexed
+						   position nearest to it
+	"""
+
+	offsets = [inner for member, inner in index['positions']]
+	numbers = []
+
+	for position in positions:
+		i = bisect.bisect_left(offsets, position)
+
+		if(i == len(offsets) or (i > 0 and position - offsets[i - 1] <
+									 offsets[i] - position)):
+			i -= 1
+
+		numbers.append(i)
+
+	return numbers
@@ -0,0 +1,405 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions to trim interleaved paired ends data
+	(the two reads of each pair one after the other, in a single file or
+	stream) without writing them apart : threads split the pairs into two
+	named pipes read by Trimmomatic, checking that the reads are mates, and
+	interleave the trimmed pairs into a single output. The reads left
+	without their mate are written together into a singletons file. """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+from checking_entries import detect_phred, get_file_prefix
+from compression import BlockCompressedFile
+from streams import STREAMS, open_stream, start_copy, remove_streams
+
+import collections
+import errno
+import itertools
+import os
+import re
+import sys
+
+try:
+	import queue
+except ImportError:
+	import Queue as queue
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# reads given at once to the threads writing and reading the named pipes
+CHUNK_READS = 4096
+
+# chunks of reads waiting for a named pipe (the two reads of the pairs
+# are read by Trimmomatic at the same time, the waiting chunks are few)
+QUEUE_CHUNKS = 8
+
+# end of the mate in the name of a read ('/1' or '/2')
+MATE_SUFFIX = re.compile(br'/[12]$')
+
+
+
+class MatesError(ValueError):
+	"""
+	Error of an interleaved file whose reads are not in pairs of mates (a
+	read out of order, or a last read without mate).
+	"""
+
+
+
+def read_name(record):
+	"""
+	Function that gets the name of a read, without the end of its mate.
+
+	Takes one argument :
+		- record [bytes] : the four lines of the read
+
+	Returns:
+		- [bytes] : the name of the read
+	"""
+
+	header = record.split(b'\n', 1)[0][1:].split(None, 1)
+
+	return MATE_SUFFIX.sub(b'', header[0]) if header else b''
+
+
+
+def open_output(filename):
+	"""
+	Function that opens an output file of the interleaved reads (compressed
+	by several threads if its extension is '.gz' or '.bz2').
+
+	Takes one argument :
+		- filename [string] : the file
+
+	Returns:
+		- [file] : the file opened in binary mode
+	"""
+
+	if(os.path.splitext(filename)[1] in ('.gz', '.bz2')):
+		return BlockCompressedFile(filename)
+
+	return open(filename, 'wb')
+
+
+
+def read_chunks(fifo, chunks):
+	"""
+	Function that reads the reads written by Trimmomatic into a named pipe
+	and gives them by chunks ('None' at the end). An error is kept in
+	STREAMS['errors'].
+
+	Takes 2 arguments :
+		- fifo [string] : the named pipe
+		- chunks [Queue] : the chunks of reads (lists of reads)
+
+	Returns nothing
+	"""
+
+	try:
+		with open(fifo, 'rb') as reads:
+			while True:
+				lines = list(itertools.islice(reads, 4 * CHUNK_READS))
+				if not lines:
+					break
+
+				chunks.put([b''.join(lines[i:i + 4])
+							for i in range(0, len(lines), 4)])
+
+	except (IOError, OSError) as error:
+		STREAMS['errors'].append(error)
+
+	finally:
+		chunks.put(None)
+
+
+
+def split_pairs(filename, fifos):
+	"""
+	Function that splits the pairs of an interleaved file (or stream) into
+	two named pipes read by Trimmomatic, checking that the two reads of each
+	pair are mates. An error is kept in STREAMS['errors'] (the named pipes
+	are closed : Trimmomatic ends with the pairs already read).
+
+	Takes 2 arguments :
+		- filename [string] : the interleaved file
+		- fifos [list] : the named pipes of the first and second reads
+
+	Returns nothing
+	"""
+
+	queues = [queue.Queue(QUEUE_CHUNKS) for fifo in fifos]
+
+	for fifo, chunks in zip(fifos, queues):
+		start_copy(write_chunks, (fifo, chunks))
+
+	try:
+		with open_stream(filename) as reads:
+			while True:
+				lines = list(itertools.islice(reads, 8 * CHUNK_READS))
+				if not lines:
+					break
+
+				if(len(lines) % 8 != 0):
+					raise MatesError("the last read of '{0}' has no mate"
+									 .format(filename))
+
+				first = [b''.join(lines[i:i + 4])
+						 for i in range(0, len(lines), 8)]
+				second = [b''.join(lines[i + 4:i + 8])
+						  for i in range(0, len(lines), 8)]
+
+				for read_1, read_2 in zip(first, second):
+					if(read_name(read_1) != read_name(read_2)):
+						raise MatesError("the reads '{0}' and '{1}' of '{2}' \
+are not mates".format(read_name(read_1).decode('ascii', 'replace'),
+					  read_name(read_2).decode('ascii', 'replace'), filename))
+
+				queues[0].put(first)
+				queues[1].put(second)
+
+	except (IOError, OSError, EOFError, ValueError) as error:
+		STREAMS['errors'].append(error)
+
+	finally:
+		for chunks in queues:
+			chunks.put(None)
+
+
+
+def write_chunks(fifo, chunks):
+	"""
+	Function that writes chunks of reads into a named pipe read by
+	Trimmomatic, until 'None'. An error is kept in STREAMS['errors'].
+
+	Takes 2 arguments :
+		- fifo [string] : the named pipe
+		- chunks [Queue] : the chunks of reads
+
+	Returns nothing
+	"""
+
+	try:
+		with open(fifo, 'wb') as out:
+			for chunk in iter(chunks.get, None):
+				out.write(b''.join(chunk))
+
+	# Trimmomatic stopping its reading is its own error
+	except (IOError, OSError) as error:
+		if(error.errno != errno.EPIPE):
+			STREAMS['errors'].append(error)
+
+		# the reads left are not written (the splitting thread is not blocked)
+		while chunks.get() != None:
+			pass
+
+
+
+def interleave_pairs(fifos, filename):
+	"""
+	Function that interleaves the trimmed pairs written by Trimmomatic into
+	two named pipes (first and second reads) into a single output. An error
+	is kept in STREAMS['errors'].
+
+	Takes 2 arguments :
+		- fifos [list] : the named pipes of the first and second reads
+		- filename [string] : the interleaved output
+
+	Returns nothing
+	"""
+
+	queues = [queue.Queue() for fifo in fifos]
+
+	for fifo, chunks in zip(fifos, queues):
+		start_copy(read_chunks, (fifo, chunks))
+
+	pending = [collections.deque(), collections.deque()]
+	done = [False, False]
+
+	try:
+		with open_output(filename) as out:
+			while True:
+				# reads of both named pipes (Trimmomatic writes them by
+				# blocks, not pair by pair)
+				for i in (0, 1):
+					while(not pending[i] and not done[i]):
+						chunk = queues[i].get()
+						if chunk == None:
+							done[i] = True
+						else :
+							pending[i].extend(chunk)
+
+				pairs = min(len(pending[0]), len(pending[1]))
+				if(pairs == 0):
+					break
+
+				out.write(b''.join(pending[i].popleft()
+								   for pair in range(pairs) for i in (0, 1)))
+
+		if(pending[0] or pending[1]):
+			raise ValueError("Trimmomatic wrote first and second reads of \
+different pairs")
+
+	except (IOError, OSError, ValueError) as error:
+		STREAMS['errors'].append(error)
+
+
+
+def merge_singletons(fifos, filename):
+	"""
+	Function that writes the reads left without their mate, written by
+	Trimmomatic into two named pipes, into a single file (in the order they
+	are written). An error is kept in STREAMS['errors'].
+
+	Takes 2 arguments :
+		- fifos [list] : the named pipes of the first and second reads
+		- filename [string] : the singletons file
+
+	Returns nothing
+	"""
+
+	chunks = queue.Queue()
+
+	for fifo in fifos:
+		start_copy(read_chunks, (fifo, chunks))
+
+	try:
+		with open_output(filename) as out:
+			ends = 0
+			while(ends < len(fifos)):
+				chunk = chunks.get()
+				if chunk == None:
+					ends += 1
+				else :
+					out.write(b''.join(chunk))
+
+	except (IOError, OSError) as error:
+		STREAMS['errors'].append(error)
+
+
+
+def interleaved_outputs(arg):
+	"""
+	Function that gives the files of the interleaved reads : the output file
+	and the singletons file given by the user, else the default ones
+	(trimmed_* and single_* in the output directory).
+
+	Takes one argument :
+		arg [dict] : dictionnary containning all the command argument entries.
+
+	Returns:
+		- outputs [list] : the interleaved file, and the singletons file if
+						   the singletons are kept
+	"""
+
+	outputs = arg.get('outputs')
+
+	if not outputs:
+		prefix = get_file_prefix(arg['input'][0])
+		extension = '.{0}'.format(arg['compress']) if 'compress' in arg else ''
+		outputs = ['{0}/trimmed_{1}.fastq{2}'.format(arg['output'], prefix,
+													 extension),
+				   '{0}/single_{1}.fastq{2}'.format(arg['output'], prefix,
+													extension)]
+
+	return outputs
+
+
+
+def open_interleaved(arg):
+	"""
+	Function that replaces the interleaved input of paired ends data by two
+	named pipes (first and second reads), and the outputs by named pipes
+	interleaved into the output file (and merged into the singletons file,
+	if given or by default).
+
+	Takes one argument :
+		arg [dict] : dictionnary containning all the command argument entries.
+					 The interleaved input is arg['input'][0], the outputs
+					 are given by interleaved_outputs.
+
+	Returns:
+		arg [dict] : the arguments with the named pipes
+	"""
+
+	filename = arg['input'][0]
+	prefix = get_file_prefix(filename)
+
+	# the quality encoding is detected before Trimmomatic reads the pipes
+	if(arg.get('phred') == None):
+		arg['phred'] = detect_phred(filename)
+
+	outputs = interleaved_outputs(arg)
+
+	names = ['read_1', 'read_2', 'trimmed_1', 'trimmed_2', 'single_1',
+			 'single_2']
+	fifos = dict((name, os.path.join(STREAMS['dir'], '{0}_{1}.fastq'.format(
+															prefix, name)))
+				 for name in names)
+
+	for name in names:
+		os.mkfifo(fifos[name])
+
+	start_copy(split_pairs, (filename, [fifos['read_1'], fifos['read_2']]))
+	start_copy(interleave_pairs, ([fifos['trimmed_1'], fifos['trimmed_2']],
+								  outputs[0]))
+
+	# the singletons are dropped if not wanted
+	if(len(outputs) == 2):
+		start_copy(merge_singletons, ([fifos['single_1'], fifos['single_2']],
+									  outputs[1]))
+		singles = [fifos['single_1'], fifos['single_2']]
+	else :
+		singles = [os.devnull, os.devnull]
+
+	arg['input'] = [fifos['read_1'], fifos['read_2']]
+	arg['outputs'] = [fifos['trimmed_1'], fifos['trimmed_2']] + singles
+
+	return arg
+
+
+
+def close_interleaved(outputs):
+	"""
+	Function that waits for the end of the threads of the interleaved reads.
+	If a copy failed, the outputs are only written in part : they are
+	removed, and the run stops if the reads of the input are not in pairs
+	of mates (the other errors are given by close_streams).
+
+	Takes one argument :
+		- outputs [list] : the files of the interleaved reads (see
+						   interleaved_outputs)
+
+	Returns nothing
+	"""
+
+	for thread in STREAMS['threads']:
+		thread.join()
+
+	if not STREAMS['errors']:
+		return
+
+	for filename in outputs:
+		if os.path.isfile(filename):
+			os.remove(filename)
+
+	mates = [error for error in STREAMS['errors']
+			 if isinstance(error, MatesError)]
+
+	if mates:
+		remove_streams()
+		sys.exit("Error : The interleaved mates are out of order ({0}), the \
+partial outputs are removed.".format(mates[0]))
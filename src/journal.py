@@ -0,0 +1,334 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions to resume an interrupted run : a
+	journal written in the working directory keeps the steps and the shards
+	already done, with a sample of their outputs (the md5 of their size, of
+	their beginning and of their end, not of the whole files). A run launched
+	again with the same parameters checks them and goes on from the first
+	step (or shard) not done. The journal is removed at the end of the run. """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+from fastq_index import file_sample
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# name of the journal, in the working directory
+JOURNAL_FILE = 'trimming_journal.json'
+
+# options which don't change the trimmed reads of a run
+RUN_OPTIONS_SKIPPED = ['threads', 'shards', 'cache', 'cache_size', 'index',
+					   'priority', 'workers', 'chrome_trace', 'profile',
+					   'memory', 'no_class_sharing', 'scratch']
+
+# journal of the run : its file (None without journal), the key of the run
+# ('run'), the units done ('units') and the temporary files ('temporary')
+JOURNAL = {'file' : None, 'run' : None, 'units' : {}, 'temporary' : []}
+
+
+
+def run_key(options, inputs):
+	"""
+	Function that computes the key of a run : the md5 of its options and of
+	the size and modification time of its input files.
+
+	Takes 2 arguments :
+		- options [dict] : the parameters of the run
+		- inputs [list] : the input files (or the file of single ends data)
+
+	Returns:
+		- [string] : the key
+	"""
+
+	if isinstance(inputs, str):
+		inputs = [inputs]
+
+	description = dict((option, value) for option, value in options.items()
+					   if option not in RUN_OPTIONS_SKIPPED)
+	description['input files'] = [[os.path.abspath(filename),
+								   os.path.getsize(filename),
+								   os.path.getmtime(filename)]
+								  for filename in inputs
+								  if os.path.isfile(filename)]
+
+	return hashlib.md5(json.dumps(description, sort_keys=True,
+								  default=str).encode()).hexdigest()
+
+
+
+def save_journal():
+	"""
+	Function that writes the journal (at once : an interruption never leaves
+	half a journal).
+
+	Don't takes any argument
+
+	Returns nothing
+	"""
+
+	if JOURNAL['file'] == None:
+		return
+
+	directory = os.path.dirname(JOURNAL['file'])
+	tmp, tmp_name = tempfile.mkstemp(dir=directory)
+
+	with os.fdopen(tmp, 'w') as out:
+		json.dump({'run' : JOURNAL['run'], 'units' : JOURNAL['units'],
+				   'temporary' : JOURNAL['temporary']}, out, indent=1)
+
+	os.rename(tmp_name, JOURNAL['file'])
+
+
+
+def remove_files(filenames):
+	"""
+	Function that removes files and directories, if they exist.
+
+	Takes one argument :
+		- filenames [list] : the files and directories
+
+	Returns nothing
+	"""
+
+	for filename in filenames:
+		if os.path.isdir(filename):
+			shutil.rmtree(filename, ignore_errors=True)
+		elif os.path.isfile(filename):
+			os.remove(filename)
+
+
+
+def open_journal(directory, options, inputs):
+	"""
+	Function that opens the journal of the run. The journal of an
+	interrupted run with the same parameters is kept (its units will not be
+	done again), the one of another run is removed with its temporary files.
+
+	Takes 3 arguments :
+		- directory [string] : the working directory
+		- options [dict] : the parameters of the run
+		- inputs [list] : the input files (or the file of single ends data)
+
+	Returns nothing
+	"""
+
+	JOURNAL['file'] = os.path.join(os.path.abspath(directory), JOURNAL_FILE)
+	JOURNAL['run'] = run_key(options, inputs)
+	JOURNAL['units'] = {}
+	JOURNAL['temporary'] = []
+
+	try:
+		with open(JOURNAL['file']) as journal:
+			previous = json.load(journal)
+	except (IOError, ValueError):
+		previous = None
+
+	if(previous != None and previous.get('run') == JOURNAL['run']):
+		JOURNAL['units'] = previous.get('units', {})
+		JOURNAL['temporary'] = previous.get('temporary', [])
+
+	# files left by another run
+	elif(previous != None):
+		remove_files(previous.get('temporary', []))
+
+	if JOURNAL['units']:
+		sys.stdout.write("Resuming the interrupted run ({0} units done).\n"
+						 .format(len(JOURNAL['units'])))
+		sys.stdout.flush()
+
+	save_journal()
+
+
+
+def close_journal():
+	"""
+	Function that ends the journal of a run done : it is removed, with the
+	temporary files left.
+
+	Don't takes any argument
+
+	Returns nothing
+	"""
+
+	remove_files(JOURNAL['temporary'])
+	JOURNAL['temporary'] = []
+
+	if(JOURNAL['file'] != None and os.path.isfile(JOURNAL['file'])):
+		os.remove(JOURNAL['file'])
+
+	JOURNAL['file'] = None
+
+
+
+def unit_done(name, cmd):
+	"""
+	Booleen that checks if a unit of the run (a step or a shard) has been
+	done by the interrupted run : same commandline and outputs unchanged
+	since (same size, beginning and end, see file_sample).
+
+	Takes 2 arguments :
+		- name [string] : name of the unit
+		- cmd [string] : its commandline (None to check only its outputs)
+
+	Returns:
+		- [bool] : True if the unit has not to be done again
+	"""
+
+	unit = JOURNAL['units'].get(name)
+
+	if(JOURNAL['file'] == None or unit == None):
+		return False
+
+	if(cmd != None and unit['cmd'] != cmd):
+		return False
+
+	for filename, sample in unit['outputs'].items():
+		if(not os.path.isfile(filename) or file_sample(filename) != sample):
+			return False
+
+	return True
+
+
+
+def record_unit(name, cmd, outputs):
+	"""
+	Function that writes in the journal a unit of the run just done, with
+	the samples of its outputs (see file_sample).
+
+	Takes 3 arguments :
+		- name [string] : name of the unit
+		- cmd [string] : its commandline
+		- outputs [list] : its output files
+
+	Returns nothing
+	"""
+
+	if JOURNAL['file'] == None:
+		return
+
+	JOURNAL['units'][name] = {'cmd' : cmd, 'outputs' : dict(
+				(os.path.abspath(filename), file_sample(filename))
+				for filename in outputs if os.path.isfile(filename))}
+
+	save_journal()
+
+
+
+def refresh_unit(name):
+	"""
+	Function that writes again in the journal the samples of the outputs of
+	a unit of the run, changed since the unit was done (as the singletons
+	of step 2 completed with the ones of step 1).
+
+	Takes one argument :
+		- name [string] : name of the unit
+
+	Returns nothing
+	"""
+
+	unit = JOURNAL['units'].get(name)
+
+	if(JOURNAL['file'] == None or unit == None):
+		return
+
+	unit['outputs'] = dict((filename, file_sample(filename))
+						   for filename in unit['outputs']
+						   if os.path.isfile(filename))
+
+	save_journal()
+
+
+
+def record_temporary(filename):
+	"""
+	Function that writes in the journal a temporary file of the run (removed
+	if another run starts in the working directory).
+
+	Takes one argument :
+		- filename [string] : the file or directory
+
+	Returns nothing
+	"""
+
+	filename = os.path.abspath(filename)
+
+	if(JOURNAL['file'] != None and filename not in JOURNAL['temporary']):
+		JOURNAL['temporary'].append(filename)
+		save_journal()
+
+
+
+def rename_output(old, new):
+	"""
+	Function that renames an output file (the journal follows it). A file
+	already renamed by the interrupted run is kept : the old file is then
+	an unfinished output of the next step.
+
+	Takes 2 arguments :
+		- old [string] : the file
+		- new [string] : its new name
+
+	Returns nothing
+	"""
+
+	old, new = os.path.abspath(old), os.path.abspath(new)
+
+	renamed = [unit for unit in JOURNAL['units'].values()
+			   if new in unit['outputs']]
+
+	if(renamed and os.path.isfile(old)):
+		os.remove(old)
+	elif os.path.isfile(old):
+		os.rename(old, new)
+
+	for unit in JOURNAL['units'].values():
+		if old in unit['outputs']:
+			unit['outputs'][new] = unit['outputs'].pop(old)
+
+	record_temporary(new)
+
+
+
+def remove_output(filename):
+	"""
+	Function that removes an output file which is not needed anymore (the
+	journal forgets it).
+
+	Takes one argument :
+		- filename [string] : the file
+
+	Returns nothing
+	"""
+
+	if os.path.isfile(filename):
+		os.remove(filename)
+
+	filename = os.path.abspath(filename)
+
+	for unit in JOURNAL['units'].values():
+		unit['outputs'].pop(filename, None)
+
+	if filename in JOURNAL['temporary']:
+		JOURNAL['temporary'].remove(filename)
+
+	save_journal()
@@ -0,0 +1,347 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions to stream step 1 (adapter trimming)
+	outputs into step 2 (quality trimming) through named pipes (FIFOs), so
+	both Trimmomatic runs work at the same time and the intermediate reads
+	never reach the disk. """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+from checking_entries import *
+from compression import *
+from profiling import clock, record_phase
+
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# size asked for the pipe buffers (the biggest one allowed by default on
+# Linux). Big buffers let the two Trimmomatic runs drift apart without
+# blocking each other.
+PIPE_SIZE = 1048576
+
+# fcntl command to change the size of a pipe buffer (Linux only)
+F_SETPIPE_SZ = 1031
+
+
+
+def named_pipes_available():
+	"""
+	Booleen that checks if named pipes can be used on this system.
+
+	Don't takes any argument
+
+	Returns:
+		- True [bool] : if FIFOs can be created
+		- False [bool] : else
+	"""
+
+	return hasattr(os, 'mkfifo')
+
+
+
+def pipe_parameters(param):
+	"""
+	Function that creates the parameters of step 1 and step 2 when they are
+	linked by named pipes :
+		- step 1 outputs are written in a new temporary directory, without
+		  compression
+		- step 2 gets the quality encoding of its inputs. Trimmomatic reads
+		  the first reads of the first file to detect it, before opening the
+		  second one : with pipes, this would block step 1.
+
+	Takes one argument :
+		- param [dict] : dictionnary containning all parameters
+
+	Returns:
+		- step_1 [dict] : parameters of step 1 (the pipes directory is in
+						  step_1['output'])
+		- step_2 [dict] : parameters of step 2
+	"""
+
+	# copy the parameters to keep the user's ones
+	step_1 = dict(param)
+	step_2 = dict(param)
+
+	# step 1 outputs are written in a temporary directory
+	step_1['output'] = tempfile.mkdtemp(prefix='trimming_pipes_')
+
+	# intermediate reads are never compressed
+	if 'compress' in step_1:
+		del step_1['compress']
+
+	# if step 1 converts the quality, step 2 gets the converted encoding
+	if 'convert' in step_1:
+		step_2['phred'] = int(step_1['convert'][-2:])
+
+	# else the encoding of the input files (given by the user or detected)
+	elif param.get('phred') != None:
+		step_2['phred'] = param['phred']
+
+	elif(param['layout'] == 'SE'):
+		step_2['phred'] = detect_phred(param['input'])
+
+	else :
+		step_2['phred'] = detect_phred(param['input'][0])
+
+	return step_1, step_2
+
+
+
+def relay_pipe(step_1_out, step_2_in):
+	"""
+	Function that copies the reads written by step 1 in a named pipe into the
+	named pipe read by step 2, until step 1 closes its output. Each pipe is
+	opened by one Trimmomatic run whenever it wants : Trimmomatic reads the
+	first read of the first file before opening the second file, and opens
+	all its outputs before writing anything.
+
+	Takes 2 arguments :
+		- step_1_out [string] : named pipe written by step 1
+		- step_2_in [string] : named pipe read by step 2
+
+	Returns nothing
+	"""
+
+	fd_in = None
+	fd_out = None
+
+	try:
+		# waiting for step 1 then step 2 to open the pipes
+		fd_in = os.open(step_1_out, os.O_RDONLY)
+		fd_out = os.open(step_2_in, os.O_WRONLY)
+
+		# try to get bigger pipe buffers (not an error if not allowed)
+		try:
+			import fcntl
+			fcntl.fcntl(fd_in, F_SETPIPE_SZ, PIPE_SIZE)
+			fcntl.fcntl(fd_out, F_SETPIPE_SZ, PIPE_SIZE)
+		except (ImportError, IOError, OSError):
+			pass
+
+		# copy until the end of step 1 output
+		data = os.read(fd_in, PIPE_SIZE)
+		while data:
+			while data:
+				data = data[os.write(fd_out, data):]
+			data = os.read(fd_in, PIPE_SIZE)
+
+	# step 2 stopped reading : step 1 will fail writing
+	except OSError:
+		pass
+
+	finally:
+		if fd_in != None:
+			os.close(fd_in)
+		if fd_out != None:
+			os.close(fd_out)
+
+
+
+def create_step_pipes(inout, pipe_dir, single_dir):
+	"""
+	Function that creates the named pipes between step 1 and step 2 : step 1
+	trimmed reads are written into FIFOs, copied into the FIFOs read by step
+	2. The singleton reads of paired-ends data (not read by step 2, they
+	are trimmed apart once both steps are done) are written into files of
+	another directory (the pipes directory is removed at the end of the
+	steps).
+
+	Takes 3 arguments :
+		- inout [dict] : dictionnary containning step 1 generated files
+		- pipe_dir [string] : directory containning the pipes
+		- single_dir [string] : directory of the singleton reads of step 1
+
+	Returns:
+		- pipes [dict] : the pipes written by step 1 ('step_1') and read by
+						 step 2 ('step_2'), the directory ('dir') and the
+						 threads copying the reads ('threads')
+		- inout [dict] : containing step 2 input files and step 1 singleton
+						 read files
+	"""
+
+	pipes = {'step_1' : [], 'step_2' : [], 'dir' : pipe_dir, 'threads' : []}
+
+	# getting trimmed reads files (one for SE, two for PE)
+	trimmed = inout['trimmed']
+	if isinstance(trimmed, str):
+		trimmed = [trimmed]
+
+	for name in trimmed:
+
+		# step 2 input pipe, named like the two steps temporary files
+		tmp_name = '{0}/{1}'.format(pipe_dir,
+						os.path.basename(name).replace('trimmed_', 'tmp', 1))
+
+		os.mkfifo(name)
+		os.mkfifo(tmp_name)
+
+		pipes['step_1'].append(name)
+		pipes['step_2'].append(tmp_name)
+
+		relay = threading.Thread(target=relay_pipe, args=(name, tmp_name))
+		relay.daemon = True
+		relay.start()
+		pipes['threads'].append(relay)
+
+	# singleton reads of step 1 are written out of the pipes directory
+	if 'single' in inout:
+		singles = []
+
+		for name in inout['single']:
+			single = os.path.abspath('{0}/{1}'.format(single_dir,
+						os.path.basename(name).replace('single_', 'tmpsingle_',
+													   1)))
+			os.symlink(single, name)
+			singles.append(single)
+
+		inout['single'] = tuple(singles)
+
+	# step 2 reads the pipes
+	if isinstance(inout['trimmed'], str):
+		inout['trimmed'] = pipes['step_2'][0]
+	else :
+		inout['trimmed'] = tuple(pipes['step_2'])
+
+	return pipes, inout
+
+
+
+def remove_step_pipes(pipes):
+	"""
+	Function that removes the named pipes. Threads still waiting for a
+	Trimmomatic run to open a pipe (if a step failed) are released.
+
+	Takes one argument :
+		- pipes [dict] : the named pipes created by create_step_pipes
+
+	Returns nothing
+	"""
+
+	for name_1, name_2, relay in zip(pipes['step_1'], pipes['step_2'],
+									 pipes['threads']):
+
+		# opening the other side of the pipes releases a waiting thread
+		for i in range(20):
+			if not relay.is_alive():
+				break
+
+			for name, flag in ((name_1, os.O_WRONLY), (name_2, os.O_RDONLY)):
+				try:
+					os.close(os.open(name, flag | os.O_NONBLOCK))
+				except OSError:
+					pass
+
+			relay.join(0.1)
+
+	shutil.rmtree(pipes['dir'], ignore_errors=True)
+
+
+
+def stop_process(prog):
+	"""
+	Function that stops a process if it's still running.
+
+	Takes one argument :
+		- prog [Popen] : the process
+
+	Returns nothing
+	"""
+
+	if prog != None and prog.poll() == None:
+		prog.kill()
+		prog.wait()
+
+
+
+def launch_piped_steps(cmd_1, cmd_2, pipes, log_1, log_2):
+	"""
+	Function that launches step 1 and step 2 at the same time, step 2 reading
+	step 1 outputs through the named pipes (step 2 sees the end of its inputs
+	when step 1 closes its outputs). If one Trimmomatic run fails, the
+	other one is stopped and the error is raised. The pipes are always
+	removed at the end. The time java takes to start is traced (see
+	profiling).
+
+	Takes 5 arguments :
+		- cmd_1 [string] : step 1 commandline
+		- cmd_2 [string] : step 2 commandline
+		- pipes [dict] : the named pipes created by create_step_pipes
+		- log_1 [string] : file where step 1 messages are written
+		- log_2 [string] : file where step 2 messages are written
+
+	Returns:
+		- 0 [integer] : if both steps have been done
+		or raise subprocess.CalledProcessError
+	"""
+
+	# compressed outputs of step 2 are compressed by several threads
+	cmd_2, compression = compression_pipes(cmd_2)
+
+	args_1 = shlex.split(cmd_1)
+	args_2 = shlex.split(cmd_2)
+
+	prog_1 = None
+	prog_2 = None
+
+	try:
+		with open(log_1, "w") as out_1, open(log_2, "w") as out_2:
+
+			# launch both steps
+			start = clock()
+			prog_1 = subprocess.Popen(args_1, stderr=out_1)
+			prog_2 = subprocess.Popen(args_2, stderr=out_2)
+
+			# logs of the steps without message yet
+			waiting = [log_1, log_2]
+
+			while True:
+				for log_file in list(waiting):
+					if(os.path.getsize(log_file) > 0):
+						record_phase('java start', 'java', start, clock(),
+									 {'log' : log_file})
+						waiting.remove(log_file)
+
+				code_1 = prog_1.poll()
+				code_2 = prog_2.poll()
+
+				# step 1 failed : step 2 must not end with partial data
+				if code_1 != None and code_1 != 0:
+					stop_process(prog_2)
+					raise subprocess.CalledProcessError(code_1, args_1)
+
+				# step 2 failed : step 1 would wait forever on a full pipe
+				if code_2 != None and code_2 != 0:
+					stop_process(prog_1)
+					raise subprocess.CalledProcessError(code_2, args_2)
+
+				if code_1 == 0 and code_2 == 0:
+					return 0
+
+				time.sleep(0.05)
+
+	finally:
+		stop_process(prog_1)
+		stop_process(prog_2)
+		remove_step_pipes(pipes)
+		remove_compression_pipes(compression)
+		restore_output_names(log_2, compression)
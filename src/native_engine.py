@@ -0,0 +1,1895 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains the native trimming engine : Trimmomatic commandlines
+	are done in python without launching java. Reads are read by batches and
+	their qualities are decoded into numpy matrices, so each trimming step is
+	done on a whole batch at once. Trimmed reads are the same as Trimmomatic
+	ones.
+
+	The numpy module is needed to use this engine."""
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+from checking_entries import *
+from commandline import *
+from argparse_commandline import *
+from compression import *
+
+import collections
+import itertools
+import math
+import multiprocessing
+import re
+import shlex
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# number of reads trimmed together
+BATCH_SIZE = 20000
+
+# trimming steps done by the native engine
+QUALITY_STEPS = ('CROP', 'HEADCROP', 'LEADING', 'TRAILING', 'SLIDINGWINDOW',
+				 'MAXINFO', 'MINLEN', 'AVGQUAL', 'TOPHRED33', 'TOPHRED64')
+
+# size of the MAXINFO tables (longest read and highest quality)
+MAXINFO_LENGTH = 1000
+MAXINFO_QUALITY = 60
+
+# score of a matching base for ILLUMINACLIP (log10(4) as a java float)
+LOG10_4 = 0.6020600199699402
+
+# characters removed by java String.trim()
+JAVA_SPACES = ''.join(chr(i) for i in range(33))
+
+# Trimmomatic codes of the bases for the seeds (one bit per base, 0 for the
+# other characters) : a mismatch between two bases costs 2 bits
+SEED_CODES = {'A' : 1, 'C' : 4, 'G' : 8, 'T' : 2}
+
+# complement of the bases for the palindrome mode (the other characters
+# become 'N', as for Trimmomatic)
+COMPLEMENT_CODES = {'A' : ord('T'), 'C' : ord('G'), 'G' : ord('C'),
+					'T' : ord('A')}
+
+# 2 bits codes of the bases for the k-mers
+KMER_CODES = {'A' : 0, 'C' : 1, 'G' : 2, 'T' : 3}
+
+# offset of a read without adapter
+NO_CLIP = 2**62
+
+# biggest number of k-mers of the table of the k-mer index
+KMER_TABLE_SIZE = 2**20
+
+
+
+def native_engine_available():
+	"""
+	Booleen that checks if the native engine can be used (numpy is installed)
+
+	Don't takes any argument
+
+	Returns:
+		- True [bool] : if numpy is installed
+		- False [bool] : else
+	"""
+
+	return np != None
+
+
+
+def code_table(codes, default):
+	"""
+	Function that creates a table giving a code to each character (byte).
+
+	Takes 2 arguments :
+		- codes [dict] : code of some characters
+		- default [integer] : code of the other characters
+
+	Returns:
+		- table [numpy.array] : code of each byte value (uint8)
+	"""
+
+	table = np.full(256, default, dtype=np.uint8)
+
+	for base, code in codes.items():
+		table[ord(base)] = code
+
+	return table
+
+
+
+def read_fasta(filename):
+	"""
+	Function that reads a fasta file as Trimmomatic does : the name of a
+	sequence is the first word of its header and lines starting with ';' are
+	comments.
+
+	Takes one argument :
+		- filename [string] : the fasta file
+
+	Returns:
+		- records [list] : tuples (name, sequence)
+	"""
+
+	with open(filename, 'rb') as fasta:
+		lines = re.split(r'\r\n|\r|\n', fasta.read().decode('latin-1'))
+
+	records = []
+	name = None
+
+	for line in lines:
+		if line.startswith('>'):
+			if name != None:
+				records.append((name, ''.join(seq).strip(JAVA_SPACES)))
+
+			name = re.split(r'[| ]', line[1:].strip(JAVA_SPACES))[0]
+			seq = []
+
+		elif name != None and not line.startswith(';'):
+			seq.append(line.strip(JAVA_SPACES))
+
+	if name != None:
+		records.append((name, ''.join(seq).strip(JAVA_SPACES)))
+
+	return records
+
+
+
+def java_hash_order(names):
+	"""
+	Function that sorts names in the order of a java HashMap (Trimmomatic
+	prints the adapters in this order).
+
+	Takes one argument :
+		- names [list] : names, in insertion order
+
+	Returns:
+		- names [list] : names, in the HashMap order
+	"""
+
+	# the table is doubled when it is filled at 75%
+	capacity = 16
+	while len(names) > 0.75 * capacity:
+		capacity *= 2
+
+	def bucket(name):
+		code = 0
+		for char in name:
+			code = (31 * code + ord(char)) & 0xFFFFFFFF
+		return (code ^ (code >> 16)) & (capacity - 1)
+
+	return sorted(names, key=bucket)
+
+
+
+def load_adapters(filename):
+	"""
+	Function that loads the adapter sequences of an ILLUMINACLIP fasta file as
+	Trimmomatic does : sequences whose name ends with '/1' are searched in
+	forward reads, the ones ending with '/2' in reverse reads and the others in
+	both. Sequences named 'Prefix.../1' and 'Prefix.../2' are prefix pairs
+	(palindrome mode).
+
+	Takes one argument :
+		- filename [string] : the fasta file
+
+	Returns:
+		- clip [dict] : sequences searched in forward reads ('forward'), in
+						reverse reads ('reverse'), in both ('common'), the
+						prefix pairs ('pairs') and Trimmomatic messages
+						('messages')
+	"""
+
+	maps = {'forward' : collections.OrderedDict(),
+			'reverse' : collections.OrderedDict(),
+			'common' : collections.OrderedDict()}
+	prefixes = {'forward' : [], 'reverse' : []}
+
+	for name, seq in read_fasta(filename):
+		if name.endswith('/1'):
+			key = 'forward'
+		elif name.endswith('/2'):
+			key = 'reverse'
+		else :
+			key = 'common'
+
+		maps[key][name] = seq
+
+		if key != 'common' and name.startswith('Prefix'):
+			prefixes[key].append(name[:-2])
+
+	clip = {'pairs' : [], 'messages' : []}
+
+	# prefixes found with /1 and /2 (the longest one is cut at its start)
+	for prefix in java_hash_order([prefix for prefix in prefixes['forward']
+								   if prefix in prefixes['reverse']]):
+		prefix_1 = maps['forward'].pop(prefix + '/1')
+		prefix_2 = maps['reverse'].pop(prefix + '/2')
+
+		clip['messages'].append("Using PrefixPair: '{0}' and '{1}'".format(
+														prefix_1, prefix_2))
+
+		length = min(len(prefix_1), len(prefix_2))
+		clip['pairs'].append((prefix_1[len(prefix_1) - length:],
+							  prefix_2[len(prefix_2) - length:]))
+
+	for key in ('forward', 'reverse', 'common'):
+		clip[key] = []
+
+		for name in java_hash_order(list(maps[key])):
+			seq = maps[key][name]
+
+			if seq in clip[key]:
+				clip['messages'].append("Skipping duplicate Clipping Sequence: \
+'{0}'".format(seq))
+				continue
+
+			if(len(seq) < 16):
+				kind = 'Short'
+			elif(len(seq) < 24):
+				kind = 'Medium'
+			else :
+				kind = 'Long'
+
+			clip['messages'].append("Using {0} Clipping Sequence: '{1}'".format(
+																	kind, seq))
+			clip[key].append(seq)
+
+	clip['messages'].append('ILLUMINACLIP: Using {0} prefix pairs, {1} \
+forward/reverse sequences, {2} forward only sequences, {3} reverse only \
+sequences'.format(len(clip['pairs']), len(clip['common']),
+				  len(clip['forward']), len(clip['reverse'])))
+
+	return clip
+
+
+
+def adapter_index(seqs, clip):
+	"""
+	Function that compiles the adapters searched in one mate : their bases
+	and a k-mer index (2 bits per base) giving the positions of each k-mer
+	in the adapters. A seed (16 bases) with at most 'seed mismatches' has at
+	least one k-mer without mismatch, so only the k-mers of the reads found in
+	the index are checked.
+
+	Takes 2 arguments :
+		- seqs [list] : adapter sequences
+		- clip [dict] : ILLUMINACLIP parameters
+
+	Returns:
+		- index [dict] : adapter bases ('bases', padded with 0), lengths
+						 ('lens'), kind ('short' and 'long' flags), adapters
+						 in the k-mer index ('seeded'), sorted k-mers
+						 ('kmers') with their adapter ('ids') and position
+						 ('pos')
+	"""
+
+	seqs = [seq.encode('latin-1') for seq in seqs]
+	lens = np.array([len(seq) for seq in seqs], dtype=np.int64)
+
+	width = int(lens.max()) + 16 if seqs else 16
+	bases = np.zeros((len(seqs), width), dtype=np.uint8)
+	for a, seq in enumerate(seqs):
+		bases[a, :len(seq)] = np.frombuffer(seq, dtype=np.uint8)
+
+	# adapters with other characters than ACGT are checked at each position
+	acgt = [len(seq.translate(None, b'ACGT')) == 0 for seq in seqs]
+	seeded = (lens >= 16) & np.array(acgt, dtype=bool) & (clip['seed'] > 0)
+
+	kmers, ids, pos = [], [], []
+	table = code_table(KMER_CODES, 0)
+	k = clip['seed']
+
+	for a in np.flatnonzero(seeded).tolist():
+		codes = table[bases[a, :lens[a]]].astype(np.int64)
+		kmer = np.zeros(lens[a] - k + 1, dtype=np.int64)
+		for t in range(k):
+			kmer = (kmer << 2) | codes[t:t + len(kmer)]
+
+		kmers.append(kmer)
+		ids.append(np.full(len(kmer), a, dtype=np.int64))
+		pos.append(np.arange(len(kmer), dtype=np.int64))
+
+	if kmers:
+		kmers, ids, pos = (np.concatenate(kmers), np.concatenate(ids),
+						   np.concatenate(pos))
+	else :
+		kmers, ids, pos = (np.zeros(0, dtype=np.int64),) * 3
+
+	order = np.argsort(kmers, kind='mergesort')
+
+	index = {'bases' : bases, 'lens' : lens, 'seeded' : seeded,
+			 'short' : lens < 16, 'long' : lens >= 24,
+			 'kmers' : kmers[order], 'ids' : ids[order], 'pos' : pos[order]}
+
+	# for short k-mers, tables give the first position of each k-mer in the
+	# sorted k-mers and its number of positions (no search is needed)
+	if(k > 0 and 4**k <= KMER_TABLE_SIZE):
+		first = np.searchsorted(index['kmers'], np.arange(4**k + 1))
+		index['first'] = first[:-1]
+		index['count'] = np.diff(first).astype(np.int32)
+
+	return index
+
+
+
+def compile_adapters(fields):
+	"""
+	Function that compiles the arguments of an ILLUMINACLIP step (fasta file,
+	seed mismatches, palindrome clip threshold, simple clip threshold and the
+	optional minimum adapter length and keep both reads).
+
+	Takes one argument :
+		- fields [list] : the arguments of the step
+
+	Returns:
+		- clip [dict] : the adapters (see load_adapters), the thresholds and
+						the adapter index of each mate ('mates')
+		or
+		- None : if the step isn't done by the native engine
+	"""
+
+	try:
+		clip = load_adapters(fields[0])
+	except (IOError, OSError):
+		return None
+
+	clip['seed_miss'] = int(fields[1])
+	clip['palindrome'] = int(fields[2])
+	clip['simple'] = int(fields[3])
+	clip['min_prefix'] = int(fields[4]) if len(fields) > 4 else 8
+	clip['keep_both'] = len(fields) > 5 and fields[5].lower() == 'true'
+
+	# minimum overlap between a read and an adapter (as Trimmomatic)
+	overlap = int(np.float32(clip['simple']) / np.float32(LOG10_4))
+	clip['min_overlap'] = min(overlap, 15)
+
+	if(clip['min_overlap'] < 0):
+		return None
+
+	# k-mer length : the seeds have at least min(16, min_overlap + 1) bases
+	if(clip['seed_miss'] >= 0):
+		clip['seed'] = min(16, clip['min_overlap'] + 1) // (clip['seed_miss'] + 1)
+	else :
+		clip['seed'] = 0
+
+	clip['mates'] = [adapter_index(clip['forward'] + clip['common'], clip),
+					 adapter_index(clip['reverse'] + clip['common'], clip)]
+
+	return clip
+
+
+
+def java_long(values):
+	"""
+	Function that converts floats into integers as java does (rounded toward
+	0, NaN gives 0 and too big values give the biggest long).
+
+	Takes one argument :
+		- values [numpy.array] : floats
+
+	Returns:
+		- longs [numpy.array] : integers (int64)
+	"""
+
+	values = np.nan_to_num(np.trunc(values), nan=0.0, posinf=2.0**63,
+						   neginf=-2.0**63)
+
+	longs = np.clip(values, -2.0**63, 2.0**63 - 1024).astype(np.int64)
+	longs[values >= 2.0**63] = 2**63 - 1
+
+	return longs
+
+
+
+def compile_maxinfo(target, strictness):
+	"""
+	Function that computes the MAXINFO scores once, as Trimmomatic does : the
+	score of a length (the read must reach the target length) and the score of
+	a quality (the probability that the base is right), both in log and
+	scaled into integers so the score of a read is an integer sum.
+
+	Takes 2 arguments :
+		- target [integer] : target length
+		- strictness [float] : between 0 (long reads) and 1 (right reads)
+
+	Returns:
+		- scores [dict] : score of each length ('length', from 1 base) and of
+						  each quality ('quality')
+	"""
+
+	strictness = np.float32(strictness)
+
+	length = []
+	for i in range(MAXINFO_LENGTH):
+		try:
+			logistic = math.log(1.0 / (1.0 + math.exp(target - i - 1)))
+		except (OverflowError, ValueError):
+			logistic = float('-inf')
+
+		length.append(logistic + math.log(i + 1) * float(1 - strictness))
+
+	quality = [math.log(1.0 - math.pow(0.1, (0.5 + q) / 10.0)) *
+			   float(strictness) for q in range(MAXINFO_QUALITY + 1)]
+
+	# both scores share the same scale : 2000 of the biggest ones fit a long
+	# (Trimmomatic starts the search with the first score, not its absolute)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		biggest = []
+		for values in (length, quality):
+			big = values[0]
+			for value in values[1:]:
+				if(abs(value) > big):
+					big = abs(value)
+			biggest.append(np.float64(2.0**63) / np.float64(big * 2000))
+
+		scale = max(biggest)
+
+		scores = {'length' : java_long(np.array(length) * scale),
+				  'quality' : java_long(np.array(quality) * scale)}
+
+	return scores
+
+
+
+def parse_steps(texts):
+	"""
+	Function that parses Trimmomatic trimming steps (like 'SLIDINGWINDOW:4:30')
+
+	Takes one argument :
+		- texts [list] : Trimmomatic trimming steps
+
+	Returns:
+		- steps [list] : tuples (step name, list of step arguments)
+		or
+		- None : if a step isn't done by the native engine
+	"""
+
+	steps = []
+
+	for text in texts:
+		fields = text.split(':')
+		name = fields[0]
+
+		# adapters are loaded and compiled once
+		if(name == 'ILLUMINACLIP'):
+			clip = compile_adapters(fields[1:])
+			if(clip == None):
+				return None
+			values = [clip]
+
+		elif name not in QUALITY_STEPS:
+			return None
+
+		# MAXINFO scores are computed once
+		elif(name == 'MAXINFO'):
+			values = [compile_maxinfo(int(fields[1]), float(fields[2]))]
+
+		# SLIDINGWINDOW required quality is a float for Trimmomatic
+		elif(name == 'SLIDINGWINDOW'):
+			values = [int(fields[1]), float(fields[2])]
+		else :
+			values = [int(value) for value in fields[1:]]
+
+		steps.append((name, values))
+
+	return steps
+
+
+
+def parse_commandline(cmd):
+	"""
+	Function that parses a Trimmomatic commandline generated by the modules
+	commandline and argparse_commandline.
+
+	Takes one argument :
+		- cmd [string] : the Trimmomatic commandline
+
+	Returns:
+		- run [dict] : layout ('layout'), Trimmomatic arguments ('arguments'),
+					   threads ('threads'), quality encoding ('phred', None if
+					   not given), input files ('input'), output files
+					   ('output') and the trimming steps ('steps', None if a
+					   step isn't done by the native engine)
+	"""
+
+	args = shlex.split(cmd)
+
+	# arguments given to Trimmomatic start after the layout
+	for i, arg in enumerate(args):
+		if(arg == 'SE' or arg == 'PE'):
+			break
+
+	run = {'layout' : arg, 'arguments' : args[i+1:], 'threads' : 1,
+		   'phred' : None}
+
+	args = args[i+1:]
+
+	# options
+	while args and args[0].startswith('-'):
+		if(args[0] == '-threads'):
+			run['threads'] = int(args[1])
+			args = args[2:]
+
+		else :
+			run['phred'] = int(args[0][-2:])
+			args = args[1:]
+
+	# 1 input and 1 output for SE, 2 inputs and 4 outputs for PE
+	if(run['layout'] == 'SE'):
+		run['input'] = args[:1]
+		run['output'] = args[1:2]
+		args = args[2:]
+
+	else :
+		run['input'] = args[:2]
+		run['output'] = args[2:6]
+		args = args[6:]
+
+	run['steps'] = parse_steps(args)
+
+	return run
+
+
+
+def native_supported(cmd):
+	"""
+	Booleen that checks if all the steps of a Trimmomatic commandline can be
+	done by the native engine.
+
+	Takes one argument :
+		- cmd [string] : the Trimmomatic commandline
+
+	Returns:
+		- True [bool] : if the native engine can do the commandline
+		- False [bool] : else
+	"""
+
+	return native_engine_available() and parse_commandline(cmd)['steps'] != None
+
+
+
+def open_fastq(filename, mode):
+	"""
+	Function that opens a fastq file, compressed or not depending on its
+	extension (as Trimmomatic does). Compressed outputs are compressed by
+	blocks, by several threads (see set_compression), and compressed inputs
+	are decompressed the same way.
+
+	Takes 2 arguments :
+		- filename [string] : the fastq file
+		- mode [string] : 'rb' or 'wb'
+
+	Returns:
+		- the opened file
+	"""
+
+	ext = os.path.splitext(filename)[1]
+
+	if(mode == 'wb' and ext in ('.gz', '.bz2')):
+		return BlockCompressedFile(filename)
+
+	elif(ext in ('.gz', '.bz2')):
+		return open_decompressed(filename, COMPRESSION['threads'])
+
+	return open(filename, mode, 1048576)
+
+
+
+def read_batches(inputs, size):
+	"""
+	Function (generator) that reads input files by batches of reads. Paired
+	ends files are read together.
+
+	Takes 2 arguments :
+		- inputs [list] : opened input files (1 for SE, 2 for PE)
+		- size [integer] : number of reads in a batch
+
+	Returns (yield):
+		- blobs [tuple] : the reads of each input file, as bytes
+	"""
+
+	while True:
+		blobs = tuple(b''.join(itertools.islice(fastq, 4*size))
+					  for fastq in inputs)
+
+		if not any(blobs):
+			break
+
+		yield blobs
+
+
+
+def split_reads(blob):
+	"""
+	Function that splits a batch of fastq reads into its 4 lines.
+
+	Takes one argument :
+		- blob [bytes] : the reads
+
+	Returns:
+		- lines [tuple] : headers, sequences, comments and qualities lists
+	"""
+
+	lines = blob.split(b'\n')
+
+	if lines and lines[-1] == b'':
+		lines.pop()
+
+	if(len(lines) % 4 != 0):
+		raise ValueError("Error : Truncated fastq record.")
+
+	return lines[0::4], lines[1::4], lines[2::4], lines[3::4]
+
+
+
+def fill_matrix(values, lens, width):
+	"""
+	Function that puts the values of the bases of a batch of reads (given one
+	read after the other) into a matrix (one read per row, padded with 0).
+
+	Takes 3 arguments :
+		- values [numpy.array] : values of the bases
+		- lens [numpy.array] : lengths of the reads
+		- width [integer] : number of columns of the matrix
+
+	Returns:
+		- matrix [numpy.array] : the values
+	"""
+
+	nb = len(lens)
+
+	# reads of the same length (the usual case) : nothing to move
+	if(nb and lens.min() == width):
+		return values.reshape(nb, width)
+
+	# position of each base in the flattened matrix
+	shift = np.arange(nb) * width - (np.cumsum(lens) - lens)
+	positions = np.arange(int(lens.sum())) + np.repeat(shift, lens)
+
+	matrix = np.zeros((nb, width), dtype=values.dtype)
+	matrix.flat[positions] = values
+
+	return matrix
+
+
+
+def quality_matrix(seqs, quals, phred):
+	"""
+	Function that decodes the qualities of a batch into a matrix (one read
+	per row). As for Trimmomatic, the quality of a 'N' base is 0.
+
+	Takes 3 arguments :
+		- seqs [list] : sequences of the reads
+		- quals [list] : qualities of the reads
+		- phred [integer] : quality encoding (33 or 64)
+
+	Returns:
+		- matrix [numpy.array] : qualities (int16), padded with 0
+		- lens [numpy.array] : lengths of the reads
+	"""
+
+	nb = len(quals)
+	lens = np.fromiter((len(qual) for qual in quals), dtype=np.int64, count=nb)
+
+	width = int(lens.max()) if nb else 0
+
+	qual_buf = np.frombuffer(b''.join(quals), dtype=np.uint8)
+	seq_buf = np.frombuffer(b''.join(seqs), dtype=np.uint8)
+
+	if(qual_buf.size != seq_buf.size):
+		raise ValueError("Error : Sequence and quality lengths differ.")
+
+	values = qual_buf.astype(np.int16) - phred
+	values[seq_buf == ord('N')] = 0
+
+	return fill_matrix(values, lens, width), lens
+
+
+
+def sequence_matrix(mate):
+	"""
+	Function that gets the bases of the reads of a batch as a matrix (one
+	read per row, padded with 0). The matrix is kept in the mate ('seq').
+
+	Takes one argument :
+		- mate [dict] : the reads
+
+	Returns:
+		- matrix [numpy.array] : bases (uint8)
+	"""
+
+	if 'seq' not in mate:
+		seqs = mate['lines'][1]
+		lens = np.fromiter((len(seq) for seq in seqs), dtype=np.int64,
+						   count=len(seqs))
+
+		mate['seq'] = fill_matrix(np.frombuffer(b''.join(seqs), dtype=np.uint8),
+								  lens, mate['qual'].shape[1])
+
+	return mate['seq']
+
+
+
+def new_mate(lines, phred):
+	"""
+	Function that creates the reads of a batch for one mate : its lines, the
+	decoded qualities and the part of each read that is kept (from 'start' to
+	'end'). Dropped reads are marked in 'alive'.
+
+	Takes 2 arguments :
+		- lines [tuple] : headers, sequences, comments and qualities lists
+		- phred [integer] : quality encoding (33 or 64)
+
+	Returns:
+		- mate [dict] : the reads
+	"""
+
+	matrix, lens = quality_matrix(lines[1], lines[3], phred)
+
+	mate = {'lines' : lines, 'qual' : matrix,
+			'start' : np.zeros(len(lens), dtype=np.int64), 'end' : lens,
+			'alive' : np.ones(len(lens), dtype=bool),
+			'col' : np.arange(matrix.shape[1])[None, :]}
+
+	return mate
+
+
+
+def last_true(mask):
+	"""
+	Function that gets the last True column of each row of a mask.
+
+	Takes one argument :
+		- mask [numpy.array] : boolean matrix
+
+	Returns:
+		- found [numpy.array] : True if the row contains a True
+		- last [numpy.array] : column of the last True of each row
+	"""
+
+	found = mask.any(axis=1)
+	last = mask.shape[1] - 1 - mask[:, ::-1].argmax(axis=1)
+
+	return found, last
+
+
+
+def cumulative_qualities(mate):
+	"""
+	Function that computes the cumulative sums of the qualities of each read
+	(the sum of qualities from i to j is cumul[j] - cumul[i]).
+
+	Takes one argument :
+		- mate [dict] : the reads
+
+	Returns:
+		- cumul [numpy.array] : cumulative sums, starting with a 0 column
+	"""
+
+	nb, width = mate['qual'].shape
+	cumul = np.zeros((nb, width + 1), dtype=np.int32)
+	np.cumsum(mate['qual'], axis=1, out=cumul[:, 1:])
+
+	return cumul
+
+
+
+def trim_crop(mate, values):
+	"""
+	CROP:<length> : keeps the first bases of the reads.
+	"""
+
+	mate['end'] = mate['start'] + np.minimum(mate['end'] - mate['start'],
+											 values[0])
+
+
+
+def trim_headcrop(mate, values):
+	"""
+	HEADCROP:<length> : removes the first bases of the reads (reads that are
+	not longer than length are dropped).
+	"""
+
+	keep = (mate['end'] - mate['start']) > values[0]
+
+	mate['alive'] &= keep
+	mate['start'] = np.where(keep, mate['start'] + values[0], mate['start'])
+
+
+
+def trim_leading(mate, values):
+	"""
+	LEADING:<quality> : removes the bases of the start of the reads under the
+	required quality.
+	"""
+
+	col = mate['col']
+	mask = ((col >= mate['start'][:, None]) & (col < mate['end'][:, None]) &
+			(mate['qual'] >= values[0]))
+
+	found = mask.any(axis=1)
+
+	mate['alive'] &= found
+	mate['start'] = np.where(found, mask.argmax(axis=1), mate['start'])
+
+
+
+def trim_trailing(mate, values):
+	"""
+	TRAILING:<quality> : removes the bases of the end of the reads under the
+	required quality. As for Trimmomatic, the first base is never checked.
+	"""
+
+	col = mate['col']
+	mask = ((col > mate['start'][:, None]) & (col < mate['end'][:, None]) &
+			(mate['qual'] >= values[0]))
+
+	found, last = last_true(mask)
+
+	mate['alive'] &= found
+	mate['end'] = np.where(found, last + 1, mate['end'])
+
+
+
+def trim_slidingwindow(mate, values):
+	"""
+	SLIDINGWINDOW:<window size>:<required quality> : cuts the reads when the
+	mean quality of a window is under the required quality, then removes the
+	last bases under the required quality.
+	"""
+
+	window = values[0]
+	required = np.float32(values[1])
+	total_required = required * np.float32(window)
+
+	start = mate['start']
+	end = mate['end']
+	width = mate['qual'].shape[1]
+
+	# reads shorter than the window are dropped
+	keep = (end - start) >= window
+
+	if(width < window):
+		mate['alive'] &= keep
+		return
+
+	# sum of the qualities of each window (window starting at each base)
+	cumul = cumulative_qualities(mate)
+	sums = (cumul[:, window:] - cumul[:, :-window]).astype(np.float32)
+
+	# the first window must have the required quality
+	rows = np.arange(len(start))
+	first = sums[rows, np.minimum(start, width - window)]
+	keep &= first >= total_required
+
+	# cut at the end of the window before the first bad window
+	col = np.arange(sums.shape[1])[None, :]
+	mask = ((col > start[:, None]) & (col <= (end - window)[:, None]) &
+			(sums < total_required))
+
+	found = mask.any(axis=1)
+	cut = np.where(found, mask.argmax(axis=1) - 1 + window, end)
+
+	# then remove the last bases under the required quality
+	col = mate['col']
+	mask = ((col > start[:, None]) & (col < cut[:, None]) &
+			(mate['qual'] >= required))
+
+	found, last = last_true(mask)
+
+	mate['alive'] &= keep
+	mate['end'] = np.where(found, last + 1, start + 1)
+
+
+
+def trim_maxinfo(mate, values):
+	"""
+	MAXINFO:<target length>:<strictness> : cuts the reads at the length that
+	gives the best score, the score of the length plus the scores of the
+	qualities of the kept bases (cumulative sums). The last best length is
+	kept, as for Trimmomatic.
+	"""
+
+	scores = values[0]
+	start, end = mate['start'], mate['end']
+
+	# Trimmomatic stops with an exception on longer reads
+	if(mate['alive'].any() and
+	   (end - start)[mate['alive']].max() > MAXINFO_LENGTH):
+		raise ValueError("Error : MAXINFO can't trim reads longer than {0} \
+bases (Trimmomatic fails on them).".format(MAXINFO_LENGTH))
+
+	nb, width = mate['qual'].shape
+	col = mate['col']
+
+	# empty reads are dropped
+	if(width == 0):
+		mate['alive'][:] = False
+		return
+
+	# qualities out of the table are clamped (mode 'clip'), as Trimmomatic
+	total = np.cumsum(np.take(scores['quality'], mate['qual'], mode='clip'),
+					  axis=1)
+
+	# score of each length (up to each column) of the kept part of the reads
+	if not start.any():
+		inside = col < end[:, None]
+		total += np.take(scores['length'], col, mode='clip')
+
+	else :
+		length = col - start[:, None]
+		inside = (length >= 0) & (col < end[:, None])
+
+		before = np.where(start > 0, total[np.arange(nb), start - 1], 0)
+		total -= before[:, None]
+		total += np.take(scores['length'], length, mode='clip')
+
+	# scores are compared as java doubles
+	total = total.astype(np.float64)
+	total[~inside] = -np.inf
+
+	best = total.max(axis=1)
+	found, last = last_true(inside & (total == best[:, None]))
+
+	keep = found & (best != 0)
+
+	mate['alive'] &= keep
+	mate['end'] = np.where(keep, last + 1, end)
+
+
+
+def trim_minlen(mate, values):
+	"""
+	MINLEN:<length> : drops the reads shorter than length.
+	"""
+
+	mate['alive'] &= (mate['end'] - mate['start']) >= values[0]
+
+
+
+def trim_avgqual(mate, values):
+	"""
+	AVGQUAL:<quality> : drops the reads whose mean quality is under the
+	required quality.
+	"""
+
+	cumul = cumulative_qualities(mate)
+	rows = np.arange(len(mate['start']))
+	total = cumul[rows, mate['end']] - cumul[rows, mate['start']]
+
+	mate['alive'] &= total >= values[0] * (mate['end'] - mate['start'])
+
+
+
+def read_window(mate, rows):
+	"""
+	Function that gets the kept part of some reads (bases and qualities),
+	starting at column 0 and padded with 16 columns of 0, so a seed (16 bases)
+	can be read at any position of the reads.
+
+	Takes 2 arguments :
+		- mate [dict] : the reads
+		- rows [numpy.array] : the reads to get
+
+	Returns:
+		- bases [numpy.array] : bases (uint8)
+		- quals [numpy.array] : qualities (int16)
+		- lens [numpy.array] : lengths of the reads
+	"""
+
+	start = mate['start'][rows]
+	lens = mate['end'][rows] - start
+	width = int(lens.max())
+
+	col = np.arange(width + 16)[None, :]
+	inside = col < lens[:, None]
+
+	# reads not cut at their start (ILLUMINACLIP is usually the first step)
+	if not start.any():
+		bases = np.zeros((len(rows), width + 16), dtype=np.uint8)
+		quals = np.zeros((len(rows), width + 16), dtype=np.int16)
+		bases[:, :width] = sequence_matrix(mate)[rows, :width]
+		quals[:, :width] = mate['qual'][rows, :width]
+
+	else :
+		col = np.minimum(start[:, None] + col, mate['qual'].shape[1] - 1)
+		bases = sequence_matrix(mate)[rows[:, None], col]
+		quals = mate['qual'][rows[:, None], col]
+
+	bases[~inside] = 0
+	quals[~inside] = 0
+
+	return bases, quals, lens
+
+
+
+def seed_candidates(bases, lens, other, index, clip):
+	"""
+	Function that finds the offsets of the adapters of the k-mer index in the
+	reads : each k-mer of the reads found in the index gives the seeds (16
+	bases) that can contain it, and these seeds are compared with the adapter.
+	Offsets of the seeds with at most 'seed mismatches' are kept.
+
+	Takes 5 arguments :
+		- bases [numpy.array] : bases of the reads (see read_window)
+		- lens [numpy.array] : lengths of the reads
+		- other [numpy.array] : cumulative number of bases other than ACGT
+								in the reads, starting with a 0 column
+		- index [dict] : the adapters (see adapter_index)
+		- clip [dict] : ILLUMINACLIP parameters
+
+	Returns:
+		- reads [numpy.array] : read of each offset
+		- ids [numpy.array] : adapter of each offset
+		- offsets [numpy.array] : position of the adapter in the read
+	"""
+
+	k = clip['seed']
+	nb, width = bases.shape
+
+	# k-mer starting at each position of the reads (2 bits per base)
+	codes = code_table(KMER_CODES, 0)[bases]
+	npos = width - k + 1
+
+	kmer = codes[:, :npos].astype(np.int32 if k < 16 else np.int64)
+	for t in range(1, k):
+		kmer <<= 2
+		kmer |= codes[:, t:t + npos]
+
+	# k-mers with other bases than ACGT
+	bad = other[:, k:] != other[:, :npos]
+
+	# positions of these k-mers in the adapters
+	if 'first' in index:
+		count = index['count'][kmer]
+		count[bad] = 0
+
+		reads, pos = np.nonzero(count)
+		count = count[reads, pos]
+		first = index['first'][kmer[reads, pos]]
+
+	else :
+		reads, pos = np.nonzero(~bad)
+		kmer = kmer[reads, pos]
+
+		first = np.searchsorted(index['kmers'], kmer, 'left')
+		count = np.searchsorted(index['kmers'], kmer, 'right') - first
+
+	reads = np.repeat(reads, count)
+	pos = np.repeat(pos, count)
+	hits = (np.repeat(first - np.cumsum(count) + count, count) +
+			np.arange(int(count.sum())))
+	ids = index['ids'][hits]
+	adapter_pos = index['pos'][hits]
+
+	# the k-mer can be the part number b of a seed
+	seeds = []
+	for b in range(clip['seed_miss'] + 1):
+		i = pos - b * k
+		j = adapter_pos - b * k
+
+		# seeds compared by Trimmomatic (every 4 bases for long adapters)
+		valid = ((i >= 0) & (i < lens[reads] - clip['min_overlap']) &
+				 (j >= 0) & (j < index['lens'][ids] - 15) &
+				 ((j % 4 == 0) | ~index['long'][ids]))
+
+		seeds.append((reads[valid], ids[valid], i[valid], j[valid]))
+
+	reads, ids, i, j = [np.concatenate(values) for values in zip(*seeds)]
+
+	# mismatches of the seeds (a 'N' costs a mismatch here and half of it for
+	# Trimmomatic : seeds with 'N' are also checked by brute_candidates)
+	size = np.minimum(16, lens[reads] - i)
+	mismatches = np.zeros(len(reads), dtype=np.int64)
+
+	for t in range(16):
+		mismatches += ((t < size) &
+					   (bases[reads, i + t] != index['bases'][ids, j + t]))
+
+	keep = mismatches <= clip['seed_miss']
+
+	return reads[keep], ids[keep], (i - j)[keep]
+
+
+
+def brute_candidates(bases, lens, reads, starts, a, index, clip):
+	"""
+	Function that finds the offsets of an adapter in some seeds of the reads
+	by comparing them with all the seeds of the adapter, as Trimmomatic does
+	(for the seeds with other bases than ACGT and the adapters that are not in
+	the k-mer index).
+
+	Takes 7 arguments :
+		- bases [numpy.array] : bases of the reads (see read_window)
+		- lens [numpy.array] : lengths of the reads
+		- reads [numpy.array] : read of each seed
+		- starts [numpy.array] : position of each seed in its read
+		- a [integer] : the adapter
+		- index [dict] : the adapters (see adapter_index)
+		- clip [dict] : ILLUMINACLIP parameters
+
+	Returns:
+		- reads [numpy.array] : read of each offset
+		- offsets [numpy.array] : position of the adapter in the read
+	"""
+
+	length = int(index['lens'][a])
+
+	# seeds of the adapter compared by Trimmomatic
+	if index['short'][a]:
+		adapter_starts = np.arange(length - clip['min_overlap'])
+	elif index['long'][a]:
+		adapter_starts = np.arange(0, length - 15, 4)
+	else :
+		adapter_starts = np.arange(length - 15)
+
+	found = [(np.zeros(0, dtype=np.int64),) * 2]
+
+	if(len(adapter_starts) == 0):
+		return found[0]
+
+	codes = code_table(SEED_CODES, 0)
+	read_codes = codes[bases]
+	adapter_codes = codes[index['bases'][a]]
+
+	# number of bits of the xor of 2 codes (2 for a mismatch, 1 for a 'N')
+	bits = np.array([bin(x).count('1') for x in range(16)], dtype=np.int16)
+	size = np.minimum(np.minimum(16, lens[reads] - starts), length)
+
+	# seeds are compared by chunks to keep a low memory usage
+	step = max(1, 1048576 // len(adapter_starts))
+
+	for first in range(0, len(reads), step):
+		r = reads[first:first + step]
+		i = starts[first:first + step]
+		n = size[first:first + step]
+
+		miss = np.zeros((len(r), len(adapter_starts)), dtype=np.int16)
+		for t in range(16):
+			xor = read_codes[r, i + t][:, None] ^ adapter_codes[adapter_starts + t]
+			miss += bits[xor] * (t < n)[:, None]
+
+		rows, cols = np.nonzero(miss <= 2 * clip['seed_miss'])
+		found.append((r[rows], i[rows] - adapter_starts[cols]))
+
+	return [np.concatenate(values) for values in zip(*found)]
+
+
+
+def clip_offsets(bases, quals, lens, reads, ids, offsets, index, clip):
+	"""
+	Function that scores the alignments of the reads with the adapters at the
+	offsets given by the seeds, as Trimmomatic does : a matching base scores
+	log10(4), a mismatch -quality/10 and a 'N' 0. The score of an alignment is
+	its best part without mismatch, and must reach the simple clip threshold.
+
+	Takes 8 arguments :
+		- bases [numpy.array] : bases of the reads (see read_window)
+		- quals [numpy.array] : qualities of the reads
+		- lens [numpy.array] : lengths of the reads
+		- reads [numpy.array] : read of each offset
+		- ids [numpy.array] : adapter of each offset
+		- offsets [numpy.array] : position of the adapter in the read
+		- index [dict] : the adapters (see adapter_index)
+		- clip [dict] : ILLUMINACLIP parameters
+
+	Returns:
+		- clipped [numpy.array] : smallest offset of an adapter in each read,
+								  or NO_CLIP
+	"""
+
+	clipped = np.full(len(lens), NO_CLIP, dtype=np.int64)
+
+	# each offset is scored once
+	nb_ids = len(index['lens'])
+	shift = index['bases'].shape[1]
+	span = bases.shape[1] + shift
+
+	key = np.unique((reads * nb_ids + ids) * span + offsets + shift)
+	offsets = key % span - shift
+	ids = (key // span) % nb_ids
+	reads = key // span // nb_ids
+
+	# length of the alignment
+	adapter_lens = index['lens'][ids]
+	size = np.minimum(np.where(offsets > 0, lens[reads] - offsets, lens[reads]),
+					  np.where(offsets < 0, adapter_lens + offsets,
+							   adapter_lens))
+
+	keep = size > clip['min_overlap']
+	reads, ids, offsets, size = reads[keep], ids[keep], offsets[keep], size[keep]
+
+	if(len(reads) == 0):
+		return clipped
+
+	read_pos = np.maximum(offsets, 0)
+	adapter_pos = np.maximum(-offsets, 0)
+
+	# java float scores
+	match = np.float32(LOG10_4)
+	mismatch = (-quals).astype(np.float32) / np.float32(10)
+
+	# sum of the current part (parts end when the score sign changes)
+	current = np.zeros(len(reads), dtype=np.float32)
+	best = np.zeros(len(reads), dtype=np.float32)
+
+	for t in range(int(size.max())):
+		r = np.minimum(read_pos + t, bases.shape[1] - 1)
+		base = bases[reads, r]
+		adapter = index['bases'][ids, np.minimum(adapter_pos + t,
+												 index['bases'].shape[1] - 1)]
+
+		score = np.where(base == adapter, match, mismatch[reads, r])
+		score[(base == ord('N')) | (adapter == ord('N')) | (t >= size)] = 0
+
+		restart = ((current > 0) & (score < 0)) | ((current < 0) & (score > 0))
+		current = np.where(restart, score, current + score)
+		np.maximum(best, current, out=best)
+
+	good = best >= np.float32(clip['simple'])
+	np.minimum.at(clipped, reads[good], offsets[good])
+
+	return clipped
+
+
+
+def adapter_offsets(mate, index, clip):
+	"""
+	Function that finds the adapters in the reads of one mate (simple clip
+	mode of ILLUMINACLIP).
+
+	Takes 3 arguments :
+		- mate [dict] : the reads
+		- index [dict] : the adapters searched in this mate (see adapter_index)
+		- clip [dict] : ILLUMINACLIP parameters
+
+	Returns:
+		- clipped [numpy.array] : smallest offset of an adapter in each read,
+								  or NO_CLIP
+	"""
+
+	clipped = np.full(len(mate['start']), NO_CLIP, dtype=np.int64)
+
+	# reads must be longer than the minimum overlap
+	rows = np.flatnonzero(mate['alive'] &
+						  (mate['end'] - mate['start'] > clip['min_overlap']))
+
+	if(len(rows) == 0 or len(index['lens']) == 0):
+		return clipped
+
+	bases, quals, lens = read_window(mate, rows)
+	width = bases.shape[1]
+
+	# cumulative number of bases other than ACGT
+	cumul = np.zeros((len(lens), width + 1), dtype=np.int32)
+	np.cumsum(code_table(KMER_CODES, 4)[bases] > 3, axis=1, out=cumul[:, 1:])
+
+	# offsets given by the k-mer index
+	if len(index['kmers']):
+		candidates = [seed_candidates(bases, lens, cumul, index, clip)]
+	else :
+		candidates = []
+
+	# seeds of the reads : one at each position before the minimum overlap
+	col = np.arange(width)[None, :]
+	seeds = col < (lens - clip['min_overlap'])[:, None]
+
+	# number of bases other than ACGT in the seeds of the reads with such
+	# bases (each of them costs at least 1 bit with an adapter made of ACGT)
+	some = np.flatnonzero(cumul[:, -1] > 0)
+	end = np.minimum(col + 16, lens[some, None])
+	other = np.take_along_axis(cumul[some], end, axis=1) - cumul[some, :width]
+	other = seeds[some] & (other > 0) & (other <= 2 * clip['seed_miss'])
+
+	other = np.nonzero(other)
+	other = (some[other[0]], other[1])
+
+	if not index['seeded'].all():
+		seeds = np.nonzero(seeds)
+
+	for a in range(len(index['lens'])):
+		if index['seeded'][a]:
+			found = brute_candidates(bases, lens, other[0], other[1], a, index,
+									 clip)
+		else :
+			found = brute_candidates(bases, lens, seeds[0], seeds[1], a, index,
+									 clip)
+
+		candidates.append((found[0], np.full(len(found[0]), a, dtype=np.int64),
+						   found[1]))
+
+	reads, ids, offsets = [np.concatenate(values) for values in zip(*candidates)]
+
+	clipped[rows] = clip_offsets(bases, quals, lens, reads, ids, offsets, index,
+								 clip)
+
+	return clipped
+
+
+
+def popcount(values):
+	"""
+	Function that counts the bits set in each value of an array.
+
+	Takes one argument :
+		- values [numpy.array] : unsigned integers (uint64)
+
+	Returns:
+		- counts [numpy.array] : number of bits of each value
+	"""
+
+	if hasattr(np, 'bitwise_count'):
+		return np.bitwise_count(values)
+
+	# older numpy : bits counted byte by byte
+	bits = np.array([bin(x).count('1') for x in range(256)], dtype=np.uint8)
+	values = np.ascontiguousarray(values)
+
+	return bits[values.view(np.uint8)].reshape(values.shape + (-1,)).sum(axis=-1)
+
+
+
+def pack_seeds(codes, reverse):
+	"""
+	Function that packs the seeds (16 bases, 4 bits per base) starting at
+	each position of the sequences, as Trimmomatic does : the first base is
+	in the highest bits, or in the lowest ones for reverse seeds.
+
+	Takes 2 arguments :
+		- codes [numpy.array] : codes of the bases (see SEED_CODES), one
+								sequence per row
+		- reverse [bool] : True to pack the seeds backward
+
+	Returns:
+		- packed [numpy.array] : seed at each position (uint64)
+	"""
+
+	npos = codes.shape[1] - 15
+	packed = np.zeros((codes.shape[0], npos), dtype=np.uint64)
+
+	for t in range(16):
+		shift = np.uint64(4 * t if reverse else 4 * (15 - t))
+		packed |= codes[:, t:t + npos].astype(np.uint64) << shift
+
+	return packed
+
+
+
+def palindrome_seeds(seqs, lens, prefix, clip):
+	"""
+	Function that finds the overlaps between the forward reads and the reverse
+	complement of the reverse reads (both starting with their prefix) whose
+	seeds match, as Trimmomatic does : for each overlap, from the shortest to
+	the longest, 2 seeds are compared by counting the bits of their xor (a
+	mismatch costs 2 bits, a 'N' 1 bit).
+
+	Takes 4 arguments :
+		- seqs [list] : forward sequences and complement of the reverse
+						sequences, with their prefix (see palindrome_offsets)
+		- lens [list] : lengths of the forward and reverse sequences
+		- prefix [integer] : length of the prefixes
+		- clip [dict] : ILLUMINACLIP parameters
+
+	Returns:
+		- reads [numpy.array] : read of each overlap
+		- overlaps [numpy.array] : number of overlapping bases (with the
+								   prefixes), increasing for each read
+	"""
+
+	codes = code_table(SEED_CODES, 0)
+	packs = [pack_seeds(codes[seqs[0]], False), pack_seeds(codes[seqs[1]], True)]
+
+	# number of seeds of each sequence
+	nb_seeds = [lens[0] - 15, lens[1] - 15]
+	last = np.minimum(nb_seeds[0], nb_seeds[1]) - 1
+
+	# overlaps tested by Trimmomatic (the count starts at prefix - 16)
+	first = max(0, prefix - 16)
+	end = np.maximum(lens[0], lens[1]) - 15 - clip['min_prefix']
+
+	found = [(np.zeros(0, dtype=np.int64),) * 2]
+
+	nb = int(end.max()) - first if len(end) else 0
+	if(nb <= 0):
+		return found[0]
+
+	count = first + np.arange(nb)[None, :]
+
+	# chunks of reads to keep a low memory usage
+	step = max(1, 1048576 // nb)
+
+	for row in range(0, len(end), step):
+		rows = slice(row, row + step)
+
+		# seeds compared : position 'forward' moves every 2 counts while it
+		# can, position 'back' moves the other times
+		forward = np.minimum(prefix + count // 2 - first // 2,
+							 last[rows, None])
+		back = prefix + count - forward
+
+		seeds = []
+		for a, b in ((0, 1), (1, 0)):
+			inside = back < nb_seeds[b][rows, None]
+			other = np.minimum(back, packs[b].shape[1] - 1)
+
+			xor = (np.take_along_axis(packs[a][rows], forward, axis=1) ^
+				   np.take_along_axis(packs[b][rows], other, axis=1))
+			seeds.append(inside & (popcount(xor) <= 2 * clip['seed_miss']))
+
+		reads, cols = np.nonzero((seeds[0] | seeds[1]) &
+								 (count < end[rows, None]))
+
+		found.append((reads + row, cols + first + prefix + 16))
+
+	return [np.concatenate(values) for values in zip(*found)]
+
+
+
+def palindrome_scores(seqs, quals, lens, reads, overlaps):
+	"""
+	Function that scores overlaps between the forward reads and the reverse
+	complement of the reverse reads, as Trimmomatic does : a matching base
+	scores log10(4), a mismatch -quality/10 (the lowest quality of both
+	bases, 100 in the prefixes) and a 'N' 0. The score is the sum of all the
+	bases.
+
+	Takes 5 arguments :
+		- seqs [list] : forward sequences and complement of the reverse
+						sequences, with their prefix (see palindrome_offsets)
+		- quals [list] : qualities of the forward and reverse sequences
+		- lens [list] : lengths of the forward and reverse sequences
+		- reads [numpy.array] : read of each overlap
+		- overlaps [numpy.array] : number of overlapping bases
+
+	Returns:
+		- scores [numpy.array] : score of each overlap (java float)
+	"""
+
+	# overlapping bases : forward bases from skip_1 are paired with reverse
+	# bases from skip_2 + size - 1 backward
+	skip_1 = np.maximum(overlaps - lens[1][reads], 0)
+	skip_2 = np.maximum(overlaps - lens[0][reads], 0)
+	size = overlaps - skip_1 - skip_2
+
+	width = seqs[0].shape[1]
+	match = np.float32(LOG10_4)
+	scores = np.zeros(len(reads), dtype=np.float32)
+
+	for t in range(int(size.max()) if len(size) else 0):
+		pos_1 = np.minimum(skip_1 + t, width - 1)
+		pos_2 = np.clip(skip_2 + size - t - 1, 0, width - 1)
+
+		base_1 = seqs[0][reads, pos_1]
+		base_2 = seqs[1][reads, pos_2]
+
+		# java integer division (rounded toward 0)
+		worst = np.minimum(quals[0][reads, pos_1], quals[1][reads, pos_2])
+		mismatch = np.trunc(-worst / 10.0).astype(np.float32)
+
+		score = np.where(base_1 == base_2, match, mismatch)
+		score[(base_1 == ord('N')) | (base_2 == ord('N')) | (t >= size)] = 0
+
+		scores += score
+
+	return scores
+
+
+
+def palindrome_offsets(mates, pair, clip):
+	"""
+	Function that finds the pairs of reads whose reads overlap each other
+	with their adapters (palindrome mode of ILLUMINACLIP) : the forward read
+	after the first prefix is aligned with the reverse complement of the
+	reverse read after the second prefix. The first overlap (from the
+	shortest) reaching the palindrome clip threshold gives the length of the
+	DNA fragment.
+
+	Takes 3 arguments :
+		- mates [list] : the reads of both mates
+		- pair [tuple] : the prefixes (same length)
+		- clip [dict] : ILLUMINACLIP parameters
+
+	Returns:
+		- clipped [numpy.array] : length of the fragment of each pair, or
+								  NO_CLIP
+	"""
+
+	clipped = np.full(len(mates[0]['start']), NO_CLIP, dtype=np.int64)
+
+	rows = np.flatnonzero(mates[0]['alive'] & mates[1]['alive'])
+	if(len(rows) == 0):
+		return clipped
+
+	prefix = len(pair[0])
+	seqs, quals, lens = [], [], []
+
+	for mate, adapter in zip(mates, pair):
+		bases, qual, length = read_window(mate, rows)
+		adapter = np.frombuffer(adapter.encode('latin-1'), dtype=np.uint8)
+
+		seqs.append(np.hstack((np.tile(adapter, (len(rows), 1)), bases)))
+		quals.append(np.hstack((np.full((len(rows), prefix), 100,
+										dtype=np.int16), qual)))
+		lens.append(length + prefix)
+
+	# Trimmomatic stops with an exception on these pairs
+	if(min(lens[0].min(), lens[1].min()) - prefix < 16):
+		raise ValueError("Error : ILLUMINACLIP palindrome mode needs reads of \
+at least 16 bases (Trimmomatic fails on shorter reads).")
+
+	seqs[1] = code_table(COMPLEMENT_CODES, ord('N'))[seqs[1]]
+
+	reads, overlaps = palindrome_seeds(seqs, lens, prefix, clip)
+	found = np.full(len(rows), NO_CLIP, dtype=np.int64)
+
+	# overlaps are scored by rounds (the first overlaps of each read, then
+	# the following ones for reads without a good overlap)
+	rank = np.arange(len(reads)) - np.searchsorted(reads, reads)
+	high = 1
+
+	while len(reads):
+		now = rank < high
+		scores = palindrome_scores(seqs, quals, lens, reads[now], overlaps[now])
+
+		good = scores >= np.float32(clip['palindrome'])
+		np.minimum.at(found, reads[now][good], overlaps[now][good])
+
+		# reads with a good overlap are done
+		later = ~now & (found[reads] == NO_CLIP)
+		reads, overlaps, rank = reads[later], overlaps[later], rank[later]
+		high *= 2
+
+	# the fragment is the overlap without the prefixes
+	clipped[rows] = np.where(found != NO_CLIP, found - 2 * prefix, NO_CLIP)
+
+	return clipped
+
+
+
+def trim_illuminaclip(mates, values):
+	"""
+	ILLUMINACLIP:<fasta>:<seed mismatches>:<palindrome clip threshold>:<simple
+	clip threshold>[:<min adapter length>:<keep both reads>] : cuts the reads
+	before the adapters found in them (reads starting with an adapter are
+	dropped). Forward reads are searched for the '/1' and common adapters,
+	reverse reads for the '/2' and common ones. With prefix pairs, the pairs
+	of reads are also cut at the length of their fragment (palindrome mode).
+	"""
+
+	clip = values[0]
+
+	# palindrome mode : length of the fragment of the pairs (the same for
+	# both reads, or the reverse read is dropped if keep both reads is false)
+	palindrome = np.full(len(mates[0]['start']), NO_CLIP, dtype=np.int64)
+
+	if(len(mates) == 2):
+		for pair in clip['pairs']:
+			np.minimum(palindrome, palindrome_offsets(mates, pair, clip),
+					   out=palindrome)
+
+	found = [palindrome, palindrome]
+	if not clip['keep_both']:
+		found[1] = np.where(palindrome != NO_CLIP, 0, NO_CLIP)
+
+	for mate, index, fragment in zip(mates, clip['mates'], found):
+		offsets = np.minimum(adapter_offsets(mate, index, clip), fragment)
+		clipped = offsets != NO_CLIP
+
+		mate['alive'] &= ~clipped | (offsets > 0)
+
+		# a fragment can be longer than the read (the read is kept whole)
+		mate['end'] = np.where(clipped & (offsets > 0),
+							   np.minimum(mate['start'] + offsets, mate['end']),
+							   mate['end'])
+
+
+
+# functions of the trimming steps
+STEP_FUNCTIONS = {'CROP' : trim_crop, 'HEADCROP' : trim_headcrop,
+				  'LEADING' : trim_leading, 'TRAILING' : trim_trailing,
+				  'SLIDINGWINDOW' : trim_slidingwindow,
+				  'MAXINFO' : trim_maxinfo, 'MINLEN' : trim_minlen,
+				  'AVGQUAL' : trim_avgqual}
+
+# functions of the steps done on both mates together
+PAIR_STEPS = {'ILLUMINACLIP' : trim_illuminaclip}
+
+
+
+def apply_steps(mates, steps, phred):
+	"""
+	Function that applies the trimming steps to the reads of a batch, in the
+	commandline order.
+
+	Takes 3 arguments :
+		- mates [list] : the reads of each mate (1 for SE, 2 for PE)
+		- steps [list] : tuples (step name, list of step arguments)
+		- phred [integer] : quality encoding of the input files
+
+	Returns:
+		- phred [integer] : quality encoding of the outputs (changed by
+							TOPHRED33 or TOPHRED64)
+	"""
+
+	for name, values in steps:
+
+		if(name == 'TOPHRED33' or name == 'TOPHRED64'):
+			phred = int(name[-2:])
+
+		elif name in PAIR_STEPS:
+			PAIR_STEPS[name](mates, values)
+
+		else :
+			for mate in mates:
+				STEP_FUNCTIONS[name](mate, values)
+
+	return phred
+
+
+
+def format_reads(mate, keep, shift):
+	"""
+	Function that writes the kept part of reads in fastq format.
+
+	Takes 3 arguments :
+		- mate [dict] : the reads
+		- keep [numpy.array] : True for reads to write
+		- shift [integer] : value added to quality characters (TOPHRED33 or
+							TOPHRED64), or 0
+
+	Returns:
+		- fastq [bytes] : the reads
+	"""
+
+	heads, seqs, comments, quals = mate['lines']
+
+	if(shift != 0):
+		table = bytes(bytearray((i + shift) % 256 for i in range(256)))
+	else :
+		table = None
+
+	out = []
+	index = np.flatnonzero(keep)
+
+	for i, start, end in zip(index.tolist(), mate['start'][index].tolist(),
+							 mate['end'][index].tolist()):
+		qual = quals[i][start:end]
+
+		if table != None:
+			qual = qual.translate(table)
+
+		out.append(b'\n'.join((heads[i], seqs[i][start:end], comments[i],
+							   qual, b'')))
+
+	return b''.join(out)
+
+
+
+def trim_batch(job):
+	"""
+	Function that trims a batch of reads (can be done by another process).
+
+	Takes one argument :
+		- job [tuple] : the reads of each input file (bytes), the trimming
+						steps and the quality encoding
+
+	Returns:
+		- outputs [tuple] : reads to write in each output file (bytes)
+		- counts [tuple] : number of input reads and surviving reads (SE),
+						   or input pairs, both surviving, forward only and
+						   reverse only surviving (PE)
+	"""
+
+	blobs, steps, phred = job
+
+	mates = [new_mate(split_reads(blob), phred) for blob in blobs]
+
+	if(len(mates) == 2 and len(mates[0]['end']) != len(mates[1]['end'])):
+		raise ValueError("Error : Paired ends files don't have the same \
+number of reads.")
+
+	# quality characters are changed if the encoding is converted
+	shift = apply_steps(mates, steps, phred) - phred
+
+	# Single Ends data
+	if(len(mates) == 1):
+		alive = mates[0]['alive']
+		outputs = (format_reads(mates[0], alive, shift),)
+		counts = (len(alive), int(alive.sum()))
+
+	# Paired Ends data
+	else :
+		alive_1 = mates[0]['alive']
+		alive_2 = mates[1]['alive']
+
+		both = alive_1 & alive_2
+		forward = alive_1 & ~alive_2
+		reverse = ~alive_1 & alive_2
+
+		outputs = (format_reads(mates[0], both, shift),
+				   format_reads(mates[0], forward, shift),
+				   format_reads(mates[1], both, shift),
+				   format_reads(mates[1], reverse, shift))
+
+		counts = (len(alive_1), int(both.sum()), int(forward.sum()),
+				  int(reverse.sum()))
+
+	return outputs, counts
+
+
+
+def run_batches(batches, steps, phred, threads):
+	"""
+	Function (generator) that trims batches of reads, in several processes if
+	more than one thread is asked. Results are given in the reads order.
+
+	Takes 4 arguments :
+		- batches [generator] : the reads of each batch
+		- steps [list] : tuples (step name, list of step arguments)
+		- phred [integer] : quality encoding of the input files
+		- threads [integer] : number of processes
+
+	Returns (yield):
+		- the results of trim_batch for each batch
+	"""
+
+	if(threads <= 1):
+		for blobs in batches:
+			yield trim_batch((blobs, steps, phred))
+		return
+
+	pool = multiprocessing.Pool(threads)
+
+	try:
+		# only a few batches are waiting, to keep a low memory usage
+		pending = collections.deque()
+
+		for blobs in batches:
+			pending.append(pool.apply_async(trim_batch, ((blobs, steps, phred),)))
+
+			if(len(pending) >= 2 * threads):
+				yield pending.popleft().get()
+
+		while pending:
+			yield pending.popleft().get()
+
+		pool.close()
+
+	finally:
+		pool.terminate()
+		pool.join()
+
+
+
+def format_percent(number, total):
+	"""
+	Function that writes a percentage as Trimmomatic does.
+
+	Takes 2 arguments :
+		- number [integer] : number of reads
+		- total [integer] : total number of reads
+
+	Returns:
+		- percent [string] : the percentage with 2 decimals
+	"""
+
+	if(total == 0):
+		return '0.00'
+
+	return '{0:.2f}'.format(100.0 * number / total)
+
+
+
+def format_summary(layout, totals):
+	"""
+	Function that writes the summary of a Trimmomatic run (number of reads
+	surviving the trimming).
+
+	Takes 2 arguments :
+		- layout [string] : 'SE' or 'PE'
+		- totals [list] : number of input reads and surviving reads (SE), or
+						  input pairs, both surviving, forward only and
+						  reverse only surviving (PE)
+
+	Returns:
+		- summary [string] : the summary line, as Trimmomatic writes it
+	"""
+
+	if(layout == 'SE'):
+		nb, surviving = totals
+		return 'Input Reads: {0} Surviving: {1} ({2}%) Dropped: {3} \
+({4}%)\n'.format(nb, surviving, format_percent(surviving, nb),
+				 nb - surviving, format_percent(nb - surviving, nb))
+
+	nb, both, forward, reverse = totals
+	dropped = nb - both - forward - reverse
+
+	return 'Input Read Pairs: {0} Both Surviving: {1} ({2}%) Forward Only \
+Surviving: {3} ({4}%) Reverse Only Surviving: {5} ({6}%) Dropped: {7} \
+({8}%)\n'.format(nb, both, format_percent(both, nb), forward,
+				 format_percent(forward, nb), reverse,
+				 format_percent(reverse, nb), dropped,
+				 format_percent(dropped, nb))
+
+
+
+def launch_native(cmd, log_file):
+	"""
+	Function that launches a Trimmomatic commandline with the native engine
+	and writes Trimmomatic messages into a log file.
+
+	Takes 2 arguments :
+		- cmd [string] : the Trimmomatic commandline
+		- log_file [string] : file where Trimmomatic messages are written
+
+	Returns:
+		- 0 [integer] : if the trimming have been done
+	"""
+
+	run = parse_commandline(cmd)
+	name = 'Trimmomatic{0}'.format(run['layout'])
+
+	with open(log_file, "w") as log:
+
+		log.write('{0}: Started with arguments: {1}\n'.format(name,
+												' '.join(run['arguments'])))
+
+		# messages of the adapters loading
+		for step, values in run['steps']:
+			if(step == 'ILLUMINACLIP'):
+				for message in values[0]['messages']:
+					log.write('{0}\n'.format(message))
+
+		# quality encoding given or detected
+		phred = run['phred']
+		if(phred == None):
+			phred = detect_phred(run['input'][0])
+			log.write('Quality encoding detected as phred{0}\n'.format(phred))
+
+		inputs = [open_fastq(filename, 'rb') for filename in run['input']]
+		outputs = [open_fastq(filename, 'wb') for filename in run['output']]
+
+		try:
+			batches = read_batches(inputs, BATCH_SIZE)
+			totals = None
+
+			for reads, counts in run_batches(batches, run['steps'], phred,
+											 run['threads']):
+				for output, fastq in zip(outputs, reads):
+					output.write(fastq)
+
+				if totals == None:
+					totals = list(counts)
+				else :
+					totals = [a + b for a, b in zip(totals, counts)]
+
+		finally:
+			for fastq in inputs + outputs:
+				fastq.close()
+
+		if totals == None:
+			totals = [0] * (2 if run['layout'] == 'SE' else 4)
+
+		# Trimmomatic summary
+		log.write(format_summary(run['layout'], totals))
+		log.write('{0}: Completed successfully\n'.format(name))
+
+	return 0
@@ -434,6 +434,12 @@ parameters')
 
 
 		elif (parameter.get('name') == 'threads') :
+			
+			# the run can be sized automatically (see resources)
+			if(str(not_empty(parameter.find('number').text)).lower() == 'auto'):
+				param['threads'] = 'auto'
+				continue
+			
 			number = check_integer(parameter.find('number').text, 
 					 'number in threads in useful parameters.')
 
@@ -451,6 +457,11 @@ parameters.')
 				comp = check_format(parameter.find('format').text, 
 					   'format in compressed-output in useful parameters.')
 
+				# BGZF files are gzip files
+				if(comp == 'bgzf'):
+					comp = 'gz'
+					param['bgzf'] = 'yes'
+
 				param['compress'] = comp
 				continue
 
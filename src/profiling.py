@@ -0,0 +1,235 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions to time the phases of a run (parsing
+	of the parameters, building of the commandlines, start of java, trimming
+	steps, renaming and removal of the temporary files) with a monotonic
+	clock : the phases are written in a JSON trace 'trimming_trace.json' and,
+	if asked, in a trace of the Chrome trace event format (opened by
+	chrome://tracing or Perfetto). The python side of the run can also be
+	profiled by cProfile. """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+import atexit
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# name of the trace of a run, in the working directory
+TRACE_FILE = 'trimming_trace.json'
+
+# name of the profile of a run (see '--profile'), in the working directory
+PROFILE_FILE = 'trimming_profile.prof'
+
+# number of functions of the profile written at the end of the run
+PROFILE_LINES = 25
+
+# time between two checks of the first output of java (seconds)
+POLL_TIME = 0.005
+
+# monotonic clock (time.time if the python version has none)
+clock = getattr(time, 'monotonic', time.time)
+
+# trace of the run : its file (None without trace), the file of the Chrome
+# trace (None without), the start of the run, the phases timed, the
+# profiler (None without profile) and the writing of the trace at exit
+# ('registered')
+TRACE = {'file' : None, 'chrome' : None, 'start' : None, 'phases' : [],
+		 'profiler' : None, 'registered' : False}
+
+
+
+def open_trace(directory, chrome, profile):
+	"""
+	Function that starts the trace of the run. The trace is written at the
+	end of the run, even if it fails.
+
+	Takes 3 arguments :
+		- directory [string] : the working directory
+		- chrome [string] : file of the Chrome trace (None without)
+		- profile [bool] : True to profile the python side of the run
+
+	Returns nothing
+	"""
+
+	TRACE['file'] = os.path.join(os.path.abspath(directory), TRACE_FILE)
+	TRACE['chrome'] = os.path.abspath(chrome) if chrome != None else None
+	TRACE['start'] = clock()
+	TRACE['phases'] = []
+
+	if profile:
+		TRACE['profiler'] = cProfile.Profile()
+		TRACE['profiler'].enable()
+
+	# registered once for all the runs of the interpreter
+	if not TRACE['registered']:
+		atexit.register(close_trace)
+		TRACE['registered'] = True
+
+
+
+def record_phase(name, category, start, end, args=None):
+	"""
+	Function that adds a phase to the trace of the run.
+
+	Takes 5 arguments :
+		- name [string] : name of the phase
+		- category [string] : kind of phase ('setup', 'commandline', 'java',
+							  'trimming', 'files')
+		- start [float] : start of the phase (see clock)
+		- end [float] : end of the phase (see clock)
+		- args [dict] : details of the phase (as the log file of a step)
+
+	Returns nothing
+	"""
+
+	if TRACE['file'] == None:
+		return
+
+	TRACE['phases'].append({'name' : name, 'category' : category,
+							'start' : round(start - TRACE['start'], 6),
+							'duration' : round(end - start, 6),
+							'thread' : threading.current_thread().name,
+							'args' : args or {}})
+
+
+
+@contextlib.contextmanager
+def phase(name, category, args=None):
+	"""
+	Function (context manager) that times the phase of the run run in its
+	block.
+
+	Takes 3 arguments :
+		- name [string] : name of the phase
+		- category [string] : kind of phase (see record_phase)
+		- args [dict] : details of the phase
+
+	Returns nothing
+	"""
+
+	start = clock()
+
+	try:
+		yield
+	finally:
+		record_phase(name, category, start, clock(), args)
+
+
+
+def wait_first_output(prog, log_file, start):
+	"""
+	Function that waits for the first message of a Trimmomatic process (the
+	java virtual machine is started and Trimmomatic is running), and adds
+	the time from the launch of the process to the trace.
+
+	Takes 3 arguments :
+		- prog [Popen] : the Trimmomatic process
+		- log_file [string] : file where Trimmomatic messages are written
+		- start [float] : launch of the process (see clock)
+
+	Returns nothing
+	"""
+
+	if TRACE['file'] == None:
+		return
+
+	while(prog.poll() == None and os.path.getsize(log_file) == 0):
+		time.sleep(POLL_TIME)
+
+	record_phase('java start', 'java', start, clock(), {'log' : log_file})
+
+
+
+def chrome_trace():
+	"""
+	Function that converts the phases of the trace into events of the Chrome
+	trace event format (complete events, in microseconds).
+
+	Don't takes any argument
+
+	Returns:
+		- trace [dict] : the Chrome trace
+	"""
+
+	threads = {}
+	events = []
+
+	for item in TRACE['phases']:
+		tid = threads.setdefault(item['thread'], len(threads) + 1)
+		events.append({'name' : item['name'], 'cat' : item['category'],
+					   'ph' : 'X', 'pid' : os.getpid(), 'tid' : tid,
+					   'ts' : int(item['start'] * 1e6),
+					   'dur' : int(item['duration'] * 1e6),
+					   'args' : item['args']})
+
+	for name, tid in threads.items():
+		events.append({'name' : 'thread_name', 'ph' : 'M', 'pid' : os.getpid(),
+					   'tid' : tid, 'args' : {'name' : name}})
+
+	return {'traceEvents' : events, 'displayTimeUnit' : 'ms'}
+
+
+
+def close_trace():
+	"""
+	Function that writes the trace of the run (and its profile).
+
+	Don't takes any argument
+
+	Returns:
+		- trace [dict] : the time of the run ('total') and its phases
+						 ('phases'), or None without trace
+	"""
+
+	if TRACE['file'] == None:
+		return None
+
+	total = clock() - TRACE['start']
+	trace = {'clock' : 'monotonic', 'total' : round(total, 6),
+			 'phases' : TRACE['phases']}
+
+	if TRACE['profiler'] != None:
+		TRACE['profiler'].disable()
+		TRACE['profiler'].dump_stats(os.path.join(
+						os.path.dirname(TRACE['file']), PROFILE_FILE))
+
+		stats = pstats.Stats(TRACE['profiler'], stream=sys.stderr)
+		stats.sort_stats('cumulative').print_stats(PROFILE_LINES)
+		TRACE['profiler'] = None
+
+	try:
+		with open(TRACE['file'], 'w') as out:
+			json.dump(trace, out, indent=1)
+
+		if TRACE['chrome'] != None:
+			with open(TRACE['chrome'], 'w') as out:
+				json.dump(chrome_trace(), out)
+
+	except (IOError, OSError) as error:
+		sys.stderr.write("Warning : The trace of the run can't be written \
+({0}).\n".format(error))
+
+	TRACE['file'] = None
+
+	return trace
@@ -0,0 +1,308 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions to size a run automatically
+	('-threads auto') : the number of threads is chosen from the processors
+	the run may use (affinity mask and cgroup quota) and from the size of
+	the input files (compressed files hold more reads), the heap and the
+	garbage collector of java from the free memory (free memory of the
+	machine and cgroup limit). The samples trimmed at the same time share
+	the processors and the memory. """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+from class_sharing import SHARING
+
+import multiprocessing
+import os
+import sys
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# value of '-threads' sizing the run automatically
+AUTO = 'auto'
+
+# size of the reads (not compressed) trimmed by each thread, in bytes : a
+# small input doesn't need many threads
+SIZE_PER_THREAD = 33554432
+
+# most threads given to a Trimmomatic run (it doesn't scale further)
+MAX_THREADS = 32
+
+# size of the reads for one byte of compressed file
+COMPRESSION_RATIO = {'.gz' : 4, '.bz2' : 5}
+
+# heap of java : a base, more for each thread, and at most a part of the
+# free memory (in MB)
+HEAP_BASE = 256
+HEAP_PER_THREAD = 128
+HEAP_MIN = 64
+MEMORY_PART = 0.75
+
+# cgroup files (version 2, then version 1)
+CGROUP_CPU = ['/sys/fs/cgroup/cpu.max',
+			  ('/sys/fs/cgroup/cpu/cpu.cfs_quota_us',
+			   '/sys/fs/cgroup/cpu/cpu.cfs_period_us')]
+CGROUP_MEMORY = [('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory.current'),
+				 ('/sys/fs/cgroup/memory/memory.limit_in_bytes',
+				  '/sys/fs/cgroup/memory/memory.usage_in_bytes')]
+
+# options of java used by the Trimmomatic commandlines (see java_command)
+RESOURCES = {'java' : []}
+
+
+
+def read_first_line(filename):
+	"""
+	Function that reads the first line of a file (a file of the system).
+
+	Takes one argument :
+		- filename [string] : the file
+
+	Returns:
+		- [string] : the line, or None if the file can't be read
+	"""
+
+	try:
+		with open(filename) as data:
+			return data.readline().strip()
+	except (IOError, OSError):
+		return None
+
+
+
+def available_cores():
+	"""
+	Function that gets the number of processors the run may use : the
+	processors of its affinity mask, at most the cgroup quota.
+
+	Don't takes any argument
+
+	Returns:
+		- cores [integer] : number of processors (at least 1)
+	"""
+
+	try:
+		cores = len(os.sched_getaffinity(0))
+	except AttributeError:
+		cores = multiprocessing.cpu_count()
+
+	# cgroup version 2 : 'quota period' (or 'max period')
+	values = (read_first_line(CGROUP_CPU[0]) or '').split()
+	quota, period = (values + [None, None])[:2]
+
+	# cgroup version 1 : quota (-1 without quota) and period
+	if quota == None:
+		quota = read_first_line(CGROUP_CPU[1][0])
+		period = read_first_line(CGROUP_CPU[1][1])
+
+	try:
+		if(int(quota) > 0 and int(period) > 0):
+			cores = min(cores, -(-int(quota) // int(period)))
+	except (TypeError, ValueError):
+		pass
+
+	return max(1, cores)
+
+
+
+def available_memory():
+	"""
+	Function that gets the free memory : the memory available on the machine,
+	at most the free part of the cgroup limit.
+
+	Don't takes any argument
+
+	Returns:
+		- memory [integer] : free memory, in MB (None if unknown)
+	"""
+
+	memory = None
+
+	try:
+		with open('/proc/meminfo') as meminfo:
+			for line in meminfo:
+				if line.startswith('MemAvailable:'):
+					memory = int(line.split()[1]) // 1024
+	except (IOError, OSError, ValueError):
+		pass
+
+	if memory == None:
+		try:
+			memory = (os.sysconf('SC_PAGE_SIZE') *
+					  os.sysconf('SC_AVPHYS_PAGES')) // 1048576
+		except (AttributeError, ValueError, OSError):
+			pass
+
+	# cgroup limit ('max' or a huge number without limit) and usage
+	for limit_file, usage_file in CGROUP_MEMORY:
+		limit = read_first_line(limit_file)
+		usage = read_first_line(usage_file)
+
+		if(limit == None or usage == None):
+			continue
+
+		try:
+			free = (int(limit) - int(usage)) // 1048576
+		except ValueError:
+			break
+
+		if(memory == None or 0 <= free < memory):
+			memory = free
+		break
+
+	return memory
+
+
+
+def input_size(inputs):
+	"""
+	Function that estimates the size of the reads of the input files (a
+	compressed file holds more reads than its size).
+
+	Takes one argument :
+		- inputs [list] : the input files (or the file of single ends data)
+
+	Returns:
+		- size [integer] : the size of the reads, in bytes
+	"""
+
+	if isinstance(inputs, str):
+		inputs = [inputs]
+
+	size = 0
+	for filename in inputs:
+		ratio = COMPRESSION_RATIO.get(os.path.splitext(filename)[1], 1)
+
+		if os.path.isfile(filename):
+			size += os.path.getsize(filename) * ratio
+
+	return size
+
+
+
+def size_threads(inputs, cores):
+	"""
+	Function that chooses the number of threads of a run : one thread for
+	each SIZE_PER_THREAD bytes of reads, at most the processors.
+
+	Takes 2 arguments :
+		- inputs [list] : the input files (or the file of single ends data)
+		- cores [integer] : processors the run may use
+
+	Returns:
+		- threads [integer] : number of threads
+	"""
+
+	wanted = -(-input_size(inputs) // SIZE_PER_THREAD)
+
+	return max(1, min(cores, wanted, MAX_THREADS))
+
+
+
+def java_options(threads, memory):
+	"""
+	Function that chooses the options of java for a Trimmomatic run : its
+	heap (maximal and initial) and its garbage collector (the serial one
+	for a single thread, else the parallel one with as many threads as
+	Trimmomatic).
+
+	Takes 2 arguments :
+		- threads [integer] : number of threads of the run
+		- memory [integer] : memory the run may use, in MB (None if unknown)
+
+	Returns:
+		- options [list] : the options of java
+	"""
+
+	heap = HEAP_BASE + HEAP_PER_THREAD * threads
+
+	if memory != None:
+		heap = min(heap, int(memory * MEMORY_PART))
+
+	if(heap < HEAP_MIN):
+		sys.stderr.write("Warning : Only {0} MB of free memory, the heap of \
+java is set to {1} MB.\n".format(memory, HEAP_MIN))
+		heap = HEAP_MIN
+
+	options = ['-Xmx{0}m'.format(heap), '-Xms{0}m'.format(min(heap, HEAP_BASE))]
+
+	if(threads == 1):
+		options.append('-XX:+UseSerialGC')
+	else :
+		options += ['-XX:+UseParallelGC',
+					'-XX:ParallelGCThreads={0}'.format(threads)]
+
+	return options
+
+
+
+def size_run(inputs, threads, memory, shards):
+	"""
+	Function that sizes a run : with '-threads auto', the number of threads
+	is chosen from the processors and the inputs. With '-threads auto' or a
+	given memory, the options of java are chosen from the free memory. The
+	shards of a run (trimmed at the same time) share the processors and the
+	memory.
+
+	Takes 4 arguments :
+		- inputs [list] : the input files (or the file of single ends data)
+		- threads [integer or string] : number of threads, or 'auto'
+		- memory [integer] : memory the run may use, in MB (None for the
+							 free memory)
+		- shards [integer] : number of shards of the run
+
+	Returns:
+		- threads [integer] : number of threads of each Trimmomatic run
+	"""
+
+	auto = (threads == AUTO)
+
+	# options of java of the previous run (in the same interpreter)
+	RESOURCES['java'] = []
+
+	if auto:
+		threads = max(1, size_threads(inputs, available_cores()) // shards)
+
+	if(auto or memory != None):
+		if memory == None:
+			memory = available_memory()
+
+		share = memory // shards if memory != None else None
+		RESOURCES['java'] = java_options(threads, share)
+
+		sys.stdout.write("Resources : {0} thread(s), java options '{1}'.\n"
+						 .format(threads, ' '.join(RESOURCES['java'])))
+		sys.stdout.flush()
+
+	return threads
+
+
+
+def java_command(loc):
+	"""
+	Function that gives the beginning of a Trimmomatic commandline : java,
+	its options (see size_run and open_class_sharing) and the Trimmomatic
+	jar.
+
+	Takes one argument :
+		- loc [string] : location of the 'src' directory
+
+	Returns:
+		- [string] : the beginning of the commandline
+	"""
+
+	return ' '.join(['java'] + RESOURCES['java'] + SHARING['options'] +
+					['-jar', '{0}trimmomatic-0.33.jar'.format(loc[:-3])])
@@ -0,0 +1,392 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions to keep the trimmed reads in a cache
+	directory : a trimming is found by a key made of the fingerprint of its
+	input files, of its trimming steps (with the content of the adapters
+	file), of its options and of the trimming engine. A trimming already done
+	is not done again, its outputs are linked (or copied) from the cache. The
+	least recently used trimmings are removed when the cache is too big. """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+from sharding import split_commandline
+from compression import COMPRESSION
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import native_engine
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# size of the blocks read at once
+CHUNK_SIZE = 1048576
+
+# name of the description of a trimming in its cache directory
+ENTRY_FILE = 'entry.json'
+
+# name of the file keeping the fingerprints of the files already read
+# (absolute file name : size, modification time, inode, md5)
+FINGERPRINTS_FILE = 'fingerprints.json'
+
+# cache used by the main script : its directory (None without cache) and
+# its maximal size (bytes)
+CACHE = {'dir' : None, 'size' : 0}
+
+
+
+def set_cache(directory, size):
+	"""
+	Function that sets the cache of the trimmings.
+
+	Takes 2 arguments :
+		- directory [string] : the cache directory (None without cache)
+		- size [float] : maximal size of the cache, in GB
+
+	Returns nothing
+	"""
+
+	CACHE['dir'] = os.path.abspath(directory) if directory != None else None
+	CACHE['size'] = int(size * 1024 ** 3)
+
+	if(CACHE['dir'] != None and not os.path.isdir(CACHE['dir'])):
+		os.makedirs(CACHE['dir'])
+
+
+
+def file_md5(filename):
+	"""
+	Function that computes the md5 of a file.
+
+	Takes one argument :
+		- filename [string] : the file
+
+	Returns:
+		- [string] : the md5 (hexadecimal)
+	"""
+
+	md5 = hashlib.md5()
+
+	with open(filename, 'rb') as data:
+		for chunk in iter(lambda: data.read(CHUNK_SIZE), b''):
+			md5.update(chunk)
+
+	return md5.hexdigest()
+
+
+
+def file_fingerprint(filename):
+	"""
+	Function that gets the fingerprint (md5) of an input file : from the
+	fingerprints already computed for the cache (same size, modification
+	time in nanoseconds and inode), else by reading the whole file.
+
+	Takes one argument :
+		- filename [string] : the file
+
+	Returns:
+		- [string] : the fingerprint
+	"""
+
+	path = os.path.join(CACHE['dir'], FINGERPRINTS_FILE)
+	name = os.path.abspath(filename)
+	stat = os.stat(filename)
+
+	try:
+		with open(path) as known:
+			fingerprints = json.load(known)
+	except (IOError, ValueError):
+		fingerprints = {}
+
+	identity = [stat.st_size, int(stat.st_mtime * 1e9), stat.st_ino]
+
+	if(fingerprints.get(name, [None])[:3] == identity):
+		return fingerprints[name][3]
+
+	fingerprint = file_md5(filename)
+
+	# the files removed since (as the step1 outputs) are forgotten
+	fingerprints = dict((known, value) for known, value in fingerprints.items()
+						if os.path.isfile(known))
+	fingerprints[name] = identity + [fingerprint]
+
+	# written at once (other runs may use the cache at the same time)
+	tmp, tmp_name = tempfile.mkstemp(dir=CACHE['dir'])
+	with os.fdopen(tmp, 'w') as out:
+		json.dump(fingerprints, out)
+	os.rename(tmp_name, path)
+
+	return fingerprint
+
+
+
+def step_fingerprint(step):
+	"""
+	Function that normalizes a trimming step of a commandline : the adapters
+	file of ILLUMINACLIP is replaced by the md5 of its content.
+
+	Takes one argument :
+		- step [string] : the trimming step (as 'SLIDINGWINDOW:4:20')
+
+	Returns:
+		- [string] : the normalized step
+	"""
+
+	values = step.split(':')
+
+	if(values[0] == 'ILLUMINACLIP' and len(values) > 1):
+		values[1] = file_md5(values[1])
+
+	return ':'.join(values)
+
+
+
+def cache_key(cmd, engine):
+	"""
+	Function that computes the cache key of a trimming : the md5 of its
+	layout, input fingerprints, quality encoding, normalized trimming steps,
+	compression of its outputs and trimming engine (the content of the jar
+	or of the native engine). Threads and shards don't change the trimmed
+	reads.
+
+	Takes 2 arguments :
+		- cmd [string] : the Trimmomatic commandline
+		- engine [string] : 'trimmomatic' or 'native'
+
+	Returns:
+		- key [string] : the key, or None without cache
+	"""
+
+	if CACHE['dir'] == None:
+		return None
+
+	parts = split_commandline(cmd)
+
+	if(engine == 'native' and native_engine.native_supported(cmd)):
+		program = os.path.splitext(native_engine.__file__)[0] + '.py'
+	else :
+		program = [arg for arg in parts['program'] if arg.endswith('.jar')][0]
+
+	description = {'layout' : parts['layout'],
+				   'input' : [file_fingerprint(filename)
+							  for filename in parts['input']],
+				   'phred' : parts['phred'],
+				   'steps' : [step_fingerprint(step) for step in parts['steps']],
+				   'output' : [os.path.splitext(filename)[1]
+							   for filename in parts['output']],
+				   'bgzf' : COMPRESSION['bgzf'],
+				   'engine' : [engine, file_md5(program)]}
+
+	return hashlib.md5(json.dumps(description, sort_keys=True).encode()
+					   ).hexdigest()
+
+
+
+def link_file(source, destination):
+	"""
+	Function that links a file (hard link), or copies it if it can't be
+	linked (other file system).
+
+	Takes 2 arguments :
+		- source [string] : the file
+		- destination [string] : the new file (replaced if it exists)
+
+	Returns nothing
+	"""
+
+	if os.path.lexists(destination):
+		os.remove(destination)
+
+	try:
+		os.link(source, destination)
+	except OSError:
+		shutil.copyfile(source, destination)
+
+
+
+def restore_result(key, cmd, log_file):
+	"""
+	Function that gets a trimming from the cache : its outputs and its
+	messages (with the names of the new inputs and outputs) are linked into
+	the working directory.
+
+	Takes 3 arguments :
+		- key [string] : the cache key (see cache_key)
+		- cmd [string] : the Trimmomatic commandline
+		- log_file [string] : file where Trimmomatic messages are written
+
+	Returns:
+		- True [bool] : if the trimming was in the cache
+		- False [bool] : else
+	"""
+
+	entry = os.path.join(CACHE['dir'], key)
+	parts = split_commandline(cmd)
+
+	# the trimming may be removed by another run at the same time
+	try:
+		with open(os.path.join(entry, ENTRY_FILE)) as description:
+			cached = json.load(description)
+
+		for i, filename in enumerate(parts['output']):
+			link_file(os.path.join(entry, 'output_{0}'.format(i)), filename)
+
+		with open(os.path.join(entry, 'messages')) as log:
+			messages = log.read()
+
+	except (IOError, OSError, ValueError):
+		return False
+
+	for old, new in zip(cached['input'] + cached['output'],
+						parts['input'] + parts['output']):
+		messages = messages.replace(old, new)
+
+	with open(log_file, 'w') as log:
+		log.write(messages)
+
+	# the most recently used trimmings are kept
+	os.utime(os.path.join(entry, ENTRY_FILE), None)
+
+	sys.stdout.write("Trimming found in the cache ({0}).\n".format(key))
+	sys.stdout.flush()
+
+	return True
+
+
+
+def store_result(key, cmd, log_file):
+	"""
+	Function that puts a trimming into the cache : its outputs (linked, or
+	copied) and its messages, then removes the least recently used
+	trimmings if the cache is too big.
+
+	Takes 3 arguments :
+		- key [string] : the cache key (see cache_key)
+		- cmd [string] : the Trimmomatic commandline
+		- log_file [string] : file where Trimmomatic messages are written
+
+	Returns nothing
+	"""
+
+	parts = split_commandline(cmd)
+	entry = os.path.join(CACHE['dir'], key)
+
+	# outputs which are not files (named pipes) can't be kept
+	for filename in parts['output']:
+		if not os.path.isfile(filename):
+			return
+
+	# the trimming is written aside, then moved at once into the cache
+	tmp_dir = tempfile.mkdtemp(prefix='trimming_', dir=CACHE['dir'])
+	os.chmod(tmp_dir, 0o755)
+
+	try:
+		for i, filename in enumerate(parts['output']):
+			link_file(filename, os.path.join(tmp_dir, 'output_{0}'.format(i)))
+
+		shutil.copyfile(log_file, os.path.join(tmp_dir, 'messages'))
+
+		with open(os.path.join(tmp_dir, ENTRY_FILE), 'w') as description:
+			json.dump({'input' : parts['input'], 'output' : parts['output'],
+					   'date' : time.time()}, description)
+
+		if not os.path.isdir(entry):
+			os.rename(tmp_dir, entry)
+
+	except (IOError, OSError) as error:
+		sys.stderr.write("Warning : The trimming can't be put into the cache \
+({0}).\n".format(error))
+
+	finally:
+		shutil.rmtree(tmp_dir, ignore_errors=True)
+
+	evict_results(key)
+
+
+
+def release_outputs(cmd):
+	"""
+	Function that removes the outputs of a trimming which are linked to
+	other files (to the cache), so that the trimming writes new files instead
+	of changing the cached ones.
+
+	Takes one argument :
+		- cmd [string] : the Trimmomatic commandline
+
+	Returns nothing
+	"""
+
+	for filename in split_commandline(cmd)['output']:
+		if(os.path.isfile(filename) and os.stat(filename).st_nlink > 1):
+			os.remove(filename)
+
+
+
+def entry_size(entry):
+	"""
+	Function that gets the size of a trimming of the cache.
+
+	Takes one argument :
+		- entry [string] : directory of the trimming
+
+	Returns:
+		- size [integer] : size of its files, in bytes
+	"""
+
+	size = 0
+	for name in os.listdir(entry):
+		size += os.path.getsize(os.path.join(entry, name))
+
+	return size
+
+
+
+def evict_results(keep):
+	"""
+	Function that removes the least recently used trimmings of the cache
+	until it is smaller than its maximal size.
+
+	Takes one argument :
+		- keep [string] : key of a trimming which is not removed (the one
+						  just used)
+
+	Returns nothing
+	"""
+
+	entries = []
+
+	for key in os.listdir(CACHE['dir']):
+		entry = os.path.join(CACHE['dir'], key)
+		description = os.path.join(entry, ENTRY_FILE)
+
+		if os.path.isfile(description):
+			entries.append((os.path.getmtime(description), entry_size(entry),
+							entry, key))
+
+	total = sum(size for used, size, entry, key in entries)
+
+	for used, size, entry, key in sorted(entries):
+		if(total <= CACHE['size']):
+			break
+
+		if(key != keep):
+			shutil.rmtree(entry, ignore_errors=True)
+			total -= size
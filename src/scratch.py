@@ -0,0 +1,170 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions to write the intermediate files of a
+	run (step 1 outputs read by step 2) in a scratch directory ('--scratch',
+	as /dev/shm or a local disk) : the first directory with enough free
+	space for the reads is used, else the working directory. Intermediate
+	files are never compressed, whatever the compression of the outputs. """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+from journal import record_temporary
+from resources import input_size
+
+import hashlib
+import os
+import sys
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# free space kept on a scratch directory, as a part of the intermediate files
+SCRATCH_MARGIN = 0.1
+
+# name of the directory of a run in a scratch directory (with the key of
+# its working directory : runs of other directories don't share it)
+SCRATCH_NAME = 'trimming_scratch_{0}'
+
+
+
+def free_space(directory):
+	"""
+	Function that gets the free space of the filesystem of a directory (for
+	the user, not for root).
+
+	Takes one argument :
+		- directory [string] : the directory
+
+	Returns:
+		- [integer] : free space in bytes (None if unknown)
+	"""
+
+	try:
+		info = os.statvfs(directory)
+	except (AttributeError, OSError):
+		return None
+
+	return info.f_bavail * info.f_frsize
+
+
+
+def directory_size(directory):
+	"""
+	Function that gets the size of the files of a directory (intermediate
+	files of an interrupted run, which will be written again).
+
+	Takes one argument :
+		- directory [string] : the directory
+
+	Returns:
+		- size [integer] : size of the files in bytes
+	"""
+
+	size = 0
+
+	if os.path.isdir(directory):
+		for filename in os.listdir(directory):
+			filename = os.path.join(directory, filename)
+
+			if os.path.isfile(filename):
+				size += os.path.getsize(filename)
+
+	return size
+
+
+
+def scratch_directory(scratch, output, inputs):
+	"""
+	Function that chooses the directory of the intermediate files : the
+	first scratch directory with enough free space for the reads of the
+	input files, else the output directory.
+
+	Takes 3 arguments :
+		- scratch [string] : the scratch directories, separated by commas
+							 (None without scratch directory)
+		- output [string] : the output directory
+		- inputs [list] : the input files (or the file of single ends data)
+
+	Returns:
+		- [string] : the directory of the intermediate files
+	"""
+
+	if scratch == None:
+		return output
+
+	# step 1 outputs are at most as big as the reads of the inputs
+	needed = int(input_size(inputs) * (1 + SCRATCH_MARGIN))
+	key = hashlib.md5(os.path.abspath(output).encode('utf-8')).hexdigest()
+
+	for candidate in scratch.split(','):
+		candidate = os.path.abspath(os.path.expanduser(candidate.strip()))
+		directory = os.path.join(candidate, SCRATCH_NAME.format(key[:12]))
+
+		if not(os.path.isdir(candidate) and os.access(candidate, os.W_OK)):
+			sys.stderr.write("Warning : The scratch directory '{0}' can't be \
+written.\n".format(candidate))
+			continue
+
+		free = free_space(candidate)
+		if(free != None and free + directory_size(directory) < needed):
+			sys.stderr.write("Warning : The scratch directory '{0}' has {1} \
+MB free, {2} MB are needed.\n".format(candidate, free // 1048576,
+									  needed // 1048576))
+			continue
+
+		try:
+			if not os.path.isdir(directory):
+				os.mkdir(directory)
+		except OSError:
+			continue
+
+		# removed at the end of the run (or by the next run if interrupted)
+		record_temporary(directory)
+
+		return directory
+
+	sys.stderr.write("Warning : No scratch directory can hold the intermediate \
+files, they are written in the working directory.\n")
+
+	return output
+
+
+
+def intermediate_parameters(param, scratch):
+	"""
+	Function that creates the parameters of step 1 when its outputs are read
+	by step 2 : they are written in the scratch directory (see
+	scratch_directory), without compression.
+
+	Takes 2 arguments :
+		- param [dict] : dictionnary containning all parameters
+		- scratch [string] : the scratch directories, separated by commas
+							 (None without scratch directory)
+
+	Returns:
+		- step_1 [dict] : parameters of step 1
+	"""
+
+	# copy the parameters to keep the user's ones
+	step_1 = dict(param)
+
+	step_1['output'] = scratch_directory(scratch, param['output'],
+										 param['input'])
+
+	# intermediate reads are never compressed
+	if 'compress' in step_1:
+		del step_1['compress']
+
+	return step_1
@@ -0,0 +1,576 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions to trim one sample by shards : the
+	input files (both files of paired ends data together) are split into
+	byte ranges holding whole reads, each shard is trimmed in its own process
+	(by Trimmomatic or by the native engine) and the trimmed reads are merged
+	back in the reads order. """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+from native_engine import *
+from fastq_index import load_index, record_offsets
+from journal import JOURNAL, unit_done, record_unit, record_temporary
+
+import functools
+import hashlib
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+
+try:
+	from concurrent.futures import ProcessPoolExecutor
+except ImportError:
+	ProcessPoolExecutor = None
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# size of the blocks read or copied at once
+CHUNK_SIZE = 1048576
+
+
+
+def sharding_available():
+	"""
+	Booleen that checks if the input files can be trimmed by shards on this
+	system (the shards are given to Trimmomatic through named pipes).
+
+	Don't takes any argument
+
+	Returns:
+		- True [bool] : if processes pools and FIFOs can be used
+		- False [bool] : else
+	"""
+
+	return ProcessPoolExecutor != None and hasattr(os, 'mkfifo')
+
+
+
+def split_commandline(cmd):
+	"""
+	Function that splits a Trimmomatic commandline into its parts.
+
+	Takes one argument :
+		- cmd [string] : the Trimmomatic commandline
+
+	Returns:
+		- parts [dict] : java command and layout ('program'), options
+						 ('options'), quality encoding ('phred', None if not
+						 given), input files ('input'), output files
+						 ('output'), trimming steps ('steps') and all the
+						 arguments given to Trimmomatic ('arguments')
+	"""
+
+	args = shlex.split(cmd)
+
+	# arguments given to Trimmomatic start after the layout
+	for i, arg in enumerate(args):
+		if(arg == 'SE' or arg == 'PE'):
+			break
+
+	parts = {'program' : args[:i+1], 'layout' : arg, 'options' : [],
+			 'phred' : None, 'arguments' : args[i+1:]}
+
+	args = args[i+1:]
+
+	while args and args[0].startswith('-'):
+		if(args[0] == '-threads'):
+			parts['options'] += args[:2]
+			args = args[2:]
+
+		else :
+			parts['phred'] = int(args[0][-2:])
+			parts['options'].append(args[0])
+			args = args[1:]
+
+	# 1 input and 1 output for SE, 2 inputs and 4 outputs for PE
+	nb_in, nb_out = (1, 1) if parts['layout'] == 'SE' else (2, 4)
+
+	parts['input'] = args[:nb_in]
+	parts['output'] = args[nb_in:nb_in + nb_out]
+	parts['steps'] = args[nb_in + nb_out:]
+
+	return parts
+
+
+
+def record_start(fastq, offset):
+	"""
+	Function that finds the first read starting after a position of a fastq
+	file : a line starting with '@' followed 2 lines later by a line starting
+	with '+' (a quality line can start with '@', but it is never followed 2
+	lines later by a '+' line).
+
+	Takes 2 arguments :
+		- fastq [file] : the fastq file, opened in binary mode
+		- offset [integer] : the position
+
+	Returns:
+		- start [integer] : position of the read, or the file size if there
+							is no read after the position
+	"""
+
+	fastq.seek(offset)
+
+	# the line holding the position is incomplete
+	if(offset > 0):
+		fastq.readline()
+
+	while True:
+		start = fastq.tell()
+		lines = [fastq.readline() for i in range(3)]
+
+		if not lines[0]:
+			return start
+
+		if(lines[0].startswith(b'@') and lines[2].startswith(b'+')):
+			return start
+
+		fastq.seek(start)
+		fastq.readline()
+
+
+
+def count_lines(filename, offsets):
+	"""
+	Function that counts the lines of a file before some positions.
+
+	Takes 2 arguments :
+		- filename [string] : the file
+		- offsets [list] : positions, in increasing order
+
+	Returns:
+		- counts [list] : number of lines before each position
+	"""
+
+	counts = []
+	total = 0
+	pos = 0
+
+	with open(filename, 'rb') as fastq:
+		for offset in offsets:
+			while pos < offset:
+				chunk = fastq.read(min(CHUNK_SIZE, offset - pos))
+				if not chunk:
+					break
+
+				total += chunk.count(b'\n')
+				pos += len(chunk)
+
+			counts.append(total)
+
+	return counts
+
+
+
+def line_offsets(filename, numbers):
+	"""
+	Function that finds the positions of some lines of a file.
+
+	Takes 2 arguments :
+		- filename [string] : the file
+		- numbers [list] : line numbers (from 0), in increasing order
+
+	Returns:
+		- offsets [list] : position of the start of each line (the file size
+						   for lines after the end of the file)
+	"""
+
+	offsets = []
+	lines = 0
+	pos = 0
+
+	with open(filename, 'rb') as fastq:
+		for number in numbers:
+			while lines < number:
+				chunk = fastq.read(CHUNK_SIZE)
+				if not chunk:
+					break
+
+				count = chunk.count(b'\n')
+
+				# the line starts after this chunk
+				if(lines + count < number):
+					lines += count
+					pos += len(chunk)
+					continue
+
+				# end of the line before the wanted one
+				end = -1
+				for i in range(number - lines):
+					end = chunk.index(b'\n', end + 1)
+
+				pos += end + 1
+				lines = number
+				fastq.seek(pos)
+
+			offsets.append(pos)
+
+	return offsets
+
+
+
+def shard_ranges(inputs, nb):
+	"""
+	Function that splits the input files into byte ranges holding whole
+	reads. The first file is cut near equal sizes and the second file of
+	paired ends data is cut at the same reads (lockstep). Files with an
+	index (see fastq_index) are cut at their indexed reads.
+
+	Takes 2 arguments :
+		- inputs [list] : input files (1 for SE, 2 for PE), not compressed
+		- nb [integer] : number of shards
+
+	Returns:
+		- ranges [list] : for each shard, the (start, end) range of each
+						  input file
+	"""
+
+	size = os.path.getsize(inputs[0])
+
+	# the indexed reads are used as cuts (no reading of the files)
+	indexes = [load_index(filename) for filename in inputs]
+	if(None not in indexes and
+	   len(set((index['step'], index['records']) for index in indexes)) == 1):
+
+		numbers = sorted(set(record_offsets(indexes[0], [size * i // nb
+														 for i in range(1, nb)])))
+		bounds = [[0] + [index['positions'][i][1] for i in numbers if i > 0] +
+				  [os.path.getsize(filename)]
+				  for index, filename in zip(indexes, inputs)]
+
+		return [tuple((bound[i], bound[i+1]) for bound in bounds)
+				for i in range(len(bounds[0]) - 1)]
+
+	with open(inputs[0], 'rb') as fastq:
+		cuts = [record_start(fastq, size * i // nb) for i in range(1, nb)]
+
+	# empty shards are removed
+	cuts = sorted(set(cut for cut in cuts if 0 < cut < size))
+	bounds = [[0] + cuts + [size]]
+
+	if(len(inputs) == 2):
+		lines = count_lines(inputs[0], cuts)
+		bounds.append([0] + line_offsets(inputs[1], lines) +
+					  [os.path.getsize(inputs[1])])
+
+	return [tuple((bound[i], bound[i+1]) for bound in bounds)
+			for i in range(len(cuts) + 1)]
+
+
+
+def copy_range(filename, start, end, fifo):
+	"""
+	Function that writes a byte range of a file into a named pipe (the
+	input of a shard). The copy stops if the pipe is closed by its reader.
+
+	Takes 4 arguments :
+		- filename [string] : the input file
+		- start [integer] : position of the first byte
+		- end [integer] : position after the last byte
+		- fifo [string] : the named pipe
+
+	Returns nothing
+	"""
+
+	try:
+		with open(filename, 'rb') as fastq, open(fifo, 'wb') as out:
+			fastq.seek(start)
+			remaining = end - start
+
+			while remaining > 0:
+				chunk = fastq.read(min(CHUNK_SIZE, remaining))
+				if not chunk:
+					break
+
+				out.write(chunk)
+				remaining -= len(chunk)
+
+	# the trimming of the shard stopped
+	except (IOError, OSError):
+		pass
+
+
+
+def trim_shard(job):
+	"""
+	Function that trims one shard (done by a worker process) : its byte
+	ranges are copied into named pipes read by Trimmomatic or by the native
+	engine.
+
+	Takes one argument :
+		- job [tuple] : the shard commandline, the input files, their byte
+						ranges, the named pipes, the log file and True to
+						use the native engine
+
+	Returns:
+		- 0 [integer] : if the shard has been trimmed
+		or raise an exception (subprocess.CalledProcessError for Trimmomatic)
+	"""
+
+	cmd, inputs, ranges, fifos, log_file, native = job
+
+	copies = []
+	for filename, (start, end), fifo in zip(inputs, ranges, fifos):
+
+		# pipe left by an interrupted run
+		if os.path.lexists(fifo):
+			os.remove(fifo)
+
+		os.mkfifo(fifo)
+
+		copy = threading.Thread(target=copy_range,
+								args=(filename, start, end, fifo))
+		copy.daemon = True
+		copy.start()
+		copies.append(copy)
+
+	try:
+		if native:
+			return launch_native(cmd, log_file)
+
+		with open(log_file, "w") as log:
+			return subprocess.check_call(shlex.split(cmd), stderr=log)
+
+	finally:
+		# copies still waiting for a reader (if the trimming failed) are
+		# released by opening the other side of the pipes
+		for fifo, copy in zip(fifos, copies):
+			while copy.is_alive():
+				try:
+					os.close(os.open(fifo, os.O_RDONLY | os.O_NONBLOCK))
+				except OSError:
+					pass
+
+				copy.join(0.1)
+
+
+
+def record_shard(name, cmd, outputs, future):
+	"""
+	Function that writes a shard in the journal of the run when its trimming
+	is done (called by the pool of processes).
+
+	Takes 4 arguments :
+		- name [string] : name of the shard in the journal
+		- cmd [string] : the shard commandline
+		- outputs [list] : the shard outputs and log file
+		- future [Future] : the trimming of the shard
+
+	Returns nothing
+	"""
+
+	if(not future.cancelled() and future.exception() == None):
+		record_unit(name, cmd, outputs)
+
+
+
+def merge_logs(parts, logs, phred):
+	"""
+	Function that merges the messages of the shards into the messages of a
+	single Trimmomatic run : the messages of the first shard, the encoding
+	detected for the whole input and the sum of the shards summaries.
+
+	Takes 3 arguments :
+		- parts [dict] : the Trimmomatic commandline (see split_commandline)
+		- logs [list] : log files of the shards, in the reads order
+		- phred [integer] : quality encoding detected, or None if given
+
+	Returns:
+		- messages [string] : the messages
+	"""
+
+	name = 'Trimmomatic{0}'.format(parts['layout'])
+	messages = ['{0}: Started with arguments: {1}\n'.format(name,
+											' '.join(parts['arguments']))]
+
+	if(parts['layout'] == 'SE'):
+		summary = re.compile(r'Input Reads: (\d+) Surviving: (\d+)')
+	else :
+		summary = re.compile(r'Input Read Pairs: (\d+) Both Surviving: (\d+) .*'
+							 r' Forward Only Surviving: (\d+) .*'
+							 r' Reverse Only Surviving: (\d+)')
+
+	totals = None
+
+	for i, log_file in enumerate(logs):
+		with open(log_file) as log:
+			lines = log.read().splitlines(True)
+
+		for line in lines[1:]:
+			found = summary.match(line)
+
+			if found:
+				counts = [int(count) for count in found.groups()]
+				if totals == None:
+					totals = counts
+				else :
+					totals = [a + b for a, b in zip(totals, counts)]
+
+			# messages of the adapters loading (the same for all shards)
+			elif(i == 0 and 'Completed successfully' not in line):
+				messages.append(line)
+
+	if phred != None:
+		messages.append('Quality encoding detected as phred{0}\n'.format(phred))
+
+	messages.append(format_summary(parts['layout'], totals))
+	messages.append('{0}: Completed successfully\n'.format(name))
+
+	return ''.join(messages)
+
+
+
+def launch_sharded(cmd, log_file, engine, shards):
+	"""
+	Function that launches a Trimmomatic commandline by shards : the input
+	files are split into byte ranges trimmed at the same time by a pool of
+	processes, and the outputs of the shards are merged in the reads order
+	(compressed if the output names end with .gz or .bz2). The quality
+	encoding is detected once for the whole input. The shards done are
+	written in the journal of the run (see journal).
+
+	Takes 4 arguments :
+		- cmd [string] : the Trimmomatic commandline
+		- log_file [string] : file where Trimmomatic messages are written
+		- engine [string] : 'trimmomatic' or 'native'
+		- shards [integer] : number of shards (and of processes)
+
+	Returns:
+		- 0 [integer] : if the trimming have been done
+		or
+		- None : if the inputs can't be split (compressed files or too few
+				 reads), nothing has been done
+	"""
+
+	parts = split_commandline(cmd)
+
+	# compressed files can't be read from a position
+	for filename in parts['input']:
+		if os.path.splitext(filename)[1] in ('.gz', '.bz2'):
+			return None
+
+	ranges = shard_ranges(parts['input'], shards)
+	if(len(ranges) < 2):
+		return None
+
+	# all shards use the encoding of the whole input
+	phred = None
+	options = list(parts['options'])
+	if parts['phred'] == None:
+		phred = detect_phred(parts['input'][0])
+		options.append('-phred{0}'.format(phred))
+
+	native = engine == 'native' and native_supported(cmd)
+
+	# the native engine would fork its own processes while the named pipes
+	# are open (its inputs would never end) : the shards are its processes
+	if native and '-threads' in options:
+		i = options.index('-threads')
+		del options[i:i+2]
+
+	# shards are written next to the outputs. With a journal, they are kept
+	# until the end of the step, in a directory found again by a new run if
+	# this one is interrupted
+	out_dir = os.path.dirname(os.path.abspath(parts['output'][0]))
+	journal = JOURNAL['file'] != None
+
+	if journal:
+		tmp_dir = '{0}/trimming_shards_{1}'.format(out_dir, hashlib.md5(
+						'{0} {1}'.format(cmd, shards).encode()).hexdigest()[:12])
+		if not os.path.isdir(tmp_dir):
+			os.makedirs(tmp_dir)
+		record_temporary(tmp_dir)
+	else :
+		tmp_dir = tempfile.mkdtemp(prefix='trimming_shards_', dir=out_dir)
+
+	done = False
+
+	try:
+		jobs = []
+		shard_outputs = []
+
+		for i, shard in enumerate(ranges):
+			fifos = ['{0}/shard_{1}_in_{2}.fastq'.format(tmp_dir, i, j + 1)
+					 for j in range(len(parts['input']))]
+			outputs = ['{0}/shard_{1}_out_{2}.fastq'.format(tmp_dir, i, j + 1)
+					   for j in range(len(parts['output']))]
+
+			shard_cmd = ' '.join(parts['program'] + options + fifos + outputs +
+								 parts['steps'])
+
+			jobs.append((shard_cmd, parts['input'], shard, fifos,
+						 '{0}/shard_{1}.out'.format(tmp_dir, i), native))
+			shard_outputs.append(outputs)
+
+		pool = ProcessPoolExecutor(len(jobs))
+		futures = []
+
+		try:
+			for i, (job, outputs) in enumerate(zip(jobs, shard_outputs)):
+				name = '{0}:shard_{1}'.format(log_file, i)
+				shard_cmd = '{0} {1}'.format(job[0], job[2])
+
+				# shard done by the interrupted run
+				if unit_done(name, shard_cmd):
+					futures.append(None)
+					continue
+
+				futures.append(pool.submit(trim_shard, job))
+				futures[-1].add_done_callback(functools.partial(record_shard,
+									name, shard_cmd, outputs + [job[4]]))
+
+			finals = [open_fastq(filename, 'wb') for filename in parts['output']]
+
+			try:
+				# shards are merged in order, as soon as they are done
+				for future, outputs in zip(futures, shard_outputs):
+					if future != None:
+						future.result()
+
+					for final, filename in zip(finals, outputs):
+						with open(filename, 'rb') as shard:
+							shutil.copyfileobj(shard, final, CHUNK_SIZE)
+						if not journal:
+							os.remove(filename)
+
+			finally:
+				for final in finals:
+					final.close()
+
+		finally:
+			for future in futures:
+				if future != None:
+					future.cancel()
+			pool.shutdown()
+
+		messages = merge_logs(parts, [job[4] for job in jobs], phred)
+
+		with open(log_file, "w") as log:
+			log.write(messages)
+
+		done = True
+
+	finally:
+		# the shards done are kept for a new run if this one is interrupted
+		if(done or not journal):
+			shutil.rmtree(tmp_dir, ignore_errors=True)
+
+	return 0
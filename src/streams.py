@@ -0,0 +1,410 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions to read the reads from the standard
+	input and write them to the standard output ('-'), or from and to named
+	pipes, so that the tool can be used inside a shell pipeline : threads
+	copy the streams from and to named pipes given to Trimmomatic. The
+	standard input can be compressed (gzip or bzip2). While the reads are
+	written to the standard output, the messages of the run are written to
+	the standard error. """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+from checking_entries import phred_encoding
+from decompression import member_ended
+
+import atexit
+import bz2
+import errno
+import io
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import threading
+import zlib
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# name of the standard input and of the standard output
+STREAM = '-'
+
+# size of the blocks copied from and to the streams
+COPY_SIZE = 1048576
+
+# lines of a stream read to detect its quality encoding (10000 reads)
+PHRED_LINES = 40000
+
+# streams of the run : the directory of their named pipes, the threads
+# copying them, their errors and the removal of the named pipes at exit
+# ('registered')
+STREAMS = {'dir' : None, 'threads' : [], 'errors' : [], 'registered' : False}
+
+
+
+def is_stream(filename):
+	"""
+	Booleen that checks if a file is a stream : the standard input or output
+	('-'), or a named pipe, a character device or a socket (as '/dev/stdin'
+	or '<(zcat reads.fq.gz)') read or written once, in order.
+
+	Takes one argument :
+		- filename [string] : the file
+
+	Returns:
+		- [bool] : True for a stream
+	"""
+
+	if(filename == STREAM):
+		return True
+
+	try:
+		mode = os.stat(filename).st_mode
+	except (OSError, TypeError):
+		return False
+
+	return not(stat.S_ISREG(mode) or stat.S_ISDIR(mode))
+
+
+
+def stream_mode(arg):
+	"""
+	Booleen that checks if a run reads or writes streams.
+
+	Takes one argument :
+		arg [dict] : dictionnary containning all the command argument entries.
+
+	Returns:
+		- [bool] : True if an input or an output is a stream
+	"""
+
+	inputs = arg['input'] if isinstance(arg['input'], list) else [arg['input']]
+
+	return any(is_stream(filename)
+			   for filename in inputs + (arg.get('outputs') or []))
+
+
+
+class DecompressedStream(io.RawIOBase):
+	"""
+	Compressed stream (gzip or bzip2) decompressed as it is read, member
+	after member (concatenated gzip files, bzip2 files of pbzip2). The
+	files of gzip and bz2 can't read a stream under python 2.
+	"""
+
+	def __init__(self, reads, kind):
+		"""
+		Opens the stream.
+
+		Takes 2 arguments :
+			- reads [file] : the opened stream (compressed)
+			- kind [string] : its compression ('gz' or 'bz2')
+		"""
+
+		io.RawIOBase.__init__(self)
+
+		self.reads = reads
+		self.kind = kind
+		self.member = None
+		self.data = memoryview(b'')
+
+	def new_member(self):
+		"""
+		Gives the decompressor of the next member of the stream.
+		"""
+
+		if(self.kind == 'bz2'):
+			return bz2.BZ2Decompressor()
+
+		return zlib.decompressobj(31)
+
+	def member_ended(self):
+		"""
+		Booleen that checks if the current member has been read up to its
+		end (bz2 raises EOFError once its stream has ended).
+		"""
+
+		if(self.kind == 'gz' or hasattr(self.member, 'eof')):
+			return member_ended(self.member)
+
+		try:
+			self.member.decompress(b'')
+		except EOFError:
+			return True
+
+		return False
+
+	def decompress(self, chunk):
+		"""
+		Decompresses a chunk of the stream : the bytes following the end of
+		a member start the next one.
+		"""
+
+		data = []
+
+		while chunk:
+			if self.member == None:
+				self.member = self.new_member()
+
+			try:
+				data.append(self.member.decompress(chunk))
+			except EOFError:
+				self.member = None
+				continue
+
+			chunk = self.member.unused_data
+			if chunk:
+				self.member = None
+
+		return b''.join(data)
+
+	def readable(self):
+		return True
+
+	def readinto(self, buffer):
+		"""
+		Reads decompressed data into a buffer.
+		"""
+
+		while not len(self.data):
+			chunk = self.reads.read1(COPY_SIZE)
+
+			if not chunk:
+				if(self.member != None and not self.member_ended()):
+					raise EOFError("the compressed stream is truncated")
+				return 0
+
+			self.data = memoryview(self.decompress(chunk))
+
+		size = min(len(buffer), len(self.data))
+		buffer[:size] = self.data[:size]
+		self.data = self.data[size:]
+
+		return size
+
+	def close(self):
+		"""
+		Closes the stream.
+		"""
+
+		if not self.closed:
+			self.reads.close()
+
+		io.RawIOBase.close(self)
+
+
+
+def open_stream(source):
+	"""
+	Function that opens a stream to read it (a gzip or bzip2 stream, found
+	from its first bytes, is decompressed).
+
+	Takes one argument :
+		- source [string] : the stream ('-' for the standard input)
+
+	Returns:
+		- reads [file] : the opened stream
+	"""
+
+	# the standard input in bytes (sys.stdin.buffer is python 3 only)
+	if(source == STREAM):
+		reads = getattr(sys.stdin, 'buffer', None)
+		if reads == None:
+			reads = io.open(sys.stdin.fileno(), 'rb', closefd=False)
+	else :
+		reads = io.open(source, 'rb')
+
+	magic = reads.peek(3)[:3]
+	if magic.startswith(b'\x1f\x8b'):
+		reads = io.BufferedReader(DecompressedStream(reads, 'gz'), COPY_SIZE)
+	elif(magic == b'BZh'):
+		reads = io.BufferedReader(DecompressedStream(reads, 'bz2'), COPY_SIZE)
+
+	return reads
+
+
+
+def feed_pipe(reads, head, fifo):
+	"""
+	Function that copies a stream into a named pipe read by Trimmomatic. An
+	error is kept in STREAMS['errors'].
+
+	Takes 3 arguments :
+		- reads [file] : the opened stream (see open_stream)
+		- head [list] : the lines already read from the stream
+		- fifo [string] : the named pipe
+
+	Returns nothing
+	"""
+
+	try:
+		with open(fifo, 'wb') as out:
+			out.write(b''.join(head))
+			shutil.copyfileobj(reads, out, COPY_SIZE)
+
+	# Trimmomatic stopping its reading is its own error
+	except (IOError, OSError, EOFError) as error:
+		if(getattr(error, 'errno', None) != errno.EPIPE):
+			STREAMS['errors'].append(error)
+
+
+
+def drain_pipe(fifo, descriptor):
+	"""
+	Function that copies the reads written by Trimmomatic into a named pipe
+	to the standard output. An error is kept in STREAMS['errors'].
+
+	Takes 2 arguments :
+		- fifo [string] : the named pipe
+		- descriptor [integer] : the file descriptor of the standard output
+
+	Returns nothing
+	"""
+
+	try:
+		with open(fifo, 'rb') as reads:
+			with os.fdopen(descriptor, 'wb') as out:
+				shutil.copyfileobj(reads, out, COPY_SIZE)
+
+	except (IOError, OSError) as error:
+		STREAMS['errors'].append(error)
+
+
+
+def start_copy(target, args):
+	"""
+	Function that starts a thread copying a stream (it waits for Trimmomatic
+	to open its named pipe).
+
+	Takes 2 arguments :
+		- target [function] : feed_pipe or drain_pipe
+		- args [tuple] : the arguments of the function
+
+	Returns nothing
+	"""
+
+	thread = threading.Thread(target=target, args=args)
+	thread.daemon = True
+	thread.start()
+
+	STREAMS['threads'].append(thread)
+
+
+
+def open_streams(arg):
+	"""
+	Function that replaces the streams of the inputs ('-' and named pipes
+	not readable by Trimmomatic, as the ones of a shell) and the standard
+	output ('-') by named pipes copied by threads. The quality encoding is
+	detected from the first reads of the first stream (a stream can't be
+	read twice). The named pipes given as outputs are written by Trimmomatic
+	itself. With the standard output, the messages of the run (and of java)
+	are written to the standard error.
+
+	Takes one argument :
+		arg [dict] : dictionnary containning all the command argument entries.
+
+	Returns:
+		arg [dict] : the arguments with the named pipes
+	"""
+
+	STREAMS['dir'] = tempfile.mkdtemp(prefix='trimming_streams_')
+	STREAMS['threads'] = []
+	STREAMS['errors'] = []
+
+	# registered once for all the runs of the interpreter
+	if not STREAMS['registered']:
+		atexit.register(remove_streams)
+		STREAMS['registered'] = True
+
+	inputs = arg['input'] if isinstance(arg['input'], list) else [arg['input']]
+
+	for i, filename in enumerate(inputs):
+		if is_stream(filename):
+			name = 'stdin' if filename == STREAM else 'stream_{0}'.format(i + 1)
+			fifo = os.path.join(STREAMS['dir'], '{0}.fastq'.format(name))
+			os.mkfifo(fifo)
+
+			try:
+				reads = open_stream(filename)
+				head = [reads.readline() for line in range(PHRED_LINES)]
+			except (IOError, OSError, EOFError) as error:
+				sys.exit("Error : The stream '{0}' can't be read ({1}).".format(
+															filename, error))
+
+			if(arg.get('phred') == None):
+				arg['phred'] = phred_encoding(head, filename)
+
+			start_copy(feed_pipe, (reads, head, fifo))
+			inputs[i] = fifo
+
+	arg['input'] = inputs if isinstance(arg['input'], list) else inputs[0]
+
+	outputs = arg.get('outputs') or []
+
+	if(STREAM in outputs):
+		# the standard output is kept for the reads, the messages go to
+		# the standard error
+		sys.stdout.flush()
+		descriptor = os.dup(sys.stdout.fileno())
+		os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+		fifo = os.path.join(STREAMS['dir'], 'stdout.fastq')
+		if(arg.get('compress') != None):
+			fifo += '.{0}'.format(arg['compress'])
+		os.mkfifo(fifo)
+
+		start_copy(drain_pipe, (fifo, descriptor))
+		outputs[outputs.index(STREAM)] = fifo
+
+	return arg
+
+
+
+def remove_streams():
+	"""
+	Function that removes the named pipes of the streams.
+
+	Don't takes any argument
+
+	Returns nothing
+	"""
+
+	if STREAMS['dir'] != None:
+		shutil.rmtree(STREAMS['dir'], ignore_errors=True)
+		STREAMS['dir'] = None
+
+
+
+def close_streams():
+	"""
+	Function that waits for the end of the copies of the streams (all the
+	reads are written to the standard output) and removes their named pipes.
+
+	Don't takes any argument
+
+	Returns nothing
+	"""
+
+	for thread in STREAMS['threads']:
+		thread.join()
+
+	remove_streams()
+
+	if STREAMS['errors']:
+		sys.exit("Error : A stream can't be copied ({0}).".format(
+														STREAMS['errors'][0]))
@@ -0,0 +1,374 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions to gather the statistics of a run :
+	the summary written by Trimmomatic (or the native engine) at the end of
+	each step is read as soon as the step ends, with the time of the step.
+	The steps are merged into a file 'trim_stats.json' of the working
+	directory (written again after each step), and the samples of a batch
+	into a file 'batch_stats.json'. """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+import json
+import os
+import re
+import tempfile
+import time
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# name of the statistics of a run, in the working directory
+STATS_FILE = 'trim_stats.json'
+
+# name of the statistics of a batch, in the directory of the batch
+BATCH_STATS_FILE = 'batch_stats.json'
+
+# summary line written at the end of a step, for each layout
+SUMMARIES = {'SE' : re.compile(r'Input Reads: (\d+) Surviving: (\d+) .*'
+							   r'Dropped: (\d+)'),
+			 'PE' : re.compile(r'Input Read Pairs: (\d+) Both Surviving: (\d+) '
+							   r'.*Forward Only Surviving: (\d+) .*'
+							   r'Reverse Only Surviving: (\d+) .*Dropped: (\d+)')}
+
+# counts of the summary line, for each layout
+COUNTS = {'SE' : ['input', 'surviving', 'dropped'],
+		  'PE' : ['input', 'both_surviving', 'forward_only', 'reverse_only',
+				  'dropped']}
+
+# statistics of the run : its file (None without statistics), its input
+# files, its start time, the steps done ('steps') and the steps of the
+# previous statistics of the working directory ('previous')
+STATS = {'file' : None, 'inputs' : [], 'start' : None, 'steps' : [],
+		 'previous' : {}}
+
+
+
+def parse_log(log_file):
+	"""
+	Function that reads the summary written at the end of a step in its log
+	file.
+
+	Takes one argument :
+		- log_file [string] : file where Trimmomatic messages are written
+
+	Returns:
+		- counts [dict] : the layout ('layout') and the number of reads
+						  (input, surviving and dropped reads for single
+						  ends data, input, both surviving, forward only,
+						  reverse only and dropped pairs for paired ends
+						  data), or None if the log has no summary
+	"""
+
+	if not os.path.isfile(log_file):
+		return None
+
+	with open(log_file) as log:
+		for line in log:
+			for layout, summary in SUMMARIES.items():
+				found = summary.match(line)
+
+				if found:
+					counts = dict(zip(COUNTS[layout],
+									  [int(count) for count in found.groups()]))
+					counts['layout'] = layout
+					return counts
+
+	return None
+
+
+
+def reads_per_second(reads, elapsed):
+	"""
+	Function that computes the throughput of a trimming.
+
+	Takes 2 arguments :
+		- reads [integer] : number of input reads (or pairs)
+		- elapsed [float] : time of the trimming, in seconds (or None)
+
+	Returns:
+		- [float] : the reads (or pairs) trimmed per second, or None
+	"""
+
+	if(elapsed == None or elapsed <= 0):
+		return None
+
+	return round(reads / elapsed, 1)
+
+
+
+def step_stats(log_file, elapsed, origin):
+	"""
+	Function that gets the statistics of a step from its log file.
+
+	Takes 3 arguments :
+		- log_file [string] : file where Trimmomatic messages are written
+		- elapsed [float] : time of the step, in seconds
+		- origin [string] : 'trimmed', 'cache' (taken from the cache) or
+							'resumed' (done by an interrupted run)
+
+	Returns:
+		- step [dict] : the counts of the step (see parse_log), its log file,
+						origin, time and throughput, or None if the log has
+						no summary
+	"""
+
+	step = parse_log(log_file)
+
+	if step == None:
+		return None
+
+	step.update({'log' : os.path.basename(log_file), 'origin' : origin,
+				 'elapsed' : round(elapsed, 3) if elapsed != None else None,
+				 'reads_per_second' : reads_per_second(step['input'], elapsed)})
+
+	return step
+
+
+
+def sample_stats(inputs, steps, elapsed):
+	"""
+	Function that merges the statistics of the steps of a sample : the input
+	reads of the first step, the surviving reads of the last one (with the
+	singleton reads of step 1 trimmed apart).
+
+	Takes 3 arguments :
+		- inputs [list] : the input files (or the file of single ends data)
+		- steps [list] : the statistics of the steps, in order (see
+						 step_stats)
+		- elapsed [float] : time of the whole trimming, in seconds
+
+	Returns:
+		- stats [dict] : the input files, layout, counts, survival (percent
+						 of the input reads surviving in all outputs), time,
+						 throughput and steps of the sample
+	"""
+
+	if isinstance(inputs, str):
+		inputs = [inputs]
+
+	stats = {'input_files' : [os.path.abspath(filename) for filename in inputs],
+			 'steps' : steps, 'elapsed' : round(elapsed, 3)}
+
+	if not steps:
+		return stats
+
+	last = [step for step in steps if 'singletons' not in step][-1]
+	layout = last['layout']
+	stats['layout'] = layout
+
+	for count in COUNTS[layout]:
+		stats[count] = last[count]
+
+	for step in steps:
+		if 'singletons' in step:
+			stats[step['singletons']] += step['surviving']
+
+	stats['input'] = steps[0]['input']
+	surviving = sum(stats[count] for count in COUNTS[layout][1:-1])
+	stats['dropped'] = stats['input'] - surviving
+
+	stats['survival'] = (round(100.0 * surviving / stats['input'], 2)
+						 if stats['input'] else 0.0)
+	stats['reads_per_second'] = reads_per_second(stats['input'], elapsed)
+
+	return stats
+
+
+
+def write_stats(filename, stats):
+	"""
+	Function that writes statistics as a JSON file (at once : a file being
+	read is never half written).
+
+	Takes 2 arguments :
+		- filename [string] : the JSON file
+		- stats [dict] : the statistics
+
+	Returns nothing
+	"""
+
+	directory = os.path.dirname(os.path.abspath(filename))
+	tmp, tmp_name = tempfile.mkstemp(dir=directory)
+
+	with os.fdopen(tmp, 'w') as out:
+		json.dump(stats, out, indent=1, sort_keys=True)
+
+	os.chmod(tmp_name, 0o644)
+	os.rename(tmp_name, filename)
+
+
+
+def open_stats(directory, inputs):
+	"""
+	Function that starts the statistics of the run. The steps of the
+	previous statistics of the working directory are kept for the steps
+	resumed from an interrupted run (see journal).
+
+	Takes 2 arguments :
+		- directory [string] : the working directory
+		- inputs [list] : the input files (or the file of single ends data)
+
+	Returns nothing
+	"""
+
+	STATS['file'] = os.path.join(os.path.abspath(directory), STATS_FILE)
+	STATS['inputs'] = inputs
+	STATS['start'] = time.time()
+	STATS['steps'] = []
+	STATS['previous'] = {}
+
+	try:
+		with open(STATS['file']) as previous:
+			for step in json.load(previous).get('steps', []):
+				STATS['previous'][step['log']] = step
+	except (IOError, ValueError, KeyError, AttributeError):
+		pass
+
+
+
+def record_step(log_file, elapsed, origin, singletons=None):
+	"""
+	Function that adds a step just ended to the statistics of the run, and
+	writes them. A resumed step keeps the time of the interrupted run.
+
+	Takes 4 arguments :
+		- log_file [string] : file where Trimmomatic messages are written
+		- elapsed [float] : time of the step, in seconds
+		- origin [string] : 'trimmed', 'cache' or 'resumed'
+		- singletons [string] : for a step trimming the singleton reads of
+								step 1 apart, the count of the run its
+								surviving reads are added to
+								('forward_only' or 'reverse_only')
+
+	Returns nothing
+	"""
+
+	if STATS['file'] == None:
+		return
+
+	if(origin == 'resumed'):
+		elapsed = STATS['previous'].get(os.path.basename(log_file),
+										{}).get('elapsed')
+
+	step = step_stats(log_file, elapsed, origin)
+
+	if step != None:
+		if singletons != None:
+			step['singletons'] = singletons
+
+		STATS['steps'].append(step)
+		save_stats('running')
+
+
+
+def save_stats(state):
+	"""
+	Function that writes the statistics of the run. The time of the run
+	counts the time of its resumed steps.
+
+	Takes one argument :
+		- state [string] : 'running', or 'done' at the end of the run
+
+	Returns:
+		- stats [dict] : the statistics of the run
+	"""
+
+	elapsed = time.time() - STATS['start']
+	elapsed += sum(step['elapsed'] or 0 for step in STATS['steps']
+				   if step['origin'] == 'resumed')
+
+	stats = sample_stats(STATS['inputs'], STATS['steps'], elapsed)
+	stats['state'] = state
+
+	write_stats(STATS['file'], stats)
+
+	return stats
+
+
+
+def close_stats():
+	"""
+	Function that writes the statistics of the run done.
+
+	Don't takes any argument
+
+	Returns:
+		- stats [dict] : the statistics of the run (None if not started)
+	"""
+
+	stats = None
+
+	if STATS['file'] != None:
+		stats = save_stats('done')
+
+	STATS['file'] = None
+
+	return stats
+
+
+
+def batch_stats(results, filename):
+	"""
+	Function that rolls up the statistics of the samples of a batch (read in
+	the file 'trim_stats.json' of their working directory) and writes them.
+
+	Takes 2 arguments :
+		- results [list] : for each sample, its name, working directory,
+						   state ('done' or 'failed') and time, in seconds
+		- filename [string] : the JSON file of the batch
+
+	Returns:
+		- stats [dict] : the statistics of the batch
+	"""
+
+	samples = []
+	totals = {'input' : 0, 'surviving' : 0, 'dropped' : 0, 'elapsed' : 0.0}
+
+	for name, directory, state, elapsed in results:
+		sample = {'name' : name, 'directory' : os.path.abspath(directory),
+				  'state' : state, 'elapsed' : round(elapsed, 3)}
+
+		try:
+			with open(os.path.join(directory, STATS_FILE)) as stats:
+				sample['stats'] = json.load(stats)
+		except (IOError, ValueError):
+			sample['stats'] = None
+
+		if(sample['stats'] != None and 'layout' in sample['stats']):
+			stats = sample['stats']
+			totals['input'] += stats['input']
+			totals['surviving'] += stats['input'] - stats['dropped']
+			totals['dropped'] += stats['dropped']
+			totals['elapsed'] += stats['elapsed']
+
+			sample['survival'] = stats['survival']
+			sample['reads_per_second'] = stats['reads_per_second']
+
+		samples.append(sample)
+
+	totals['elapsed'] = round(totals['elapsed'], 3)
+	totals['survival'] = (round(100.0 * totals['surviving'] / totals['input'], 2)
+						  if totals['input'] else 0.0)
+	totals['reads_per_second'] = reads_per_second(totals['input'],
+												  totals['elapsed'])
+
+	stats = {'samples' : samples, 'totals' : totals,
+			 'failed' : [sample['name'] for sample in samples
+						 if sample['state'] != 'done']}
+
+	write_stats(filename, stats)
+
+	return stats
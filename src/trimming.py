@@ -0,0 +1,793 @@
+#! /usr/bin/env python
+# -*- coding: utf8 -*-
+
+""" This script is a module for the main script that launch Trimmomatic (an
+	adapteur and quality trimming tool for high throughput sequencing data).
+
+	This module contains all functions to run a trimming from the checked
+	commandline arguments (used by the main script), and the entry point of
+	the tool as a python library : trim(config) trims the reads inside the
+	interpreter, without 'sys.exit' nor argv, and gives the output files,
+	the statistics and the timings of the run (TrimResult). A trimming run
+	by trim writes its messages, statistics and trace in its output
+	directory, not in the working directory ; it can be called many times by
+	a long-lived interpreter (one trimming at a time). """
+
+__author__ = "Anita Annamalé"
+__version__  = "0.0.1"
+__copyright__ = "copyleft"
+__date__ = "2015/05"
+
+
+#-------------------------- Modules Importation -------------------------------#
+
+
+from parseXML import *
+from argparse_commandline import *
+from named_pipes import *
+from native_engine import *
+from sharding import *
+from result_cache import *
+from journal import *
+from trim_stats import *
+from profiling import *
+from resources import *
+from class_sharing import *
+from scratch import *
+from streams import *
+from interleaved import *
+
+import collections
+import copy
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+#------------------------- Definition Of Functions ----------------------------#
+
+
+# location of the 'src' directory
+LOCATION = os.path.dirname(os.path.abspath(__file__))
+
+# options of the commandline which are not trimmings (other ways to launch
+# the tool), refused by trim
+TRIM_OPTIONS_REFUSED = ['XML', 'batch', 'daemon', 'workers', 'submit',
+						'priority', 'profile']
+
+# trimming parameters of the XML configuration file and their options of
+# the commandline
+XML_OPTIONS = {'clip' : 'illuminaclip', 'SW' : 'slidingwindow',
+			   'MI' : 'maxinfo', 'Lead' : 'leading', 'Tail' : 'trailing',
+			   'Crop' : 'crop', 'Headcrop' : 'headcrop', 'Minlen' : 'minlen',
+			   'Avgqual' : 'avgqual', 'threads' : 'threads',
+			   'compress' : 'compress'}
+
+# options of the commandline used with the XML configuration file (how the
+# trimming is run, not what it does)
+XML_RUN_OPTIONS = ['two_step', 'engine', 'shards', 'index', 'cache',
+				   'cache_size', 'chrome_trace', 'no_class_sharing', 'scratch',
+				   'memory']
+
+# result of a trimming run by trim : the output files, the statistics of
+# the run (as 'trim_stats.json') and its timings (as 'trimming_trace.json')
+TrimResult = collections.namedtuple('TrimResult', ['outputs', 'stats',
+												   'timings'])
+
+
+
+class TrimConfig(dict):
+	"""
+	Parameters of a trimming checked by config_arguments (the commandline
+	arguments) : trim runs them without checking them again.
+	"""
+
+
+
+class TrimError(Exception):
+	"""
+	Error of a trimming run by trim : wrong parameters, or a run which
+	failed (with the message of the main script, as "Error : ...").
+	"""
+
+
+
+def log_path(directory, step):
+	"""
+	Function that gives the file where the Trimmomatic messages of a step
+	are written.
+
+	Takes 2 arguments :
+		- directory [string] : the directory of the run ('.' for the working
+							   directory)
+		- step [string] : 'fused', 'step1', 'step2' or 'step2_single1' and
+						  'step2_single2' (singleton reads of step 1)
+
+	Returns:
+		- [string] : the log file ('output_file_<step>.out')
+	"""
+
+	return os.path.normpath(os.path.join(directory,
+										 'output_file_{0}.out'.format(step)))
+
+
+
+def launch_step(cmd, log_file, engine, shards, singletons=None):
+	"""
+	Function that launch a Trimmomatic commandline and write Trimmomatic
+	messages (standard error) into a log file. A step done by an interrupted
+	run is not done again (see journal), and a trimming already done with
+	the same inputs and parameters is taken from the cache (if any, see
+	result_cache). The statistics of the step are added to the ones of the
+	run (see trim_stats), and its time to the trace of the run (see
+	profiling).
+
+	Takes 5 arguments :
+		- cmd [string] : the Trimmomatic commandline
+		- log_file [string] : file where Trimmomatic messages are written
+		- engine [string] : 'trimmomatic' or 'native'
+		- shards [integer] : number of parts of the input files trimmed at
+							 the same time (1 to trim them at once)
+		- singletons [string] : for the singleton reads of step 1, the count
+								of the run their surviving reads are added
+								to (see record_step)
+
+	Returns:
+		- prog [integer] : Trimmomatic return code (0, or an exception is
+						   raised)
+	"""
+
+	start = clock()
+
+	# step done by the interrupted run
+	if unit_done(log_file, cmd):
+		sys.stdout.write("Step '{0}' already done.\n".format(log_file))
+		record_step(log_file, None, 'resumed', singletons)
+		record_phase(log_file, 'trimming', start, clock(),
+					 {'origin' : 'resumed'})
+		return 0
+
+	# trimming already done
+	with phase('cache key', 'files', {'log' : log_file}):
+		key = cache_key(cmd, engine)
+
+	if(key != None and restore_result(key, cmd, log_file)):
+		record_unit(log_file, cmd, split_commandline(cmd)['output'] + [log_file])
+		record_step(log_file, clock() - start, 'cache', singletons)
+		record_phase(log_file, 'trimming', start, clock(), {'origin' : 'cache'})
+		return 0
+
+	# cached outputs are not overwritten
+	release_outputs(cmd)
+
+	prog = trim_step(cmd, log_file, engine, shards)
+
+	if(key != None):
+		with phase('cache store', 'files', {'log' : log_file}):
+			store_result(key, cmd, log_file)
+
+	record_unit(log_file, cmd, split_commandline(cmd)['output'] + [log_file])
+	record_step(log_file, clock() - start, 'trimmed', singletons)
+	record_phase(log_file, 'trimming', start, clock(), {'origin' : 'trimmed'})
+
+	return prog
+
+
+
+def trim_step(cmd, log_file, engine, shards):
+	"""
+	Function that trims the reads of a Trimmomatic commandline (by shards,
+	by the native engine or by Trimmomatic).
+
+	Takes 4 arguments :
+		- cmd [string] : the Trimmomatic commandline
+		- log_file [string] : file where Trimmomatic messages are written
+		- engine [string] : 'trimmomatic' or 'native'. The native engine is
+							used only if it can do all the trimming steps.
+		- shards [integer] : number of parts of the input files trimmed at
+							 the same time (1 to trim them at once)
+
+	Returns:
+		- prog [integer] : Trimmomatic return code (0, or an exception is
+						   raised)
+	"""
+
+	# trimming of parts of the input files by several processes
+	if(shards > 1 and sharding_available()):
+		prog = launch_sharded(cmd, log_file, engine, shards)
+		if prog != None:
+			return prog
+
+	# trimming without java
+	if(engine == 'native' and native_supported(cmd)):
+		return launch_native(cmd, log_file)
+
+	# compressed outputs are compressed by several threads
+	cmd, pipes = compression_pipes(cmd)
+
+	# split the commandline
+	args = shlex.split(cmd)
+
+	# launch Trimmomatic (the time java takes to start is traced)
+	try:
+		with open(log_file, "w") as out:
+			start = clock()
+			process = subprocess.Popen(args, stderr=out)
+			wait_first_output(process, log_file, start)
+			prog = process.wait()
+
+		if(prog != 0):
+			raise subprocess.CalledProcessError(prog, args)
+
+	finally:
+		remove_compression_pipes(pipes)
+		restore_output_names(log_file, pipes)
+
+	return prog
+
+
+
+def append_reads(filename, output):
+	"""
+	Function that adds the reads of a file at the end of an output file
+	(compressed reads are added as new gzip members or bzip2 streams). An
+	output linked to the cache is copied first : the cache is not changed.
+
+	Takes 2 arguments :
+		- filename [string] : the reads added
+		- output [string] : the output file
+
+	Returns nothing
+	"""
+
+	if(os.stat(output).st_nlink > 1):
+		tmp, tmp_name = tempfile.mkstemp(dir=os.path.dirname(
+												os.path.abspath(output)))
+		os.close(tmp)
+		shutil.copy2(output, tmp_name)
+		os.rename(tmp_name, output)
+
+	with open(filename, 'rb') as reads, open(output, 'ab') as out:
+		shutil.copyfileobj(reads, out)
+
+
+
+def trim_singletons(loc, arguments, inout, cmd, log_file, directory):
+	"""
+	Function that trims the singleton reads of step 1 (paired ends data
+	trimmed in two steps : the reads whose mate is removed by the adapter
+	trimming) with the quality trimming of step 2, and adds them to the
+	singleton reads written by step 2 : two steps keep the same reads as a
+	single pass.
+
+	Takes 6 arguments :
+		- loc [string] : location of the 'src' directory
+		- arguments [dict] : dictionnary containning all the command argument
+							 entries of step 2
+		- inout [dict] : dictionnary containning the files of the steps (the
+						 singleton reads of step 1 in inout['single'])
+		- cmd [string] : step 2 commandline
+		- log_file [string] : file where step 2 messages are written
+		- directory [string] : the directory of the run
+
+	Returns:
+		- inout [dict] : with the trimmed singleton reads of step 1
+						 ('single_trimmed', removed with the temporary
+						 files : step 2 done again by a resumed run needs
+						 them again)
+	"""
+
+	if 'single' not in inout:
+		return inout
+
+	inout['single_trimmed'] = []
+
+	# singleton reads of step 2 (forward, then reverse)
+	outputs = split_commandline(cmd)['output']
+
+	# step 1 doesn't change the quality encoding of the reads
+	phred = arguments.get('phred')
+	if phred == None:
+		phred = detect_phred(arguments['input'][0])
+
+	for i, count in enumerate(['forward_only', 'reverse_only']):
+		single, final = inout['single'][i], outputs[2 * i + 1]
+
+		if(not os.path.isfile(single) or os.path.getsize(single) == 0
+		   or not os.path.isfile(final)):
+			continue
+
+		trimmed = '{0}/trimmed_{1}'.format(os.path.dirname(single),
+										   os.path.basename(final))
+		inout['single_trimmed'].append(trimmed)
+
+		single_arguments = dict(arguments)
+		single_arguments.update({'layout' : 'SE', 'input' : single,
+								 'outputs' : [trimmed], 'phred' : phred})
+
+		with phase('singletons commandline', 'commandline'):
+			single_cmd = argparse_commandline_step_2(loc, single_arguments, 0,
+													 dict())
+
+		launch_step(single_cmd, log_path(directory,
+										 'step2_single{0}'.format(i + 1)),
+					arguments['engine'], 1, count)
+
+		# added once : step 2 done again writes its singleton reads again
+		name = 'singletons {0}'.format(os.path.abspath(final))
+		if not unit_done(name, None):
+			with phase('add singletons', 'files'):
+				append_reads(trimmed, final)
+				record_unit(name, None, [final])
+				refresh_unit(log_file)
+
+	return inout
+
+
+
+def check_run(arguments):
+	"""
+	Function that checks the options of the run which are not checked with
+	the trimming steps (engine, shards, threads, memory and cache).
+
+	Takes one argument :
+		arguments [dict] : dictionnary containning all the command argument
+						   entries.
+
+	Returns:
+		- 1 [integer] : if the options are right
+		or
+		quit
+	"""
+
+	# the native engine needs numpy
+	if(arguments['engine'] == 'native' and not native_engine_available()):
+		sys.exit("Error : The native engine needs the python module numpy \
+(or use '--engine trimmomatic').")
+
+	if(arguments['shards'] < 1):
+		sys.exit("Error : The number of shards must be at least 1.")
+
+	if(arguments['threads'] not in (None, AUTO) and arguments['threads'] < 1):
+		sys.exit("Error : The number of threads must be at least 1.")
+
+	if(arguments['memory'] != None and arguments['memory'] < 1):
+		sys.exit("Error : The memory must be at least 1 MB.")
+
+	if(arguments['cache_size'] <= 0):
+		sys.exit("Error : The size of the cache must be positive.")
+
+	return 1
+
+
+
+def open_run(arguments):
+	"""
+	Function that prepares a run from the checked arguments : the streams
+	(and interleaved reads) are trimmed in a single pass, the threads and
+	the memory of java are chosen, and the compression of the outputs.
+
+	Takes one argument :
+		arguments [dict] : dictionnary containning all the command argument
+						   entries (see check_args)
+
+	Returns:
+		- streaming [bool] : True if the run reads or writes streams, or
+							 interleaved reads
+	"""
+
+	# reads read from the standard input (or named pipes) or written to
+	# the standard output are trimmed in a single pass, without journal
+	# nor cache (streams are read once), as interleaved reads (split
+	# into named pipes)
+	streaming = stream_mode(arguments) or arguments['interleaved'] != None
+
+	if streaming:
+
+		if(arguments['shards'] > 1 or arguments['two_step'] != None
+		   or arguments['cache'] != None):
+			sys.stderr.write("Warning : Streams are trimmed in a single \
+pass, without shards, two steps nor cache.\n")
+
+		arguments = open_streams(arguments)
+		arguments['shards'] = 1
+		arguments['two_step'] = None
+		set_cache(None, arguments['cache_size'])
+
+	# threads and memory of java chosen from the resources if asked
+	arguments['threads'] = size_run(arguments['input'],
+									arguments['threads'],
+									arguments['memory'],
+									arguments['shards'])
+
+	# compressed outputs are compressed by all the threads
+	set_compression(arguments['threads'], 'bgzf' in arguments)
+
+	return streaming
+
+
+
+def run_trimming(arguments, loc, streaming, directory):
+	"""
+	Function that runs the trimming steps of the checked arguments (see
+	open_run) : in a single pass if both trimming are asked, else in two
+	steps (through named pipes, or through intermediate files). The journal,
+	the statistics and the log files of the steps are written in the
+	directory of the run.
+
+	Takes 4 arguments :
+		arguments [dict] : dictionnary containning all the command argument
+						   entries
+		- loc [string] : location of the 'src' directory
+		- streaming [bool] : True for a run reading or writing streams (see
+							 open_run)
+		- directory [string] : the directory of the run ('.' for the
+							   working directory)
+
+	Returns:
+		- outputs [list] : the output files of the run
+		- stats [dict] : the statistics of the run (see trim_stats)
+	"""
+
+	# interleaved pairs are split for Trimmomatic, and interleaved again
+	interleaved = None
+	if(arguments['interleaved'] != None):
+		interleaved = interleaved_outputs(arguments)
+		arguments = open_interleaved(arguments)
+
+	# java is started with the class data sharing archive of Trimmomatic
+	if(arguments['no_class_sharing'] == None):
+		with phase('class sharing', 'java'):
+			open_class_sharing(loc)
+	else :
+		SHARING['options'] = []
+
+	with phase('open journal', 'setup'):
+		# steps done by an interrupted run are not done again
+		if not streaming:
+			open_journal(directory, arguments, arguments['input'])
+
+		# statistics of the steps, written after each step
+		open_stats(directory, arguments['input'])
+
+	# initializing nb to 0
+	nb = 0
+
+	# creating io [dict()] which will contain created files.
+	io= dict()
+
+	# the last commandline gives the output files of the run
+	cmd_last = None
+
+	# generating the fused (adapter and quality trimming) commandline. With
+	# a cache, both steps are done (and kept) apart : a run changing only
+	# the quality trimming reuses the adapter trimming
+	cmd_fused = None
+	if(arguments['two_step'] == None and CACHE['dir'] == None):
+		with phase('fused commandline', 'commandline'):
+			cmd_fused = argparse_commandline_fused(loc, arguments, nb, io)
+
+	# If both trimming are asked, do them in a single Trimmomatic pass
+	if(cmd_fused != None):
+		launch_step(cmd_fused, log_path(directory, 'fused'),
+					arguments['engine'], arguments['shards'])
+		cmd_last = cmd_fused
+
+	# If both trimming are asked in two steps, stream step1 outputs into
+	# step2 through named pipes (both steps are running at the same time)
+	elif(arguments['illuminaclip'] != None and
+		argparsecmd_quality(arguments,"test") != None and
+		arguments['engine'] == 'trimmomatic' and
+		named_pipes_available() and CACHE['dir'] == None):
+
+		log_1 = log_path(directory, 'step1')
+		log_2 = log_path(directory, 'step2')
+
+		# step1 outputs are written into pipes read by step2
+		with phase('piped commandlines', 'commandline'):
+			arguments_1, arguments_2 = pipe_parameters(arguments)
+			cmd_step1 = argparse_commandline_step_1(loc,arguments_1,nb,io)
+			pipes, io = create_step_pipes(io, arguments_1['output'],
+							scratch_directory(arguments['scratch'],
+											  arguments['output'],
+											  arguments['input']))
+			cmd_step2 = argparse_commandline_step_2(loc,arguments_2,1,io)
+
+			for filename in io.get('single', []):
+				record_temporary(filename)
+
+		# launch both steps (unless done by the interrupted run)
+		if unit_done(log_2, None):
+			remove_step_pipes(pipes)
+			record_step(log_1, None, 'resumed')
+			record_step(log_2, None, 'resumed')
+		else :
+			start = clock()
+			launch_piped_steps(cmd_step1, cmd_step2, pipes, log_1, log_2)
+			record_unit(log_2, None,
+						split_commandline(cmd_step2)['output'] + [log_1, log_2])
+
+			# both steps run at the same time
+			record_step(log_1, clock() - start, 'trimmed')
+			record_step(log_2, clock() - start, 'trimmed')
+			record_phase('piped steps', 'trimming', start, clock())
+
+		# the singleton reads of step1 are trimmed apart
+		io = trim_singletons(loc, arguments_2, io, cmd_step2, log_2, directory)
+
+		with phase('remove temporary files', 'files'):
+			remove_temporary_files(io)
+
+		cmd_last = cmd_step2
+
+	else:
+
+		# step1 outputs read by step2 are written in the scratch
+		# directory, without compression
+		arguments_1 = arguments
+		if(arguments['illuminaclip'] != None
+		   and argparsecmd_quality(arguments,"test") != None):
+			arguments_1 = intermediate_parameters(arguments,
+												  arguments['scratch'])
+
+		# generating step1 (adapter trimming) commandline
+		with phase('step1 commandline', 'commandline'):
+			cmd_step1 = argparse_commandline_step_1(loc,arguments_1, nb,io)
+
+		# If Adapter Trimming
+		if(cmd_step1 != None):
+
+			# launch step1
+			launch_step(cmd_step1, log_path(directory, 'step1'),
+						arguments['engine'], arguments['shards'])
+			cmd_last = cmd_step1
+
+			# nb become 1 (first step done)
+			nb=1
+
+
+		# If Quality Trimming step
+		tmp_cmd="test"
+		if(argparsecmd_quality(arguments,tmp_cmd)!=None):
+
+			if(nb==1):
+				# change step1 output files to step2 input files
+				with phase('rename outputs', 'files'):
+					io = change_output_as_input(io, arguments_1)
+
+			# generating step2 (quality trimming) commandline
+			with phase('step2 commandline', 'commandline'):
+				cmd_step2 = argparse_commandline_step_2(loc,arguments, nb,
+														io)
+
+			# launch step2
+			launch_step(cmd_step2, log_path(directory, 'step2'),
+						arguments['engine'], arguments['shards'])
+			cmd_last = cmd_step2
+
+			if(nb==1):
+				# the singleton reads of step1 are trimmed apart
+				io = trim_singletons(loc, arguments, io, cmd_step2,
+									 log_path(directory, 'step2'), directory)
+
+				# delete temporary files
+				with phase('remove temporary files', 'files'):
+					remove_temporary_files(io)
+
+	# all the reads are written to the standard output
+	if streaming:
+		with phase('close streams', 'files'):
+			if interleaved != None:
+				close_interleaved(interleaved)
+			close_streams()
+
+	# the run is done
+	with phase('cleanup', 'files'):
+		close_journal()
+		stats = close_stats()
+
+	# the files written by the threads of the interleaved reads
+	if interleaved != None:
+		outputs = interleaved
+	elif cmd_last != None:
+		outputs = split_commandline(cmd_last)['output']
+	else :
+		outputs = []
+
+	return ([os.path.abspath(filename) for filename in outputs
+			 if filename != os.devnull], stats)
+
+
+
+def config_arguments(config):
+	"""
+	Function that checks the parameters of a trimming given to trim, as the
+	commandline arguments (see Trimmomatic_parser and check_args).
+
+	Takes one argument :
+		- config [dict] : the parameters : 'layout' ('SE' or 'PE'), 'input'
+						  (the read files), 'output' (the output directory,
+						  default : the working directory) and the options
+						  of the commandline, by their name in the
+						  arguments (as 'illuminaclip', 'minlen', 'threads',
+						  'outputs' or 'interleaved' : a switch is given
+						  with True)
+
+	Returns:
+		arguments [TrimConfig] : dictionnary containning all the command
+								 argument entries, or raise a ValueError
+	"""
+
+	parser = Trimmomatic_parser()
+	actions = dict((action.dest, action) for action in parser._actions
+				   if action.option_strings)
+
+	inputs = config.get('input', [])
+	if isinstance(inputs, str):
+		inputs = [inputs]
+
+	args = [str(config.get('layout'))] + [str(filename) for filename in inputs]
+
+	for option, value in sorted(config.items()):
+		if option in ('layout', 'input', 'output'):
+			continue
+
+		if(option not in actions or option in TRIM_OPTIONS_REFUSED
+		   or option == 'help'):
+			raise ValueError("Error : Unknown option '{0}'.".format(option))
+
+		if(value == None or value == False):
+			continue
+
+		action = actions[option]
+
+		# switches, options with several values, options with a value
+		if(action.nargs == 0):
+			args.append(action.option_strings[0])
+		elif isinstance(value, (list, tuple)):
+			args += [action.option_strings[0]] + [str(item) for item in value]
+		else :
+			args += [action.option_strings[0], str(value)]
+
+	# argparse writes its usage to the standard error and exits on a wrong
+	# value : its message is given to the caller instead
+	def parse_error(message):
+		raise ValueError("Error : Wrong parameters for the trimming ({0})."
+						 .format(message))
+
+	parser.error = parse_error
+
+	try:
+		arguments = dict(parser.parse_args(args)._get_kwargs())
+		arguments = check_args(arguments)
+		check_run(arguments)
+	except SystemExit as error:
+		if isinstance(error.code, str):
+			raise ValueError(error.code)
+		raise ValueError("Error : Wrong parameters for the trimming.")
+
+	# the standard input and output stay the ones of the interpreter
+	if STREAM in inputs + (arguments.get('outputs') or []):
+		raise ValueError("Error : The standard input and output ('-') can't \
+be given to trim, use named pipes.")
+
+	arguments['output'] = os.path.abspath(config.get('output', '.'))
+	if not os.path.isdir(arguments['output']):
+		raise ValueError("Error : The output directory '{0}' doesn't \
+exist.".format(arguments['output']))
+
+	return TrimConfig(arguments)
+
+
+
+def xml_config(filename):
+	"""
+	Function that reads the parameters of a trimming from a XML configuration
+	file (as 'configuration.xml'), as the parameters of trim.
+
+	Takes one argument :
+		- filename [string] : the XML configuration file
+
+	Returns:
+		- config [dict] : the parameters of the trimming (see
+						  config_arguments), or raise a ValueError
+	"""
+
+	try:
+		# separate sub trees, then the trimming categories of Trimmomatic
+		in_out, trimmo = separate_steps(parse_xml_file(filename))
+		adapter, quality, useful = separate_categories_Trimmo(trimmo)
+
+		param = get_input_output_parameters(in_out, {})
+		param = get_adapter_parameters(adapter, param)
+		param = get_quality_parameters(quality, param)
+		param = get_useful_parameters(useful, param)
+
+	except SystemExit as error:
+		raise ValueError(str(error.code))
+
+	except (IOError, OSError) as error:
+		raise ValueError("Error : The XML configuration file '{0}' can not be \
+read ({1}).".format(filename, error.strerror))
+
+	config = {'layout' : param['layout'], 'input' : list(param['input']),
+			  'output' : param['output']}
+
+	for name, option in XML_OPTIONS.items():
+		if name in param:
+			config[option] = param[name]
+
+	# BGZF files are gzip files made of blocks
+	if 'bgzf' in param:
+		config['compress'] = 'bgzf'
+
+	# quality encoding of the outputs ('TOPHRED33' or 'TOPHRED64')
+	if 'convert' in param:
+		config[param['convert'].lower()] = True
+
+	return config
+
+
+
+def trim(config):
+	"""
+	Function that trims reads inside the interpreter (the entry point of the
+	tool as a python library). The messages of the steps, the statistics and
+	the trace of the run are written in its output directory. The options of
+	the previous runs are not kept.
+
+	Takes one argument :
+		- config [dict] : the parameters of the trimming (see
+						  config_arguments), or the TrimConfig given by
+						  config_arguments (kept unchanged)
+
+	Returns:
+		- [TrimResult] : the output files ('outputs'), the statistics of
+						 the run ('stats') and its timings ('timings' : the
+						 time of the run and of its phases, in seconds)
+		or raise a TrimError
+	"""
+
+	try:
+		if not isinstance(config, TrimConfig):
+			config = config_arguments(config)
+	except ValueError as error:
+		raise TrimError(str(error))
+
+	# the run changes its arguments (threads, named pipes)
+	arguments = copy.deepcopy(dict(config))
+	directory = arguments['output']
+
+	open_trace(directory, arguments['chrome_trace'], False)
+
+	try:
+		set_cache(arguments['cache'], arguments['cache_size'])
+
+		with phase('open run', 'setup'):
+			streaming = open_run(arguments)
+
+		outputs, stats = run_trimming(arguments, LOCATION, streaming,
+									  directory)
+
+	except SystemExit as error:
+		raise TrimError(str(error.code))
+
+	except subprocess.CalledProcessError as error:
+		raise TrimError("Error : The trimming failed (exit code {0}, see the \
+'output_file_*.out' files of '{1}').".format(error.returncode, directory))
+
+	except (IOError, OSError) as error:
+		raise TrimError("Error : The trimming failed ({0}).".format(error))
+
+	finally:
+		# an interrupted run keeps its journal for the next one, but the
+		# next runs don't write in it
+		JOURNAL['file'] = None
+		STATS['file'] = None
+		remove_streams()
+		timings = close_trace()
+
+	return TrimResult(outputs, stats, timings)